@@ -0,0 +1,54 @@
+"""Compare the linear category scan with the CategoryMatcher suffix index.
+
+Usage: python -m benchmarks.bench_categories --paths 100k --categories 50
+"""
+
+from __future__ import annotations
+
+import argparse
+from typing import List, Optional, Sequence
+
+from benchmarks.common import best_of, gfl, parse_size, synthetic_paths
+
+
+def linear_match(lower: str, categories: Sequence[gfl.Category]) -> Optional[int]:
+    # The loop build_sections used before the suffix index was introduced.
+    for index, category in enumerate(categories):
+        if lower.endswith(category.ext.lower()):
+            return index
+    return None
+
+
+def make_categories(count: int) -> List[gfl.Category]:
+    categories = [gfl.Category(ext=ext, name=name) for ext, name in gfl.DEFAULT_FILE_CATEGORIES_RAW]
+    categories.extend(gfl.Category(ext=ext, name=ext[1:].upper()) for ext in (".py", ".md", ".json"))
+    index = 0
+    while len(categories) < count:
+        categories.insert(len(categories) // 2, gfl.Category(ext=f".ext{index}", name=f"Extension {index}"))
+        index += 1
+    return categories[:count]
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--paths", default="100k")
+    parser.add_argument("--categories", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    lowered = [path.lower() for path in synthetic_paths(parse_size(args.paths), "deep")]
+    categories = make_categories(args.categories)
+    matcher = gfl.CategoryMatcher(categories)
+
+    linear_time, expected = best_of(args.repeat, lambda: [linear_match(path, categories) for path in lowered])
+    indexed_time, result = best_of(args.repeat, lambda: [matcher.match_index(path) for path in lowered])
+    if result != expected:
+        raise SystemExit("CategoryMatcher disagrees with the linear scan")
+    print(f"{len(lowered)} paths x {len(categories)} categories")
+    print(f"{'linear scan':<14} {linear_time:8.3f}s")
+    print(f"{'suffix index':<14} {indexed_time:8.3f}s  x{linear_time / indexed_time:.1f}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
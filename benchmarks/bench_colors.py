@@ -0,0 +1,105 @@
+"""Measure colours per second for each exclusion mode.
+
+Usage: python -m benchmarks.bench_colors --colors 100k
+
+The legacy column re-implements the rejection sampler that ColorGenerator
+used before the precomputed palette, capped at --max-attempts per colour.
+"""
+
+from __future__ import annotations
+
+import argparse
+import random
+import time
+from typing import Dict
+
+from benchmarks.common import gfl, parse_size
+
+MODES: Dict[str, Dict[str, object]] = {
+    "unrestricted": {},
+    "exclude-dark": {"exclude_dark": True},
+    "exclude-bright": {"exclude_bright": True},
+    "exclude-blacks": {"exclude_blacks": True, "exclude_blacks_threshold": "#C00000"},
+    "ensure-readable": {"ensure_readable": True},
+    "narrow-strict": {
+        "exclude_dark": True,
+        "exclude_bright": True,
+        "dark_luminance_threshold": 150,
+        "bright_luminance_threshold": 152,
+        "color_range": ("#000000", "#FFFF40"),
+    },
+}
+
+
+def make_prefs(seed: int, **overrides: object) -> gfl.ColorPreferences:
+    prefs = gfl.ColorPreferences(
+        source="random",
+        colors=[],
+        color_range=gfl.DEFAULT_COLOR_RANGE,
+        exclude_dark=False,
+        exclude_bright=False,
+        exclude_blacks=False,
+        exclude_blacks_threshold="#222222",
+        ensure_readable=False,
+        dark_luminance_threshold=gfl.DEFAULT_DARK_LUMINANCE_THRESHOLD,
+        bright_luminance_threshold=gfl.DEFAULT_BRIGHT_LUMINANCE_THRESHOLD,
+        seed=seed,
+    )
+    for key, value in overrides.items():
+        setattr(prefs, key, value)
+    return prefs
+
+
+def legacy_should_exclude(prefs: gfl.ColorPreferences, color: str) -> bool:
+    luminance = gfl.calculate_luminance(color)
+    if prefs.exclude_dark and luminance < prefs.dark_luminance_threshold:
+        return True
+    if prefs.exclude_bright and luminance > prefs.bright_luminance_threshold:
+        return True
+    if prefs.exclude_blacks and gfl.is_black_color(color, prefs.exclude_blacks_threshold):
+        return True
+    return prefs.ensure_readable and not 50 < luminance < 200
+
+
+def legacy_next_color(prefs: gfl.ColorPreferences, rng: random.Random, max_attempts: int) -> str:
+    low = [int(prefs.color_range[0][i : i + 2], 16) for i in (1, 3, 5)]
+    high = [int(prefs.color_range[1][i : i + 2], 16) for i in (1, 3, 5)]
+    for _ in range(max_attempts):
+        candidate = "#{:02X}{:02X}{:02X}".format(*(rng.randint(lo, hi) for lo, hi in zip(low, high)))
+        if not legacy_should_exclude(prefs, candidate):
+            return candidate
+    return f"#{rng.randint(0, 0xFFFFFF):06X}"
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--colors", default="100k")
+    parser.add_argument("--max-attempts", type=int, default=100_000, help="Attempt cap for the legacy sampler.")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    count = parse_size(args.colors)
+
+    print(f"{'mode':<16} {'palette':>10} {'build':>8} {'colours/s':>12} {'legacy/s':>12}")
+    for mode, overrides in MODES.items():
+        prefs = make_prefs(args.seed, **overrides)
+        gfl._PALETTE_CACHE.clear()
+        start = time.perf_counter()
+        generator = gfl.ColorGenerator(prefs)
+        build = time.perf_counter() - start
+        start = time.perf_counter()
+        for _ in range(count):
+            generator.next_color()
+        rate = count / (time.perf_counter() - start)
+        rng = random.Random(args.seed)
+        legacy_count = max(1, count // 10)
+        start = time.perf_counter()
+        for _ in range(legacy_count):
+            legacy_next_color(prefs, rng, args.max_attempts)
+        legacy_rate = legacy_count / (time.perf_counter() - start)
+        size = gfl.build_color_palette(prefs).size
+        print(f"{mode:<16} {size:>10} {build:>7.3f}s {rate:>12,.0f} {legacy_rate:>12,.0f}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
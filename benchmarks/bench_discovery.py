@@ -0,0 +1,62 @@
+"""Compare the discovery engines on a synthetic tree.
+
+Usage: python -m benchmarks.bench_discovery --files 100k --layout wide [--git]
+
+With --git the tree is committed to a throwaway repository and the git
+ls-files backend is compared with reading .git/index directly.
+"""
+
+from __future__ import annotations
+
+import argparse
+import tempfile
+from pathlib import Path
+
+from benchmarks.common import LAYOUTS, best_of, gfl, init_git_repo, make_tree, parse_size
+
+
+def compare_git_backends(root: Path, ignore: list, repeat: int, init: bool) -> int:
+    if init:
+        init_git_repo(root)
+    cli_time, expected = best_of(repeat, lambda: gfl.git_paths(root, ignore))
+    print(f"{'git ls-files':<16} {cli_time:8.3f}s  {len(expected or [])} files")
+    for untracked in (True, False):
+        elapsed, result = best_of(repeat, lambda: gfl.git_index_paths(root, ignore, untracked))
+        if untracked and result != expected:
+            raise SystemExit("index backend produced different output")
+        label = "index" if untracked else "index (tracked)"
+        print(f"{label:<16} {elapsed:8.3f}s  x{cli_time / elapsed:.2f}")
+    return 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--files", default="50k", help="Number of files to generate (e.g. 10k, 1m).")
+    parser.add_argument("--layout", choices=LAYOUTS, default="wide")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4, 0], help="Worker counts to try (0 = default).")
+    parser.add_argument("--tree", help="Benchmark an existing directory instead of a synthetic tree.")
+    parser.add_argument("--git", action="store_true", help="Compare git-aware backends instead of filesystem walkers.")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as scratch:
+        if args.tree:
+            root = Path(args.tree).resolve()
+        else:
+            root = make_tree(Path(scratch) / "tree", parse_size(args.files), args.layout)
+        ignore = list(gfl.DEFAULT_IGNORE_LIST)
+        if args.git:
+            return compare_git_backends(root, ignore, args.repeat, init=not args.tree)
+        walk_time, expected = best_of(args.repeat, lambda: gfl.collect_via_os(root, ignore))
+        print(f"{'walk':<16} {walk_time:8.3f}s  {len(expected)} files")
+        for workers in args.workers:
+            elapsed, result = best_of(args.repeat, lambda: gfl.collect_via_scandir(root, ignore, workers))
+            if result != expected:
+                raise SystemExit(f"scandir engine (workers={workers}) produced different output")
+            label = f"scandir[{workers or 'auto'}]"
+            print(f"{label:<16} {elapsed:8.3f}s  x{walk_time / elapsed:.2f}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,66 @@
+"""Measure the memory a discovered file list holds per file.
+
+Usage: python -m benchmarks.bench_memory [--paths 200k] [--layouts flat deep wide]
+
+For every layout the same synthetic paths are held twice: as the sorted
+List[str] discovery used to return, and as the PathTable it returns now.
+Both are measured with tracemalloc after construction, once the input list
+has been released, so the figures are what a run keeps alive between
+discovery and rendering.
+"""
+
+from __future__ import annotations
+
+import argparse
+import gc
+import tracemalloc
+from typing import Callable, Sequence
+
+from benchmarks.common import LAYOUTS, gfl, parse_size, synthetic_paths
+
+
+def held_bytes(build: Callable[[], Sequence[str]]) -> int:
+    gc.collect()
+    tracemalloc.start()
+    try:
+        held = build()
+        gc.collect()
+        size, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del held
+    return size
+
+
+def as_list(count: int, layout: str) -> Sequence[str]:
+    paths = synthetic_paths(count, layout)
+    paths.sort(key=str.lower)
+    return paths
+
+
+def as_table(count: int, layout: str) -> Sequence[str]:
+    table = gfl.PathTable(synthetic_paths(count, layout))
+    table.compact()
+    return table
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--paths", default="200k")
+    parser.add_argument("--layouts", nargs="+", choices=LAYOUTS, default=list(LAYOUTS))
+    args = parser.parse_args()
+
+    count = parse_size(args.paths)
+    print(f"{count} paths")
+    for layout in args.layouts:
+        plain = held_bytes(lambda: as_list(count, layout))
+        compact = held_bytes(lambda: as_table(count, layout))
+        print(
+            f"{layout:<6} list[str] {plain / count:7.1f} B/file   "
+            f"PathTable {compact / count:7.1f} B/file   x{plain / compact:.1f}"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,122 @@
+"""Measure start-up cost: module import time and subprocesses spawned per run.
+
+Usage: python -m benchmarks.bench_startup [--repeat 5] [--budget-ms 80] [--top 10]
+
+The import is timed with ``python -X importtime`` in a fresh interpreter; the
+best cumulative time of --repeat runs is checked against --budget-ms. Modules
+that are meant to load on demand (tqdm, multiprocessing, brotli, sqlite3) must
+not show up in that import at all. A default run over a small committed repository is
+then timed end to end and its metrics file is read to count the git commands
+it spawned.
+
+The exit status is 1 when the budget is exceeded or a lazy module is imported
+eagerly. Import times are machine specific; the lazy-module check is not.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+from benchmarks.common import PROJECT_ROOT, init_git_repo, make_tree
+
+MODULE = "src.generate_file_list"
+LAZY_MODULES = ("tqdm", "multiprocessing", "concurrent.futures.process", "brotli", "brotlicffi", "sqlite3")
+
+
+def import_times() -> Dict[str, Tuple[int, int]]:
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {MODULE}"],
+        cwd=PROJECT_ROOT,
+        check=True,
+        capture_output=True,
+        text=True,
+    )
+    times: Dict[str, Tuple[int, int]] = {}
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:") :].split("|")
+        times[name.strip()] = (int(self_us), int(cumulative_us))
+    return times
+
+
+def timed_run(root: Path, repeat: int) -> Tuple[float, Dict[str, object]]:
+    best = float("inf")
+    metrics: Dict[str, object] = {}
+    script = PROJECT_ROOT / "src" / "generate_file_list.py"
+    with tempfile.TemporaryDirectory() as scratch:
+        output = Path(scratch) / "file_list.html"
+        metrics_file = Path(scratch) / "metrics.json"
+        for _ in range(max(1, repeat)):
+            start = time.perf_counter()
+            subprocess.run(
+                [
+                    sys.executable,
+                    str(script),
+                    "--directory",
+                    str(root),
+                    "--output-file",
+                    str(output),
+                    "--metrics-file",
+                    str(metrics_file),
+                    "--log-level",
+                    "WARNING",
+                ],
+                check=True,
+                capture_output=True,
+            )
+            best = min(best, time.perf_counter() - start)
+        metrics = json.loads(metrics_file.read_text(encoding="utf-8"))
+    return best, metrics
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--budget-ms", type=float, default=80.0, help="Fail when importing the module takes longer than this.")
+    parser.add_argument("--top", type=int, default=10, help="Number of slowest imports to list.")
+    parser.add_argument("--files", type=int, default=200, help="Files in the repository used for the end-to-end run.")
+    args = parser.parse_args()
+
+    runs = [import_times() for _ in range(max(1, args.repeat))]
+    best = min(runs, key=lambda times: times[MODULE][1])
+    total_ms = best[MODULE][1] / 1000
+    print(f"import {MODULE}: {total_ms:.1f} ms cumulative (best of {len(runs)}, budget {args.budget_ms:.0f} ms)")
+    slowest: List[Tuple[str, Tuple[int, int]]] = sorted(
+        ((name, times) for name, times in best.items() if name != MODULE), key=lambda item: item[1][0], reverse=True
+    )
+    for name, (self_us, cumulative_us) in slowest[: args.top]:
+        print(f"  {name:<32} self {self_us / 1000:7.2f} ms  cumulative {cumulative_us / 1000:7.2f} ms")
+
+    status = 0
+    eager = [name for name in LAZY_MODULES if name in best]
+    if eager:
+        print(f"Imported eagerly but expected on demand: {', '.join(eager)}")
+        status = 1
+    if total_ms > args.budget_ms:
+        print(f"Import time exceeds the {args.budget_ms:.0f} ms budget.")
+        status = 1
+
+    with tempfile.TemporaryDirectory() as scratch:
+        root = make_tree(Path(scratch) / "repo", args.files)
+        init_git_repo(root)
+        # A typical checkout has an origin; without one git's global config
+        # has to be consulted, which needs the git CLI.
+        subprocess.run(["git", "remote", "add", "origin", "https://github.com/bench/repo.git"], cwd=root, check=True)
+        seconds, metrics = timed_run(root, args.repeat)
+    spawned = metrics.get("subprocesses", {})
+    print(f"end-to-end run over {args.files} files: {seconds * 1000:.1f} ms, {spawned.get('count', 0)} git command(s)")
+    for label, entry in sorted(spawned.get("commands", {}).items()):
+        print(f"  {label:<24} x{entry['count']}  {entry['seconds'] * 1000:.1f} ms")
+    return status
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
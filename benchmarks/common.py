@@ -0,0 +1,93 @@
+"""Shared helpers for the benchmark scripts: synthetic trees and timers."""
+
+from __future__ import annotations
+
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Callable, Tuple, TypeVar
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from src import generate_file_list as gfl  # noqa: E402
+
+# gfl is re-exported so every benchmark imports the module from the same path.
+__all__ = [
+    "EXTENSIONS",
+    "LAYOUTS",
+    "PROJECT_ROOT",
+    "best_of",
+    "gfl",
+    "init_git_repo",
+    "make_tree",
+    "parse_size",
+    "synthetic_paths",
+]
+
+T = TypeVar("T")
+
+LAYOUTS = ("flat", "deep", "wide")
+EXTENSIONS = (".py", ".js", ".css", ".md", ".yml", ".txt", ".user.js", ".json")
+
+
+def parse_size(value: str) -> int:
+    lowered = value.strip().lower()
+    multiplier = 1
+    if lowered.endswith("k"):
+        multiplier, lowered = 1_000, lowered[:-1]
+    elif lowered.endswith("m"):
+        multiplier, lowered = 1_000_000, lowered[:-1]
+    return int(float(lowered) * multiplier)
+
+
+def synthetic_paths(count: int, layout: str = "wide") -> list[str]:
+    paths = []
+    for index in range(count):
+        name = f"file_{index}{EXTENSIONS[index % len(EXTENSIONS)]}"
+        if layout == "flat":
+            paths.append(name)
+        elif layout == "deep":
+            depth = index % 12
+            parts = [f"level{level}_{(index >> level) % 3}" for level in range(depth)]
+            paths.append("/".join(parts + [name]))
+        else:
+            paths.append(f"pkg{index % 200}/mod{(index // 200) % 50}/{name}")
+    return paths
+
+
+def make_tree(root: Path, count: int, layout: str = "wide") -> Path:
+    root.mkdir(parents=True, exist_ok=True)
+    created = set()
+    for relative in synthetic_paths(count, layout):
+        parent = os.path.dirname(relative)
+        if parent and parent not in created:
+            os.makedirs(root / parent, exist_ok=True)
+            created.add(parent)
+        with open(root / relative, "wb"):
+            pass
+    return root
+
+
+def init_git_repo(root: Path) -> Path:
+    for command in (["init", "-q"], ["add", "-A"], ["commit", "-qm", "bench"]):
+        subprocess.run(
+            ["git", "-c", "user.name=bench", "-c", "user.email=bench@example.com", *command],
+            cwd=root,
+            check=True,
+            capture_output=True,
+        )
+    return root
+
+
+def best_of(repeat: int, func: Callable[[], T]) -> Tuple[float, T]:
+    best = float("inf")
+    result = None
+    for _ in range(max(1, repeat)):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return best, result  # type: ignore[return-value]
@@ -0,0 +1,221 @@
+"""Phase-by-phase benchmark suite over synthetic repository trees.
+
+Usage: python -m benchmarks.suite [--sizes 1k 100k 1m] [--layouts flat deep wide]
+                                  [--modes plain git] [--save-baseline] [--threshold 0.2]
+
+Every scenario (layout x size x mode) times the discovery, sectioning,
+rendering and writing phases, then re-runs each phase once under tracemalloc
+to record its peak allocation. Timings are the best of --repeat runs.
+
+Results are compared against --baseline when it exists. The exit status is 1
+when any phase is slower, or allocates more, than the baseline by more than
+--threshold. --save-baseline stores the current run as the new baseline.
+Baselines are machine specific: record them on the machine that checks them.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+from benchmarks.common import LAYOUTS, PROJECT_ROOT, gfl, init_git_repo, make_tree, parse_size
+
+MODES = ("plain", "git")
+DEFAULT_BASELINE = PROJECT_ROOT / "benchmarks" / "baseline.json"
+
+Phase = Tuple[str, Callable[[], object], Optional[Callable[[], None]]]
+
+
+def measure(func: Callable[[], object], repeat: int, setup: Optional[Callable[[], None]] = None) -> Dict[str, float]:
+    seconds = float("inf")
+    for _ in range(max(1, repeat)):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        func()
+        seconds = min(seconds, time.perf_counter() - start)
+    # Tracing slows allocation-heavy code considerably, so memory is taken
+    # from a separate run that is not timed.
+    if setup is not None:
+        setup()
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {"seconds": seconds, "peak_bytes": float(peak)}
+
+
+def prepare_tree(workdir: Path, layout: str, count: int, mode: str) -> Path:
+    root = workdir / f"{layout}-{count}-{mode}"
+    ready = workdir / f"{root.name}.ready"
+    if ready.exists():
+        return root
+    shutil.rmtree(root, ignore_errors=True)
+    make_tree(root, count, layout)
+    if mode == "git":
+        init_git_repo(root)
+    ready.touch()
+    return root
+
+
+def bench_config(root: Path, output: Path, output_format: str) -> gfl.GeneratorConfig:
+    # An explicit repository URL and link reference keep build_config from
+    # spawning git, which is not part of any measured phase.
+    args = gfl.build_parser().parse_args(
+        [
+            "--directory",
+            str(root),
+            "--output-format",
+            output_format,
+            "--output-file",
+            str(output),
+            "--repo-url",
+            "https://github.com/bench/repo",
+            "--link-ref",
+            "main",
+            "--color-seed",
+            "1",
+        ]
+    )
+    return gfl.build_config(args)
+
+
+def scenario_phases(root: Path, mode: str, output_dir: Path) -> List[Phase]:
+    html_config = bench_config(root, output_dir / "file_list.html", "html")
+    markdown_config = bench_config(root, output_dir / "file_list.md", "markdown")
+    ignore = html_config.ignore_list
+    files = gfl.walk_paths(root, ignore)
+    html_content = gfl.render_html(files, html_config)
+
+    def remove_output() -> None:
+        if html_config.output_file is not None and html_config.output_file.exists():
+            html_config.output_file.unlink()
+
+    phases: List[Phase] = [
+        ("collect_via_os", lambda: gfl.collect_via_os(root, ignore), None),
+        ("collect_via_scandir", lambda: gfl.collect_via_scandir(root, ignore), None),
+    ]
+    if mode == "git":
+        phases.append(("collect_via_git", lambda: gfl.collect_via_git(root, ignore), None))
+        phases.append(("git_index_paths", lambda: gfl.git_index_paths(root, ignore), None))
+    phases.extend(
+        [
+            ("build_sections", lambda: gfl.build_sections(files, html_config.categories, html_config.repo_root_header), None),
+            ("render_html", lambda: gfl.render_html(files, html_config), None),
+            ("render_markdown", lambda: gfl.render_markdown(files, markdown_config), None),
+            ("write_output", lambda: gfl.write_output(html_config, html_content), remove_output),
+        ]
+    )
+    return phases
+
+
+def run_suite(args: argparse.Namespace, workdir: Path) -> Dict[str, Dict[str, Dict[str, float]]]:
+    results: Dict[str, Dict[str, Dict[str, float]]] = {}
+    for size in args.sizes:
+        count = parse_size(size)
+        for layout in args.layouts:
+            for mode in args.modes:
+                scenario = f"{layout}/{size}/{mode}"
+                print(f"== {scenario}", flush=True)
+                root = prepare_tree(workdir, layout, count, mode)
+                with tempfile.TemporaryDirectory() as output_dir:
+                    phases = scenario_phases(root, mode, Path(output_dir))
+                    results[scenario] = {}
+                    for name, func, setup in phases:
+                        metrics = measure(func, args.repeat, setup)
+                        results[scenario][name] = metrics
+                        print(f"   {name:<20} {metrics['seconds']:9.4f}s {metrics['peak_bytes'] / 2**20:10.1f} MiB", flush=True)
+    return results
+
+
+def find_regressions(
+    current: Dict[str, Dict[str, Dict[str, float]]],
+    baseline: Dict[str, Dict[str, Dict[str, float]]],
+    threshold: float,
+    min_seconds: float,
+    min_bytes: float,
+) -> List[str]:
+    regressions: List[str] = []
+    floors = {"seconds": min_seconds, "peak_bytes": min_bytes}
+    for scenario, phases in current.items():
+        for phase, metrics in phases.items():
+            previous = baseline.get(scenario, {}).get(phase)
+            if not previous:
+                continue
+            for metric, floor in floors.items():
+                before, after = previous.get(metric), metrics[metric]
+                if not before:
+                    continue
+                # Absolute floors keep tiny phases from failing on timer noise.
+                if after > before * (1 + threshold) and after - before > floor:
+                    regressions.append(
+                        f"{scenario} {phase} {metric}: {before:.4g} -> {after:.4g} (+{(after / before - 1) * 100:.0f}%)"
+                    )
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", nargs="+", default=["1k", "100k"], help="Tree sizes to generate (e.g. 1k 100k 1m).")
+    parser.add_argument("--layouts", nargs="+", choices=LAYOUTS, default=list(LAYOUTS))
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=list(MODES), help="Benchmark trees without and/or inside a git repository.")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--workdir", help="Keep generated trees here and reuse them on later runs (default: a temporary directory).")
+    parser.add_argument("--baseline", default=str(DEFAULT_BASELINE), help="Baseline results to compare against.")
+    parser.add_argument("--save-baseline", action="store_true", help="Store this run as the new baseline.")
+    parser.add_argument("--results", help="Also write this run's results to the given JSON file.")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Allowed slowdown or memory growth as a fraction (0.2 = 20%%).")
+    parser.add_argument("--min-seconds", type=float, default=0.005, help="Ignore time regressions smaller than this many seconds.")
+    parser.add_argument("--min-bytes", type=float, default=1 << 20, help="Ignore memory regressions smaller than this many bytes.")
+    args = parser.parse_args()
+
+    if args.workdir:
+        workdir = Path(args.workdir).resolve()
+        workdir.mkdir(parents=True, exist_ok=True)
+        results = run_suite(args, workdir)
+    else:
+        with tempfile.TemporaryDirectory() as scratch:
+            results = run_suite(args, Path(scratch))
+
+    report = {
+        "meta": {
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+        },
+        "results": results,
+    }
+    if args.results:
+        Path(args.results).write_text(json.dumps(report, indent=2) + "\n", encoding="utf-8")
+
+    status = 0
+    baseline_path = Path(args.baseline)
+    if baseline_path.exists():
+        baseline = json.loads(baseline_path.read_text(encoding="utf-8")).get("results", {})
+        regressions = find_regressions(results, baseline, args.threshold, args.min_seconds, args.min_bytes)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) beyond {args.threshold:.0%} against {baseline_path}:")
+            for line in regressions:
+                print(f"  {line}")
+            status = 1
+        else:
+            print(f"\nNo regressions beyond {args.threshold:.0%} against {baseline_path}.")
+    if args.save_baseline:
+        baseline_path.write_text(json.dumps(report, indent=2) + "\n", encoding="utf-8")
+        print(f"Saved baseline to {baseline_path}")
+    return status
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -4,21 +4,37 @@
 from __future__ import annotations
 
 import argparse
+import bisect
+import contextlib
+import errno
+import functools
+import hashlib
 import html
 import json
 import logging
+import mmap
 import os
 import random
+import re
+import select
+import struct
 import subprocess
 import sys
+import tempfile
 import textwrap
+import threading
+import time
 import urllib.parse
-from dataclasses import dataclass, field
-from itertools import cycle
+import zlib
+from array import array
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import asdict, dataclass, field, replace
+from itertools import accumulate, cycle, repeat
 from pathlib import Path
-from typing import Dict, List, Optional, Sequence, Tuple
+from typing import BinaryIO, Callable, Dict, Iterable, Iterator, List, Mapping, Optional, Sequence, Set, TextIO, Tuple, TypeVar
 
-from tqdm import tqdm
+
+T = TypeVar("T")
 
 TRUE_STRINGS = {"1", "true", "yes", "on"}
 FALSE_STRINGS = {"0", "false", "no", "off"}
@@ -35,6 +51,9 @@ DEFAULT_IGNORE_LIST = [
     ".pytest_cache",
 ]
 DEFAULT_OUTPUT_FORMAT = "html"
+OUTPUT_FORMATS = ("html", "markdown", "json", "ndjson", "sqlite")
+RECORD_FORMATS = ("json", "ndjson")
+COLORED_KINDS = ("html", "virtual")
 DEFAULT_OUTPUT_FILE = "file_list.html"
 DEFAULT_HEADER_TEXT = "## File List"
 DEFAULT_INTRO_TEXT = "# Here is a list of files included in this repository:"
@@ -42,7 +61,6 @@ DEFAULT_REPO_ROOT_HEADER = "Repo Root"
 DEFAULT_COLOR_SOURCE = "random"
 DEFAULT_COLOR_LIST = ["#FF0000", "#00FF00", "#0000FF", "#FFFF00", "#FF00FF", "#00FFFF"]
 DEFAULT_COLOR_RANGE = ("#000000", "#FFFFFF")
-DEFAULT_MAX_ATTEMPTS = 1_000_000
 DEFAULT_DARK_LUMINANCE_THRESHOLD = 128
 DEFAULT_BRIGHT_LUMINANCE_THRESHOLD = 200
 DEFAULT_CHUNK_SIZE = 40
@@ -54,6 +72,126 @@ DEFAULT_ROOT_MARGIN_TABLET = "0px 0px 200px 0px"
 DEFAULT_ROOT_MARGIN_SMALL_DESKTOP = "0px 0px 300px 0px"
 DEFAULT_ROOT_MARGIN_LARGE_DESKTOP = "0px 0px 400px 0px"
 DEFAULT_LINK_REFERENCE = "main"
+MANIFEST_VERSION = 3
+STREAM_BUFFER_SIZE = 1 << 20
+DEFAULT_DISCOVERY_ENGINE = "scandir"
+DISCOVERY_ENGINES = ("scandir", "walk")
+DEFAULT_GIT_BACKEND = "cli"
+GIT_BACKENDS = ("cli", "index")
+GIT_INDEX_SIGNATURE = b"DIRC"
+GIT_INDEX_VERSIONS = (2, 3, 4)
+GIT_READ_BLOCK_SIZE = 1 << 20
+DEFAULT_HTML_CHUNK_MODE = "inline"
+HTML_CHUNK_MODES = ("inline", "external")
+DEFAULT_HTML_LAYOUT = "lazyload"
+HTML_LAYOUTS = ("lazyload", "virtual")
+VIRTUAL_ROW_HEIGHT = 24
+VIRTUAL_HEADING_HEIGHT = 48
+COMPRESSION_SUFFIXES = {"gzip": ".gz", "brotli": ".br"}
+SEARCH_INDEX_VERSION = 1
+# PRAGMA user_version; other versions are rebuilt, not migrated.
+SQLITE_SCHEMA_VERSION = 2
+SQLITE_TABLES = (
+    """CREATE TABLE IF NOT EXISTS files (
+        path TEXT PRIMARY KEY,
+        directory TEXT NOT NULL,
+        name TEXT NOT NULL,
+        extension TEXT NOT NULL,
+        section_kind TEXT NOT NULL,
+        section TEXT NOT NULL,
+        category TEXT,
+        url TEXT NOT NULL,
+        size INTEGER,
+        modified INTEGER,
+        author TEXT
+    ) WITHOUT ROWID""",
+    """CREATE TABLE IF NOT EXISTS sections (
+        position INTEGER PRIMARY KEY,
+        kind TEXT NOT NULL,
+        title TEXT NOT NULL,
+        files INTEGER NOT NULL,
+        digest TEXT NOT NULL,
+        UNIQUE (kind, title)
+    )""",
+)
+SQLITE_INDEXES = (
+    "CREATE INDEX IF NOT EXISTS files_section ON files (section_kind, section)",
+    "CREATE INDEX IF NOT EXISTS files_directory ON files (directory)",
+    "CREATE INDEX IF NOT EXISTS files_extension ON files (extension)",
+    "CREATE INDEX IF NOT EXISTS files_category ON files (category)",
+)
+# Unchanged rows are skipped, so reruns only rewrite changed files.
+SQLITE_UPSERT = """
+    INSERT INTO files (path, directory, name, extension, section_kind, section, category, url, size, modified, author)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT (path) DO UPDATE SET
+        section_kind = excluded.section_kind, section = excluded.section, category = excluded.category,
+        url = excluded.url, size = excluded.size, modified = excluded.modified, author = excluded.author
+    WHERE (section_kind, section, category, url, size, modified, author) IS NOT (
+        excluded.section_kind, excluded.section, excluded.category,
+        excluded.url, excluded.size, excluded.modified, excluded.author
+    )
+"""
+RENDER_SLICE_SIZE = 4096
+METRICS_VERSION = 1
+METRIC_PHASES = ("config", "manifest", "discovery", "metadata", "render", "write", "stream")
+# Options that shape the shared scan are command-line only.
+BATCH_SHARED_OPTIONS = frozenset(
+    {
+        "batch-config",
+        "cache-file",
+        "discovery-engine",
+        "discovery-workers",
+        "git-backend",
+        "git-untracked",
+        "log-level",
+        "metrics-file",
+        "profile-phases",
+        "respect-gitignore",
+        "trace-memory-phases",
+        "watch",
+        "watch-backend",
+        "watch-debounce",
+    }
+)
+BATCH_FLAG_OPTIONS = frozenset({"overwrite-file-categories", "overwrite-ignore-list"})
+# When set, ask the git CLI instead of reading .git directly.
+GIT_ENVIRONMENT_OVERRIDES = (
+    "GIT_DIR",
+    "GIT_WORK_TREE",
+    "GIT_COMMON_DIR",
+    "GIT_INDEX_FILE",
+    "GIT_CONFIG",
+    "GIT_CONFIG_COUNT",
+    "GIT_CONFIG_PARAMETERS",
+)
+GIT_CONFIG_SECTION_PATTERN = re.compile(r'\[\s*([A-Za-z0-9.-]+)(?:\s+"((?:[^"\\]|\\.)*)")?\s*\]')
+GIT_CONFIG_ENTRY_PATTERN = re.compile(r"([A-Za-z][A-Za-z0-9-]*)\s*(?:=(.*))?$")
+GIT_CONFIG_ESCAPES = {"n": "\n", "t": "\t", "b": "\b", "\\": "\\", '"': '"'}
+DEFAULT_WATCH_DEBOUNCE = 0.2
+DEFAULT_WATCH_BACKEND = "auto"
+WATCH_BACKENDS = ("auto", "inotify", "poll")
+WATCH_POLL_INTERVAL = 1.0
+# inotify(7) constants.
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_DONT_FOLLOW = 0x02000000
+IN_ISDIR = 0x40000000
+IN_CLOEXEC = 0o2000000
+IN_NONBLOCK = 0o4000
+INOTIFY_WATCH_MASK = IN_CREATE | IN_DELETE | IN_MOVED_FROM | IN_MOVED_TO | IN_ONLYDIR | IN_DONT_FOLLOW
+INOTIFY_EVENT = struct.Struct("iIII")
+DEFAULT_SERVE_HOST = "127.0.0.1"
+DEFAULT_SERVE_PORT = 8000
+DEFAULT_SERVE_PAGE_SIZE = 500
+SERVE_MAX_PAGE_SIZE = 5000
+SERVE_GZIP_MIN_BYTES = 1024
 
 DEFAULT_FILE_CATEGORIES_RAW = [
     (".user.css", "Userstyles"),
@@ -75,7 +213,6 @@ class ColorPreferences:
     source: str
     colors: List[str]
     color_range: Tuple[str, str]
-    max_attempts: int
     exclude_dark: bool
     exclude_bright: bool
     exclude_blacks: bool
@@ -83,6 +220,7 @@ class ColorPreferences:
     ensure_readable: bool
     dark_luminance_threshold: int
     bright_luminance_threshold: int
+    seed: Optional[int] = None
 
 
 @dataclass
@@ -114,6 +252,23 @@ class GeneratorConfig:
     lazy: LazyLoadPreferences
     respect_gitignore: bool
     log_level: str
+    cache_file: Optional[Path] = None
+    discovery_engine: str = DEFAULT_DISCOVERY_ENGINE
+    discovery_workers: int = 0
+    stream: bool = False
+    git_backend: str = DEFAULT_GIT_BACKEND
+    git_untracked: bool = True
+    html_chunk_mode: str = DEFAULT_HTML_CHUNK_MODE
+    html_layout: str = DEFAULT_HTML_LAYOUT
+    search_index: bool = False
+    file_metadata: bool = False
+    since: Optional[str] = None
+    source_ref: Optional[str] = None
+    compress: List[str] = field(default_factory=list)
+    jobs: int = 0
+    watch: bool = False
+    watch_debounce: float = DEFAULT_WATCH_DEBOUNCE
+    watch_backend: str = DEFAULT_WATCH_BACKEND
 
 
 def str_to_bool(value: str | bool) -> bool:
@@ -127,6 +282,18 @@ def str_to_bool(value: str | bool) -> bool:
     raise argparse.ArgumentTypeError(f"Expected a boolean value, received '{value}'.")
 
 
+def optional_int(value: str | int | None) -> Optional[int]:
+    if value is None or isinstance(value, int):
+        return value
+    stripped = value.strip()
+    if not stripped:
+        return None
+    try:
+        return int(stripped, 0)
+    except ValueError as exc:
+        raise argparse.ArgumentTypeError(f"Expected an integer, received '{value}'.") from exc
+
+
 def normalize_hex_color(value: str) -> str:
     candidate = value.strip()
     if not candidate:
@@ -161,278 +328,2175 @@ def is_black_color(color: str, threshold: str) -> bool:
     return int(color[1:], 16) <= int(threshold[1:], 16)
 
 
-class ColorGenerator:
+class ColorPalette:
+    # One contiguous run of admissible blue values per (red, green) pair.
     def __init__(self, prefs: ColorPreferences) -> None:
+        low, high = prefs.color_range
+        self.range_low = tuple(int(low[i : i + 2], 16) for i in (1, 3, 5))
+        self.range_high = tuple(int(high[i : i + 2], 16) for i in (1, 3, 5))
+        self.restricted = prefs.exclude_dark or prefs.exclude_bright or prefs.exclude_blacks or prefs.ensure_readable
+        self._offsets: List[int] = []
+        self._rows: List[Tuple[int, int, int]] = []
+        self.size = 0
+        if self.restricted:
+            self._build(prefs)
+        else:
+            self.size = (
+                (self.range_high[0] - self.range_low[0] + 1)
+                * (self.range_high[1] - self.range_low[1] + 1)
+                * (self.range_high[2] - self.range_low[2] + 1)
+            )
+
+    def _build(self, prefs: ColorPreferences) -> None:
+        b_low, b_high = self.range_low[2], self.range_high[2]
+        lower_bounds: List[Tuple[float, bool]] = []
+        upper_bounds: List[Tuple[float, bool]] = []
+        if prefs.exclude_dark:
+            lower_bounds.append((prefs.dark_luminance_threshold, False))
+        if prefs.ensure_readable:
+            lower_bounds.append((50, True))
+            upper_bounds.append((200, True))
+        if prefs.exclude_bright:
+            upper_bounds.append((prefs.bright_luminance_threshold, False))
+        black_threshold = int(prefs.exclude_blacks_threshold[1:], 16) if prefs.exclude_blacks else -1
+
+        def lower_ok(base: float, b: int) -> bool:
+            luminance = base + 0.0722 * b
+            return all(luminance > limit if strict else luminance >= limit for limit, strict in lower_bounds)
+
+        def upper_ok(base: float, b: int) -> bool:
+            luminance = base + 0.0722 * b
+            return all(luminance < limit if strict else luminance <= limit for limit, strict in upper_bounds)
+
+        total = 0
+        for r in range(self.range_low[0], self.range_high[0] + 1):
+            for g in range(self.range_low[1], self.range_high[1] + 1):
+                # Same operation order as calculate_luminance, for identical rounding.
+                base = 0.2126 * r + 0.7152 * g
+                start, stop = b_low, b_high
+                if black_threshold >= 0:
+                    start = max(start, black_threshold - ((r << 16) | (g << 8)) + 1)
+                if lower_bounds:
+                    limit = max(limit for limit, _ in lower_bounds)
+                    guess = min(max(start, int((limit - base) / 0.0722)), stop + 1)
+                    while guess > start and lower_ok(base, guess - 1):
+                        guess -= 1
+                    while guess <= stop and not lower_ok(base, guess):
+                        guess += 1
+                    start = guess
+                if upper_bounds and start <= stop:
+                    limit = min(limit for limit, _ in upper_bounds)
+                    guess = max(min(stop, int((limit - base) / 0.0722) + 1), start - 1)
+                    while guess < stop and upper_ok(base, guess + 1):
+                        guess += 1
+                    while guess >= start and not upper_ok(base, guess):
+                        guess -= 1
+                    stop = guess
+                if start <= stop:
+                    self._offsets.append(total)
+                    self._rows.append((r, g, start))
+                    total += stop - start + 1
+        self.size = total
+
+    def sample(self, rng: random.Random) -> str:
+        if not self.restricted:
+            r = rng.randint(self.range_low[0], self.range_high[0])
+            g = rng.randint(self.range_low[1], self.range_high[1])
+            b = rng.randint(self.range_low[2], self.range_high[2])
+            return f"#{r:02X}{g:02X}{b:02X}"
+        index = rng.randrange(self.size)
+        row = bisect.bisect_right(self._offsets, index) - 1
+        r, g, b_start = self._rows[row]
+        return f"#{r:02X}{g:02X}{b_start + index - self._offsets[row]:02X}"
+
+
+_PALETTE_CACHE: Dict[Tuple[object, ...], ColorPalette] = {}
+
+
+def build_color_palette(prefs: ColorPreferences) -> ColorPalette:
+    key = (
+        tuple(prefs.color_range),
+        prefs.exclude_dark,
+        prefs.exclude_bright,
+        prefs.exclude_blacks,
+        prefs.exclude_blacks_threshold,
+        prefs.ensure_readable,
+        prefs.dark_luminance_threshold,
+        prefs.bright_luminance_threshold,
+    )
+    palette = _PALETTE_CACHE.get(key)
+    if palette is None:
+        palette = _PALETTE_CACHE[key] = ColorPalette(prefs)
+    return palette
+
+
+class ColorGenerator:
+    def __init__(self, prefs: ColorPreferences, offset: int = 0, seed: Optional[int] = None) -> None:
         self.prefs = prefs
+        self._rng = random.Random(prefs.seed if seed is None else seed)
+        self._palette: Optional[ColorPalette] = None
         if prefs.source == "list":
             if not prefs.colors:
                 raise ValueError("Color list cannot be empty when color-source is 'list'.")
-            self._list_cycle = cycle(prefs.colors)
+            start = offset % len(prefs.colors)
+            self._list_cycle = cycle(prefs.colors[start:] + prefs.colors[:start])
         else:
             self._list_cycle = None
-        low, high = prefs.color_range
-        self._range_low = tuple(int(low[i : i + 2], 16) for i in (1, 3, 5))
-        self._range_high = tuple(int(high[i : i + 2], 16) for i in (1, 3, 5))
+            self._palette = build_color_palette(prefs)
+            if not self._palette.size:
+                logging.warning("No colour satisfies the configured constraints; falling back to unrestricted colours.")
 
     def next_color(self) -> str:
         if self._list_cycle is not None:
             return next(self._list_cycle)
-        for _ in range(self.prefs.max_attempts):
-            r = random.randint(self._range_low[0], self._range_high[0])
-            g = random.randint(self._range_low[1], self._range_high[1])
-            b = random.randint(self._range_low[2], self._range_high[2])
-            candidate = f"#{r:02X}{g:02X}{b:02X}"
-            if not self._should_exclude(candidate):
-                return candidate
-        logging.warning(
-            "Failed to generate a colour meeting the constraints after %s attempts; falling back to unrestricted colour.",
-            self.prefs.max_attempts,
-        )
-        return f"#{random.randint(0, 0xFFFFFF):06X}"
+        if self._palette is not None and self._palette.size:
+            return self._palette.sample(self._rng)
+        return f"#{self._rng.randint(0, 0xFFFFFF):06X}"
 
-    def _should_exclude(self, color: str) -> bool:
-        luminance: Optional[float] = None
-        if self.prefs.exclude_dark or self.prefs.exclude_bright or self.prefs.ensure_readable:
-            luminance = calculate_luminance(color)
-        if self.prefs.exclude_dark and luminance is not None and luminance < self.prefs.dark_luminance_threshold:
-            return True
-        if self.prefs.exclude_bright and luminance is not None and luminance > self.prefs.bright_luminance_threshold:
-            return True
-        if self.prefs.exclude_blacks and is_black_color(color, self.prefs.exclude_blacks_threshold):
-            return True
-        if self.prefs.ensure_readable and luminance is not None and not (50 < luminance < 200):
+
+def slice_color_generator(prefs: ColorPreferences, title: str, index: int, offset: int) -> ColorGenerator:
+    if prefs.source == "list" or prefs.seed is None:
+        return ColorGenerator(prefs, offset)
+    digest = hashlib.sha256(f"{prefs.seed}\0{title}\0{index}".encode("utf-8", "surrogateescape")).digest()
+    return ColorGenerator(prefs, seed=int.from_bytes(digest[:8], "big"))
+
+
+GLOB_CHARACTERS = frozenset("*?[")
+
+
+def _glob_to_regex(pattern: str) -> str:
+    parts: List[str] = []
+    index = 0
+    length = len(pattern)
+    while index < length:
+        char = pattern[index]
+        if pattern.startswith("**/", index) and (index == 0 or pattern[index - 1] == "/"):
+            parts.append("(?:.*/)?")
+            index += 3
+        elif pattern.startswith("**", index) and index + 2 == length and (index == 0 or pattern[index - 1] == "/"):
+            parts.append(".*")
+            index += 2
+        elif char == "*":
+            parts.append("[^/]*")
+            index += 1
+        elif char == "?":
+            parts.append("[^/]")
+            index += 1
+        elif char == "[":
+            search_from = index + 1
+            if pattern[search_from : search_from + 1] in ("!", "^"):
+                search_from += 1
+            # A ']' directly after the opening bracket is a literal member.
+            end = pattern.find("]", search_from + 1)
+            if end == -1:
+                parts.append(re.escape(char))
+                index += 1
+                continue
+            body = pattern[index + 1 : end]
+            if body.startswith("!"):
+                body = "^" + body[1:]
+            parts.append(f"[{body.replace(chr(92), chr(92) * 2)}]")
+            index = end + 1
+        else:
+            parts.append(re.escape(char))
+            index += 1
+    return "".join(parts)
+
+
+def _compile_alternation(regexes: Sequence[str]) -> Optional[re.Pattern]:
+    if not regexes:
+        return None
+    return re.compile("(?:" + "|".join(regexes) + r")\Z", re.DOTALL)
+
+
+class IgnoreMatcher:
+    def __init__(self, patterns: Sequence[str]) -> None:
+        names: Set[str] = set()
+        dir_names: Set[str] = set()
+        name_globs: List[str] = []
+        dir_name_globs: List[str] = []
+        path_globs: List[str] = []
+        dir_path_globs: List[str] = []
+        for raw in patterns:
+            item = raw.strip()
+            if not item:
+                continue
+            if item.startswith("!"):
+                logging.warning("Negated ignore pattern '%s' is not supported and will be skipped.", item)
+                continue
+            dir_only = item.endswith("/")
+            item = item.rstrip("/")
+            anchored = "/" in item
+            item = item.lstrip("/")
+            if not item:
+                continue
+            if item.endswith("/**"):
+                # Nothing below can be kept, so the directory itself is pruned.
+                item = item[:-3]
+                dir_only = True
+            is_glob = any(char in GLOB_CHARACTERS for char in item)
+            if not anchored and not is_glob:
+                (dir_names if dir_only else names).add(item)
+            elif not anchored:
+                (dir_name_globs if dir_only else name_globs).append(_glob_to_regex(item))
+            else:
+                (dir_path_globs if dir_only else path_globs).append(_glob_to_regex(item))
+        self.names = frozenset(names)
+        self.dir_names = frozenset(dir_names | names)
+        self._name_regex = _compile_alternation(name_globs)
+        self._dir_name_regex = _compile_alternation(name_globs + dir_name_globs)
+        self._path_regex = _compile_alternation(path_globs)
+        self._dir_path_regex = _compile_alternation(path_globs + dir_path_globs)
+        self.has_path_patterns = self._dir_path_regex is not None
+        self._dir_cache: Dict[str, bool] = {"": False}
+
+    def ignores_entry(self, parent: str, name: str, is_dir: bool = False) -> bool:
+        # Decides a single entry whose parent directory is already accepted.
+        if is_dir:
+            if name in self.dir_names:
+                return True
+            if self._dir_name_regex is not None and self._dir_name_regex.match(name):
+                return True
+            path_regex = self._dir_path_regex
+        else:
+            if name in self.names:
+                return True
+            if self._name_regex is not None and self._name_regex.match(name):
+                return True
+            path_regex = self._path_regex
+        if path_regex is None:
+            return False
+        return path_regex.match(f"{parent}/{name}" if parent else name) is not None
+
+    def ignores_dir(self, relative: str) -> bool:
+        cached = self._dir_cache.get(relative)
+        if cached is not None:
+            return cached
+        parent, _, name = relative.rpartition("/")
+        decision = self.ignores_dir(parent) or self.ignores_entry(parent, name, is_dir=True)
+        self._dir_cache[relative] = decision
+        return decision
+
+    def ignores(self, relative: str, is_dir: bool = False) -> bool:
+        parent, _, name = relative.rpartition("/")
+        if parent and self.ignores_dir(parent):
             return True
+        return self.ignores_entry(parent, name, is_dir)
+
+
+@functools.lru_cache(maxsize=32)
+def compile_ignore_matcher(patterns: Tuple[str, ...]) -> IgnoreMatcher:
+    return IgnoreMatcher(patterns)
+
+
+def as_ignore_matcher(ignore: Sequence[str] | IgnoreMatcher) -> IgnoreMatcher:
+    if isinstance(ignore, IgnoreMatcher):
+        return ignore
+    return compile_ignore_matcher(tuple(ignore))
+
+
+def should_ignore(path: Path, ignore_list: Sequence[str] | IgnoreMatcher, is_dir: bool = False) -> bool:
+    relative = "/".join(part for part in path.parts if part not in ("", "."))
+    if not relative:
         return False
+    return as_ignore_matcher(ignore_list).ignores(relative, is_dir)
 
 
-def should_ignore(path: Path, ignore_list: Sequence[str]) -> bool:
-    parts = [part for part in path.parts if part not in ("", ".")]
-    for ignore in ignore_list:
-        item = ignore.strip()
-        if not item:
-            continue
-        if item in parts:
-            return True
-    return False
-
-
-def collect_via_os(root: Path, ignore_list: Sequence[str]) -> List[Path]:
-    collected: List[Path] = []
-    walker = os.walk(root)
-    show_progress = logging.getLogger().isEnabledFor(logging.INFO) and sys.stderr.isatty()
-    iterator = tqdm(walker, desc="Walking through directories", disable=not show_progress)
-    for current_root, dirs, files in iterator:
-        relative_root = Path(current_root).relative_to(root)
-        dirs[:] = [
-            d
-            for d in dirs
-            if not should_ignore((relative_root / d) if relative_root != Path(".") else Path(d), ignore_list)
-        ]
-        for file_name in files:
-            rel_path = (relative_root / file_name) if relative_root != Path(".") else Path(file_name)
-            if should_ignore(rel_path, ignore_list):
-                continue
-            collected.append(rel_path)
-    collected.sort(key=lambda path: path.as_posix().lower())
+class NullProgress:
+    def __init__(self, iterable: Optional[Iterable[T]] = None) -> None:
+        self.iterable = iterable
+
+    def __iter__(self) -> Iterator[T]:
+        return iter(self.iterable or ())
+
+    def update(self, count: int = 1) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+
+def progress_bar(iterable: Optional[Iterable[T]] = None, **kwargs: object) -> NullProgress:
+    # tqdm is slow to import, so it is only loaded when a bar is drawn.
+    if not (logging.getLogger().isEnabledFor(logging.INFO) and sys.stderr.isatty()):
+        return NullProgress(iterable)
+    from tqdm import tqdm
+
+    return tqdm(iterable, **kwargs)
+
+
+class PathTable(Sequence[str]):
+    def __init__(self, paths: Iterable[str] = ()) -> None:
+        self.directories: List[str] = []
+        self.prefixes: List[str] = []
+        self._sort_prefixes: List[str] = []
+        self._directory_ids: Dict[str, int] = {}
+        self.parents = array("I")
+        self._packed = ""
+        self._pending: List[str] = []
+        self._ordered = True
+        self._offsets: Optional[array] = None
+        for path in paths:
+            self.append_path(path)
+
+    def directory_id(self, directory: str) -> int:
+        index = self._directory_ids.get(directory)
+        if index is None:
+            index = self._directory_ids[directory] = len(self.directories)
+            prefix = f"{directory}/" if directory else ""
+            self.directories.append(directory)
+            self.prefixes.append(prefix)
+            self._sort_prefixes.append(prefix.lower())
+        return index
+
+    def append(self, directory: str, name: str) -> None:
+        self.parents.append(self.directory_id(directory))
+        self._pending.append(name)
+        self._ordered = False
+
+    def extend(self, directory: str, names: Iterable[str]) -> None:
+        start = len(self._pending)
+        self._pending.extend(names)
+        self.parents.extend(repeat(self.directory_id(directory), len(self._pending) - start))
+        self._ordered = False
+
+    def append_path(self, path: str) -> None:
+        directory, _, name = path.rpartition("/")
+        self.append(directory, name)
+
+    def _names(self) -> List[str]:
+        if self._pending:
+            names = self._unpacked() + self._pending
+            self._pack(names)
+            return names
+        return self._unpacked()
+
+    def _unpacked(self) -> List[str]:
+        if len(self.parents) == len(self._pending):
+            return []
+        return self._packed.split("\0")
+
+    def _pack(self, names: List[str]) -> None:
+        self._packed = "\0".join(names)
+        self._pending = []
+        self._offsets = None
+
+    def compact(self) -> None:
+        self._names()
+
+    def discard_paths(self, paths: Iterable[str]) -> int:
+        targets: Set[Tuple[int, str]] = set()
+        for path in paths:
+            directory, _, name = path.rpartition("/")
+            index = self._directory_ids.get(directory)
+            if index is not None:
+                targets.add((index, name))
+        if not targets:
+            return 0
+        parents = array("I")
+        names: List[str] = []
+        for row in self.unordered_rows():
+            if row not in targets:
+                parents.append(row[0])
+                names.append(row[1])
+        dropped = len(self.parents) - len(parents)
+        self.parents = parents
+        self._pack(names)
+        return dropped
+
+    def unordered_rows(self) -> Iterator[Tuple[int, str]]:
+        return zip(self.parents, self._names())
+
+    def sort(self) -> None:
+        if self._ordered:
+            return
+        names = self._names()
+        lowered = self._sort_prefixes
+        keys = list(map(str.__add__, map(lowered.__getitem__, self.parents), map(str.lower, names)))
+        order = sorted(range(len(keys)), key=keys.__getitem__)
+        del keys
+        self.parents = array("I", map(self.parents.__getitem__, order))
+        self._pack(list(map(names.__getitem__, order)))
+        self._ordered = True
+
+    def rows(self) -> Iterator[Tuple[int, str]]:
+        self.sort()
+        return self.unordered_rows()
+
+    def __len__(self) -> int:
+        return len(self.parents)
+
+    def __iter__(self) -> Iterator[str]:
+        self.sort()
+        return map(str.__add__, map(self.prefixes.__getitem__, self.parents), self._names())
+
+    def __getitem__(self, index):  # noqa: ANN001, ANN204
+        if isinstance(index, slice):
+            return [self[position] for position in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("PathTable index out of range")
+        self.sort()
+        if self._offsets is None:
+            # Name offsets are only indexed on first random access.
+            self._offsets = array("Q", accumulate((len(name) + 1 for name in self._names()), initial=0))
+        start, end = self._offsets[index], self._offsets[index + 1] - 1
+        return self.prefixes[self.parents[index]] + self._packed[start:end]
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, (PathTable, list, tuple)):
+            return NotImplemented
+        return len(self) == len(other) and all(mine == theirs for mine, theirs in zip(self, other))
+
+    __hash__ = None  # type: ignore[assignment]
+
+    def __repr__(self) -> str:
+        return f"<PathTable: {len(self)} paths in {len(self.directories)} directories>"
+
+    def subtree(self, relative: str) -> "PathTable":
+        directory = relative.rstrip("/")
+        prefix = directory + "/"
+        table = PathTable()
+        remapped: List[Optional[int]] = []
+        for candidate in self.directories:
+            if candidate == directory:
+                remapped.append(table.directory_id(""))
+            elif candidate.startswith(prefix):
+                remapped.append(table.directory_id(candidate[len(prefix) :]))
+            else:
+                remapped.append(None)
+        for parent, name in self.unordered_rows():
+            target = remapped[parent]
+            if target is not None:
+                table.parents.append(target)
+                table._pending.append(name)
+        table._ordered = self._ordered
+        return table
+
+    def to_json(self) -> Dict[str, object]:
+        return {
+            "directories": self.directories,
+            "parents": self.parents.tolist(),
+            "names": self._names(),
+            "ordered": self._ordered,
+        }
+
+    @classmethod
+    def from_json(cls, data: object) -> Optional["PathTable"]:
+        if not isinstance(data, dict):
+            return None
+        directories, parents, names = data.get("directories"), data.get("parents"), data.get("names")
+        if not (isinstance(directories, list) and isinstance(parents, list) and isinstance(names, list)):
+            return None
+        if len(parents) != len(names) or not all(isinstance(name, str) for name in names):
+            return None
+        table = cls()
+        try:
+            for directory in directories:
+                table.directory_id(directory)
+            table.parents = array("I", parents)
+        except (TypeError, ValueError, OverflowError):
+            return None
+        if len(table.directories) != len(directories) or any(parent >= len(directories) for parent in table.parents):
+            return None
+        table._pack(names)
+        if table._packed.count("\0") != max(0, len(names) - 1):
+            return None
+        table._ordered = data.get("ordered") is True
+        return table
+
+
+def walk_paths(root: Path, ignore_list: Sequence[str] | IgnoreMatcher) -> PathTable:
+    matcher = as_ignore_matcher(ignore_list)
+    collected = PathTable()
+    root_str = os.fspath(root)
+    walker = os.walk(root_str)
+    for current_root, dirs, files in progress_bar(walker, desc="Walking through directories"):
+        relative_root = os.path.relpath(current_root, root_str).replace(os.sep, "/")
+        if relative_root == ".":
+            relative_root = ""
+        dirs[:] = [d for d in dirs if not matcher.ignores_entry(relative_root, d, is_dir=True)]
+        collected.extend(relative_root, (name for name in files if not matcher.ignores_entry(relative_root, name)))
+    collected.compact()
     return collected
 
 
-def collect_via_git(root: Path, ignore_list: Sequence[str]) -> Optional[List[Path]]:
+def collect_via_os(root: Path, ignore_list: Sequence[str] | IgnoreMatcher) -> List[Path]:
+    return [Path(entry) for entry in walk_paths(root, ignore_list)]
+
+
+def _scan_directory(root: str, relative: str, matcher: IgnoreMatcher) -> Tuple[List[str], List[str]]:
+    files: List[str] = []
+    subdirs: List[str] = []
+    prefix = f"{relative}/" if relative else ""
     try:
-        repo_root = (
-            subprocess.run(
-                ["git", "rev-parse", "--show-toplevel"],
-                cwd=root,
-                check=True,
-                capture_output=True,
-                text=True,
-            )
-            .stdout.strip()
-        )
-    except (subprocess.CalledProcessError, FileNotFoundError, OSError) as exc:
-        logging.debug("Unable to determine git repository root: %s", exc)
+        with os.scandir(os.path.join(root, relative) if relative else root) as entries:
+            for entry in entries:
+                name = entry.name
+                try:
+                    is_dir = entry.is_dir()
+                except OSError:
+                    is_dir = False
+                # Ancestors were already pruned.
+                if matcher.ignores_entry(relative, name, is_dir):
+                    continue
+                if not is_dir:
+                    files.append(name)
+                elif not entry.is_symlink():
+                    subdirs.append(prefix + name)
+    except OSError as exc:
+        logging.debug("Unable to scan '%s': %s", relative or root, exc)
+    return files, subdirs
+
+
+def default_discovery_workers() -> int:
+    return min(32, (os.cpu_count() or 1) + 4)
+
+
+def scandir_paths(root: Path, ignore_list: Sequence[str] | IgnoreMatcher, workers: int = 0) -> PathTable:
+    matcher = as_ignore_matcher(ignore_list)
+    root_str = os.fspath(root)
+    collected = PathTable()
+    progress = progress_bar(desc="Scanning directories", unit="dir")
+    with ThreadPoolExecutor(max_workers=workers if workers > 0 else default_discovery_workers()) as pool:
+        pending: Dict[Future, str] = {pool.submit(_scan_directory, root_str, "", matcher): ""}
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                relative = pending.pop(future)
+                files, subdirs = future.result()
+                collected.extend(relative, files)
+                for subdir in subdirs:
+                    pending[pool.submit(_scan_directory, root_str, subdir, matcher)] = subdir
+                progress.update(1)
+    progress.close()
+    collected.compact()
+    return collected
+
+
+def collect_via_scandir(root: Path, ignore_list: Sequence[str] | IgnoreMatcher, workers: int = 0) -> List[Path]:
+    return [Path(entry) for entry in scandir_paths(root, ignore_list, workers)]
+
+
+class RunMetrics:
+    def __init__(self, profile: Sequence[str] = (), trace_memory: Sequence[str] = (), profile_prefix: Optional[Path] = None) -> None:
+        self.profile = set(profile)
+        self.trace_memory = set(trace_memory)
+        self.profile_prefix = profile_prefix
+        self.phases: Dict[str, Dict[str, object]] = {}
+        self.counters: Dict[str, int] = {}
+        self.commands: Dict[str, Dict[str, float]] = {}
+        self._lock = threading.Lock()
+        self._started = (time.perf_counter(), time.process_time())
+
+    def reset(self, profile: Sequence[str] = (), trace_memory: Sequence[str] = (), profile_prefix: Optional[Path] = None) -> None:
+        with self._lock:
+            self.profile = set(profile)
+            self.trace_memory = set(trace_memory)
+            self.profile_prefix = profile_prefix
+            self.phases = {}
+            self.counters = {}
+            self.commands = {}
+            self._started = (time.perf_counter(), time.process_time())
+
+    def _phase_entry(self, name: str) -> Dict[str, object]:
+        return self.phases.setdefault(name, {"wall_seconds": 0.0, "cpu_seconds": 0.0, "calls": 0})
+
+    def add_time(self, name: str, wall: float, cpu: float) -> None:
+        with self._lock:
+            entry = self._phase_entry(name)
+            entry["wall_seconds"] += wall  # type: ignore[operator]
+            entry["cpu_seconds"] += cpu  # type: ignore[operator]
+            entry["calls"] += 1  # type: ignore[operator]
+
+    @contextlib.contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        # Profilers and tracemalloc are process-wide; only hook the main thread.
+        hooked = threading.current_thread() is threading.main_thread()
+        profiler = None
+        if hooked and name in self.profile:
+            import cProfile
+
+            profiler = cProfile.Profile()
+        tracing = hooked and name in self.trace_memory
+        if tracing:
+            import tracemalloc
+
+            tracemalloc.start()
+        wall, cpu = time.perf_counter(), time.process_time()
+        if profiler is not None:
+            profiler.enable()
+        try:
+            yield
+        finally:
+            if profiler is not None:
+                profiler.disable()
+            self.add_time(name, time.perf_counter() - wall, time.process_time() - cpu)
+            if tracing:
+                self._record_tracemalloc(name)
+            if profiler is not None:
+                target = Path(f"{self.profile_prefix}.{name}.prof") if self.profile_prefix else Path(f"{name}.prof")
+                profiler.dump_stats(str(target))
+                with self._lock:
+                    self._phase_entry(name)["profile"] = str(target)
+
+    def _record_tracemalloc(self, name: str) -> None:
+        import tracemalloc
+
+        _, peak = tracemalloc.get_traced_memory()
+        top = tracemalloc.take_snapshot().statistics("lineno")[:10]
+        tracemalloc.stop()
+        with self._lock:
+            entry = self._phase_entry(name)
+            entry["tracemalloc_peak_bytes"] = peak
+            entry["top_allocations"] = [
+                {"site": str(stat.traceback[0]), "bytes": stat.size, "blocks": stat.count} for stat in top
+            ]
+
+    def timed(self, name: str, iterable: Iterable[T]) -> Iterator[T]:
+        iterator = iter(iterable)
+        wall = cpu = 0.0
+        try:
+            while True:
+                wall_start, cpu_start = time.perf_counter(), time.process_time()
+                try:
+                    item = next(iterator)
+                finally:
+                    wall += time.perf_counter() - wall_start
+                    cpu += time.process_time() - cpu_start
+                yield item
+        except StopIteration:
+            return
+        finally:
+            self.add_time(name, wall, cpu)
+
+    def add(self, name: str, value: int = 1) -> None:
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def record_command(self, args: Sequence[str], seconds: float) -> None:
+        label = " ".join(str(part) for part in args[:2])
+        with self._lock:
+            entry = self.commands.setdefault(label, {"count": 0, "seconds": 0.0})
+            entry["count"] += 1
+            entry["seconds"] += seconds
+
+    def as_dict(self) -> Dict[str, object]:
+        counters = dict(self.counters)
+        generated = counters.pop("colors_generated", 0)
+        return {
+            "version": METRICS_VERSION,
+            "total": {
+                "wall_seconds": time.perf_counter() - self._started[0],
+                "cpu_seconds": time.process_time() - self._started[1],
+            },
+            "phases": self.phases,
+            "counts": {key: value for key, value in counters.items() if not key.startswith(("colors_", "output_"))},
+            "colors": {
+                "generated": generated,
+                # Palette colours never need a retry.
+                "attempts": generated,
+                "fallbacks": counters.get("colors_fallbacks", 0),
+            },
+            "subprocesses": {
+                "count": sum(int(entry["count"]) for entry in self.commands.values()),
+                "seconds": sum(entry["seconds"] for entry in self.commands.values()),
+                "commands": self.commands,
+            },
+            "output": {key[len("output_") :]: value for key, value in counters.items() if key.startswith("output_")},
+            "memory": peak_rss(),
+        }
+
+
+def save_metrics(path: Path, recorded: RunMetrics) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(recorded.as_dict(), indent=2) + "\n", encoding="utf-8")
+
+
+def peak_rss() -> Dict[str, Optional[int]]:
+    try:
+        import resource
+    except ImportError:
+        return {"peak_rss_bytes": None, "children_peak_rss_bytes": None}
+    # ru_maxrss is reported in kilobytes on Linux and in bytes on macOS.
+    scale = 1 if sys.platform == "darwin" else 1024
+    return {
+        "peak_rss_bytes": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale,
+        "children_peak_rss_bytes": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * scale,
+    }
+
+
+run_metrics = RunMetrics()
+
+
+def run_command(args: Sequence[str], check: bool = False, **kwargs: object) -> subprocess.CompletedProcess:
+    start = time.perf_counter()
+    try:
+        completed = subprocess.run(args, check=check, **kwargs)  # type: ignore[call-overload]
+        # Unchecked callers read the exit status themselves; note it for debugging.
+        if not check and completed.returncode != 0:
+            logging.debug("%s exited with status %d", " ".join(str(part) for part in args[:2]), completed.returncode)
+        return completed
+    finally:
+        run_metrics.record_command(args, time.perf_counter() - start)
+
+
+def iter_nul_records(stream: BinaryIO, block_size: int = GIT_READ_BLOCK_SIZE) -> Iterator[bytes]:
+    remainder = b""
+    while True:
+        block = stream.read(block_size)
+        if not block:
+            break
+        records = (remainder + block).split(b"\0")
+        remainder = records.pop()
+        yield from records
+    if remainder:
+        yield remainder
+
+
+def read_git_paths(
+    args: Sequence[str], cwd: Path, prefix: str = "", matcher: Optional[IgnoreMatcher] = None
+) -> Optional[PathTable]:
+    # Paths are filtered on raw bytes and only decoded once they are kept.
+    prefix_bytes = prefix.encode("utf-8", "surrogateescape")
+    strip = len(prefix_bytes)
+    command = ["git", *args]
+    start = time.perf_counter()
+    try:
+        process = subprocess.Popen(command, cwd=cwd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    except (FileNotFoundError, OSError) as exc:
+        run_metrics.record_command(command, time.perf_counter() - start)
+        logging.debug("git %s failed to start: %s", args[0] if args else "", exc)
+        return None
+    paths = PathTable()
+    with process:
+        for record in iter_nul_records(process.stdout):  # type: ignore[arg-type]
+            if len(record) > strip and record.startswith(prefix_bytes):
+                path = record[strip:].decode("utf-8", "surrogateescape")
+                if matcher is None or not matcher.ignores(path):
+                    paths.append_path(path)
+        returncode = process.wait()
+    paths.compact()
+    run_metrics.record_command(command, time.perf_counter() - start)
+    if returncode != 0:
+        logging.debug("git %s exited with status %d", " ".join(args), returncode)
         return None
-    repo_root_path = Path(repo_root).resolve()
+    return paths
+
+
+def git_paths(root: Path, ignore_list: Sequence[str] | IgnoreMatcher, include_untracked: bool = True) -> Optional[PathTable]:
+    matcher = as_ignore_matcher(ignore_list)
+    repo_root_path = read_git_toplevel(root)
+    if repo_root_path is None:
+        try:
+            repo_root = (
+                run_command(
+                    ["git", "rev-parse", "--show-toplevel"],
+                    cwd=root,
+                    check=True,
+                    capture_output=True,
+                    text=True,
+                )
+                .stdout.strip()
+            )
+        except (subprocess.CalledProcessError, FileNotFoundError, OSError) as exc:
+            logging.debug("Unable to determine git repository root: %s", exc)
+            return None
+        repo_root_path = Path(repo_root).resolve()
     try:
         root.relative_to(repo_root_path)
     except ValueError:
         logging.debug("Directory '%s' is not contained within git root '%s'", root, repo_root_path)
         return None
-    try:
-        ls_output = subprocess.run(
-            ["git", "ls-files", "--cached", "--others", "--exclude-standard"],
-            cwd=repo_root_path,
-            check=True,
-            capture_output=True,
-            text=True,
-        ).stdout
-    except (subprocess.CalledProcessError, FileNotFoundError, OSError) as exc:
-        logging.debug("git ls-files failed: %s", exc)
+    relative_root = os.path.relpath(root, repo_root_path).replace(os.sep, "/")
+    command = ["ls-files", "-z", "--cached"]
+    if include_untracked:
+        command += ["--others", "--exclude-standard"]
+    prefix = ""
+    if relative_root != ".":
+        prefix = relative_root + "/"
+        command += ["--", f":(literal){relative_root}"]
+    files = read_git_paths(command, repo_root_path, prefix, matcher)
+    if files is None:
         return None
-    files: List[Path] = []
-    for line in ls_output.splitlines():
-        candidate = line.strip()
-        if not candidate:
-            continue
-        repo_relative = Path(candidate)
-        abs_path = (repo_root_path / repo_relative).resolve()
-        try:
-            rel_to_target = abs_path.relative_to(root)
-        except ValueError:
-            continue
-        if rel_to_target == Path(".") or should_ignore(rel_to_target, ignore_list):
-            continue
-        files.append(rel_to_target)
-    files.sort(key=lambda path: path.as_posix().lower())
     logging.debug("Collected %d files via git ls-files", len(files))
     return files
 
 
-def collect_files(config: GeneratorConfig) -> List[Path]:
-    if config.respect_gitignore:
-        git_files = collect_via_git(config.directory, config.ignore_list)
-        if git_files is not None:
-            return git_files
-        logging.info("Falling back to filesystem traversal; git-aware discovery unavailable.")
-    return collect_via_os(config.directory, config.ignore_list)
+def git_ref_paths(root: Path, ignore_list: Sequence[str] | IgnoreMatcher, revision: str) -> Optional[PathTable]:
+    files = read_git_paths(["ls-tree", "-r", "-z", "--name-only", revision], root, matcher=as_ignore_matcher(ignore_list))
+    if files is not None:
+        logging.debug("Collected %d files from %s via git ls-tree", len(files), revision)
+    return files
 
 
-def normalize_repo_url(url: Optional[str]) -> Optional[str]:
-    if not url:
-        return None
-    candidate = url.strip()
-    if not candidate:
+def collect_via_git(root: Path, ignore_list: Sequence[str] | IgnoreMatcher) -> Optional[List[Path]]:
+    files = git_paths(root, ignore_list)
+    if files is None:
         return None
-    if candidate.startswith("git@") and ":" in candidate:
-        user_host, path = candidate.split(":", 1)
-        host = user_host.split("@", 1)[1]
-        candidate = f"https://{host}/{path}"
-    if candidate.startswith("ssh://"):
-        candidate = candidate.replace("ssh://", "https://", 1)
-        candidate = candidate.replace("git@", "", 1)
-    candidate = candidate.rstrip("/")
-    if candidate.endswith(".git"):
-        candidate = candidate[:-4]
-    return candidate
+    return [Path(entry) for entry in files]
 
 
-def resolve_repo_url(provided: Optional[str], fallback: Optional[str], directory: Path) -> Optional[str]:
-    explicit = normalize_repo_url(provided)
-    if explicit:
-        return explicit
-    env_repo = os.getenv("GITHUB_REPOSITORY")
-    if env_repo:
-        env_url = normalize_repo_url(f"https://github.com/{env_repo}")
-        if env_url:
-            return env_url
-    try:
-        remote_url = (
-            subprocess.run(
-                ["git", "config", "--get", "remote.origin.url"],
-                cwd=directory,
-                check=True,
-                capture_output=True,
-                text=True,
-            )
-            .stdout.strip()
-        )
-    except (subprocess.CalledProcessError, FileNotFoundError, OSError):
-        remote_url = ""
-    normalized_remote = normalize_repo_url(remote_url)
-    if normalized_remote:
-        return normalized_remote
-    fallback_url = normalize_repo_url(fallback)
-    if fallback_url:
-        return fallback_url
-    return normalize_repo_url(DEFAULT_FALLBACK_REPO_URL)
+def find_git_dir(start: Path) -> Optional[Tuple[Path, Path]]:
+    if os.environ.get("GIT_DIR"):
+        return None
+    current = start
+    while True:
+        candidate = current / ".git"
+        if candidate.is_dir():
+            return current, candidate
+        if candidate.is_file():
+            try:
+                pointer = candidate.read_text(encoding="utf-8").strip()
+            except OSError:
+                return None
+            if not pointer.startswith("gitdir:"):
+                return None
+            git_dir = Path(pointer[len("gitdir:") :].strip())
+            if not git_dir.is_absolute():
+                git_dir = current / git_dir
+            return current, git_dir.resolve()
+        if current.parent == current:
+            return None
+        current = current.parent
 
 
-def resolve_default_branch(provided: Optional[str], directory: Path) -> str:
-    if provided and provided.strip():
-        return provided.strip()
-    env_branch = os.getenv("GITHUB_REF_NAME") or os.getenv("GITHUB_HEAD_REF")
-    if env_branch:
-        return env_branch
+def git_common_dir(git_dir: Path) -> Path:
     try:
-        branch = (
-            subprocess.run(
-                ["git", "symbolic-ref", "--short", "HEAD"],
-                cwd=directory,
-                check=True,
-                capture_output=True,
-                text=True,
-            )
-            .stdout.strip()
-        )
-        if branch:
-            return branch
-    except (subprocess.CalledProcessError, FileNotFoundError, OSError):
-        pass
-    return DEFAULT_LINK_REFERENCE
+        pointer = (git_dir / "commondir").read_text(encoding="utf-8").strip()
+    except OSError:
+        return git_dir
+    common = Path(pointer)
+    if not common.is_absolute():
+        common = git_dir / common
+    return common.resolve()
 
 
-def resolve_link_reference(link_ref: Optional[str], default_branch: Optional[str], directory: Path) -> str:
-    if link_ref and link_ref.strip():
-        return link_ref.strip()
-    return resolve_default_branch(default_branch, directory)
+def git_environment_overridden() -> bool:
+    return any(os.environ.get(name) for name in GIT_ENVIRONMENT_OVERRIDES)
 
 
-def build_file_url(repo_url: Optional[str], link_reference: str, relative_path: str) -> str:
-    encoded_path = urllib.parse.quote(relative_path, safe="/")
-    if not repo_url:
-        return encoded_path
-    base = repo_url.rstrip("/")
-    return f"{base}/blob/{link_reference}/{encoded_path}"
+def _parse_git_config_value(raw: str) -> Optional[str]:
+    value: List[str] = []
+    kept = 0
+    quoted = False
+    index = 0
+    while index < len(raw):
+        char = raw[index]
+        if char == '"':
+            quoted = not quoted
+            kept = len(value)
+        elif char == "\\":
+            index += 1
+            if index >= len(raw) or raw[index] not in GIT_CONFIG_ESCAPES:
+                # Continuation lines and unknown escapes are left to git itself.
+                return None
+            value.append(GIT_CONFIG_ESCAPES[raw[index]])
+            kept = len(value)
+        elif char in "#;" and not quoted:
+            break
+        else:
+            value.append(char)
+            if quoted or not char.isspace():
+                kept = len(value)
+        index += 1
+    if quoted:
+        return None
+    return "".join(value[:kept])
 
 
-def build_sections(files: Sequence[Path], categories: Sequence[Category], repo_root_header: str) -> List[Tuple[str, List[str]]]:
-    root_files: List[str] = []
-    category_map: Dict[str, List[str]] = {category.name: [] for category in categories}
-    other_folders: Dict[str, List[str]] = {}
-    for path in files:
-        posix = path.as_posix()
-        lower = posix.lower()
-        matched = False
-        for category in categories:
-            if lower.endswith(category.ext.lower()):
-                category_map[category.name].append(posix)
-                matched = True
-                break
-        if matched:
+def parse_git_config(text: str) -> Optional[Dict[str, List[str]]]:
+    values: Dict[str, List[str]] = {}
+    section: Optional[str] = None
+    for line in text.splitlines():
+        stripped = line.strip()
+        if stripped.startswith("["):
+            match = GIT_CONFIG_SECTION_PATTERN.match(stripped)
+            if match is None:
+                return None
+            name, subsection = match.group(1).lower(), match.group(2)
+            if name in ("include", "includeif"):
+                return None
+            if subsection is not None:
+                name = name + "." + re.sub(r"\\(.)", r"\1", subsection)
+            section = name
+            stripped = stripped[match.end() :].strip()
+        if not stripped or stripped[0] in "#;":
             continue
-        if "/" in posix:
-            folder = posix.rsplit("/", 1)[0]
-            other_folders.setdefault(folder, []).append(posix)
+        match = GIT_CONFIG_ENTRY_PATTERN.match(stripped)
+        if match is None or section is None:
+            return None
+        if match.group(2) is None:
+            value: Optional[str] = "true"
         else:
-            root_files.append(posix)
-    root_files.sort()
-    for entries in category_map.values():
-        entries.sort()
-    for entries in other_folders.values():
-        entries.sort()
-    sections: List[Tuple[str, List[str]]] = []
-    if root_files:
-        sections.append((repo_root_header, root_files))
-    for category in categories:
-        entries = category_map[category.name]
-        if entries:
-            sections.append((category.name, entries))
-    for folder in sorted(other_folders.keys(), key=lambda item: item.lower()):
-        sections.append((folder, other_folders[folder]))
-    return sections
+            value = _parse_git_config_value(match.group(2).strip())
+            if value is None:
+                return None
+        values.setdefault(f"{section}.{match.group(1).lower()}", []).append(value)
+    return values
 
 
-def build_lazyload_script(lazy: LazyLoadPreferences, chunk_data: Dict[str, str]) -> str:
-    viewport_rules = [
-        {
-            "maxWidth": lazy.viewport_mobile,
-            "rootMargin": lazy.root_margin_mobile,
-            "threshold": 0.1,
-        },
-        {
-            "maxWidth": lazy.viewport_tablet,
-            "rootMargin": lazy.root_margin_tablet,
-            "threshold": 0.3,
+def read_git_config(git_dir: Path) -> Optional[Dict[str, List[str]]]:
+    common_dir = git_common_dir(git_dir)
+    try:
+        values = parse_git_config((common_dir / "config").read_text(encoding="utf-8"))
+    except (OSError, UnicodeDecodeError):
+        return None
+    if values is None:
+        return None
+    if values.get("extensions.worktreeconfig", ["false"])[-1].lower() in TRUE_STRINGS:
+        try:
+            worktree_values = parse_git_config((git_dir / "config.worktree").read_text(encoding="utf-8"))
+        except FileNotFoundError:
+            worktree_values = {}
+        except (OSError, UnicodeDecodeError):
+            return None
+        if worktree_values is None:
+            return None
+        for key, entries in worktree_values.items():
+            values.setdefault(key, []).extend(entries)
+    return values
+
+
+def _locate_git_config(directory: Path) -> Optional[Tuple[Path, Path, Dict[str, List[str]]]]:
+    if git_environment_overridden():
+        return None
+    located = find_git_dir(directory)
+    if located is None:
+        return None
+    values = read_git_config(located[1])
+    if values is None:
+        return None
+    return located[0], located[1], values
+
+
+def read_git_remote_url(directory: Path) -> Optional[str]:
+    located = _locate_git_config(directory)
+    if located is None:
+        return None
+    urls = located[2].get("remote.origin.url")
+    return urls[-1] if urls else None
+
+
+def read_git_head_branch(directory: Path) -> Optional[str]:
+    located = _locate_git_config(directory)
+    if located is None:
+        return None
+    try:
+        head = (located[1] / "HEAD").read_text(encoding="utf-8").strip()
+    except (OSError, UnicodeDecodeError):
+        return None
+    if head.startswith("ref: refs/heads/"):
+        branch = head[len("ref: refs/heads/") :]
+        # Reftable repositories keep a placeholder HEAD on disk.
+        return None if branch == ".invalid" else branch
+    if re.fullmatch(r"[0-9a-f]{40}|[0-9a-f]{64}", head):
+        return ""
+    return None
+
+
+def read_git_toplevel(directory: Path) -> Optional[Path]:
+    located = _locate_git_config(directory)
+    if located is None:
+        return None
+    worktree, _, values = located
+    if "core.worktree" in values or values.get("core.bare", ["false"])[-1].lower() in TRUE_STRINGS:
+        return None
+    return worktree.resolve()
+
+
+def git_object_id_size(common_dir: Path) -> int:
+    try:
+        config_text = (common_dir / "config").read_text(encoding="utf-8", errors="replace")
+    except OSError:
+        return 20
+    if re.search(r"^\s*objectformat\s*=\s*sha256\s*$", config_text, re.IGNORECASE | re.MULTILINE):
+        return 32
+    return 20
+
+
+def _read_index_varint(data: mmap.mmap | bytes, pos: int) -> Tuple[int, int]:
+    byte = data[pos]
+    pos += 1
+    value = byte & 0x7F
+    while byte & 0x80:
+        value += 1
+        byte = data[pos]
+        pos += 1
+        value = (value << 7) + (byte & 0x7F)
+    return value, pos
+
+
+def parse_git_index(data: mmap.mmap | bytes, hash_size: int = 20) -> Optional[List[str]]:
+    if data[:4] != GIT_INDEX_SIGNATURE:
+        raise ValueError("missing DIRC signature")
+    version, count = struct.unpack_from(">II", data, 4)
+    if version not in GIT_INDEX_VERSIONS:
+        raise ValueError(f"unsupported index version {version}")
+    # ctime, mtime, dev, ino, mode, uid, gid and size precede the object id.
+    flags_offset = 40 + hash_size
+    fixed_size = flags_offset + 2
+    pos = 12
+    previous = b""
+    paths: List[str] = []
+    for _ in range(count):
+        start = pos
+        mode = struct.unpack_from(">I", data, start + 24)[0]
+        flags = struct.unpack_from(">H", data, start + flags_offset)[0]
+        pos += fixed_size
+        if flags & 0x4000:
+            if version < 3:
+                raise ValueError("extended flags in a version 2 index")
+            pos += 2
+        if version == 4:
+            strip, pos = _read_index_varint(data, pos)
+            end = data.find(b"\0", pos)
+            if end == -1 or strip > len(previous):
+                raise ValueError("truncated index entry")
+            name = previous[: len(previous) - strip] + data[pos:end]
+            pos = end + 1
+        else:
+            end = data.find(b"\0", pos)
+            if end == -1:
+                raise ValueError("truncated index entry")
+            name = data[pos:end]
+            pos = start + (((end - start) + 8) & ~7)
+        if mode & 0o170000 == 0o040000:
+            # Sparse index directory entry; git expands these itself.
+            return None
+        previous = name
+        paths.append(name.decode("utf-8", "surrogateescape"))
+    limit = len(data) - hash_size
+    while pos + 8 <= limit:
+        signature = bytes(data[pos : pos + 4])
+        if signature == b"link":
+            # Split index: the shared index holds most entries.
+            return None
+        pos += 8 + struct.unpack_from(">I", data, pos + 4)[0]
+    return paths
+
+
+def read_git_index(index_path: Path, hash_size: int = 20) -> Optional[List[str]]:
+    try:
+        with index_path.open("rb") as handle:
+            if os.fstat(handle.fileno()).st_size == 0:
+                return []
+            with mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                return parse_git_index(data, hash_size)
+    except FileNotFoundError:
+        return []
+    except (OSError, ValueError, struct.error, IndexError) as exc:
+        logging.debug("Unable to read git index '%s': %s", index_path, exc)
+        return None
+
+
+def git_untracked_paths(
+    root: Path, matcher: Optional[IgnoreMatcher] = None, exclude_standard: bool = True
+) -> Optional[PathTable]:
+    command = ["ls-files", "-z", "--others"]
+    if exclude_standard:
+        command.append("--exclude-standard")
+    return read_git_paths(command, root, matcher=matcher)
+
+
+def git_index_paths(
+    root: Path, ignore_list: Sequence[str] | IgnoreMatcher, include_untracked: bool = True
+) -> Optional[PathTable]:
+    matcher = as_ignore_matcher(ignore_list)
+    # These relocate the index or work tree; leave them to git.
+    if git_environment_overridden():
+        logging.debug("Git environment overrides are set; listing files with git ls-files.")
+        return git_paths(root, matcher, include_untracked)
+    located = find_git_dir(root)
+    if located is None:
+        return None
+    worktree, git_dir = located
+    tracked = read_git_index(git_dir / "index", git_object_id_size(git_common_dir(git_dir)))
+    if tracked is None:
+        return None
+    relative_root = os.path.relpath(root, worktree).replace(os.sep, "/")
+    prefix = "" if relative_root == "." else relative_root + "/"
+    prefix_length = len(prefix)
+    files = PathTable()
+    for entry in tracked:
+        if prefix and not entry.startswith(prefix):
+            continue
+        relative = entry[prefix_length:]
+        if relative and not matcher.ignores(relative):
+            files.append_path(relative)
+    del tracked
+    if include_untracked:
+        # Untracked files are listed relative to the target directory already.
+        untracked = git_untracked_paths(root, matcher)
+        if untracked is None:
+            return None
+        for entry in untracked:
+            files.append_path(entry)
+    files.compact()
+    logging.debug("Collected %d files from the git index", len(files))
+    return files
+
+
+def discover_paths(config: GeneratorConfig) -> PathTable:
+    matcher = compile_ignore_matcher(tuple(config.ignore_list))
+    if config.source_ref is not None:
+        ref_files = git_ref_paths(config.directory, matcher, config.source_ref)
+        if ref_files is not None:
+            return ref_files
+        logging.warning("Could not list %s with git ls-tree; falling back to the working tree.", config.source_ref)
+    if config.respect_gitignore and config.git_backend == "index":
+        index_files = git_index_paths(config.directory, matcher, config.git_untracked)
+        if index_files is not None:
+            return index_files
+        logging.info("Git index could not be read directly; falling back to git ls-files.")
+    if config.respect_gitignore:
+        git_files = git_paths(config.directory, matcher)
+        if git_files is not None:
+            return git_files
+        logging.info("Falling back to filesystem traversal; git-aware discovery unavailable.")
+    if config.discovery_engine == "walk":
+        return walk_paths(config.directory, matcher)
+    return scandir_paths(config.directory, matcher, config.discovery_workers)
+
+
+def collect_files(config: GeneratorConfig) -> List[Path]:
+    return [Path(entry) for entry in discover_paths(config)]
+
+
+def git_source_key(root: Path, revision: str = "HEAD^{tree}") -> Optional[str]:
+    try:
+        tree_sha = (
+            run_command(
+                ["git", "rev-parse", revision],
+                cwd=root,
+                check=True,
+                capture_output=True,
+                text=True,
+            )
+            .stdout.strip()
+        )
+        status = run_command(
+            ["git", "status", "--porcelain=v1", "-z", "--untracked-files=all", "--", "."],
+            cwd=root,
+            check=True,
+            capture_output=True,
+        ).stdout
+    except (subprocess.CalledProcessError, FileNotFoundError, OSError) as exc:
+        logging.debug("Unable to compute git source key: %s", exc)
+        return None
+    if not tree_sha:
+        return None
+    digest = hashlib.sha256(status).hexdigest()
+    return f"git:{tree_sha}:{digest}"
+
+
+def mtime_source_key(root: Path, ignore_list: Sequence[str] | IgnoreMatcher, include_files: bool = False) -> str:
+    matcher = as_ignore_matcher(ignore_list)
+    # Directory mtimes cover adds, removes and renames; metadata runs also need file stats.
+    digest = hashlib.sha256()
+    pending = [""]
+    while pending:
+        relative = pending.pop()
+        current = root / relative if relative else root
+        try:
+            digest.update(f"{relative}\0{current.stat().st_mtime_ns}\n".encode("utf-8", "surrogateescape"))
+            names = []
+            with os.scandir(current) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        names.append(entry.name)
+                    elif include_files and not matcher.ignores_entry(relative, entry.name):
+                        info = entry.stat()
+                        digest.update(f"{entry.name}\0{info.st_size}\0{info.st_mtime_ns}\n".encode("utf-8", "surrogateescape"))
+            names.sort()
+        except OSError:
+            continue
+        for name in reversed(names):
+            child = f"{relative}/{name}" if relative else name
+            if not matcher.ignores_entry(relative, name, is_dir=True):
+                pending.append(child)
+    return f"mtime:{digest.hexdigest()}"
+
+
+def compute_source_key(config: GeneratorConfig) -> str:
+    # A listing taken from a commit is fully determined by it.
+    if config.source_ref is not None:
+        return f"ref:{config.source_ref}"
+    # A new commit can change last-commit data without changing the tree.
+    if config.respect_gitignore:
+        key = git_source_key(config.directory, "HEAD" if config.file_metadata else "HEAD^{tree}")
+        if key is not None:
+            return key
+    return mtime_source_key(config.directory, config.ignore_list, config.file_metadata)
+
+
+def format_size(size: int) -> str:
+    value = float(size)
+    for unit in ("B", "KB", "MB", "GB"):
+        if value < 1024:
+            break
+        value /= 1024
+    else:
+        unit = "TB"
+    if unit == "B":
+        return f"{size} B"
+    return f"{value:.1f} {unit}" if value < 10 else f"{value:.0f} {unit}"
+
+
+class FileMetadata:
+    def __init__(
+        self,
+        head: Optional[str] = None,
+        committed: Optional[Dict[str, Tuple[int, int, int]]] = None,
+        authors: Optional[List[str]] = None,
+        local: Optional[Dict[str, Tuple[int, int, int]]] = None,
+    ) -> None:
+        self.head = head
+        self.committed: Dict[str, Tuple[int, int, int]] = committed if committed is not None else {}
+        self.authors: List[str] = authors if authors is not None else []
+        self.local: Dict[str, Tuple[int, int, int]] = local if local is not None else {}
+        self._dates: Dict[int, str] = {}
+
+    def lookup(self, path: str) -> Optional[Tuple[int, int, Optional[str]]]:
+        row = self.committed.get(path) or self.local.get(path)
+        if row is None:
+            return None
+        size, timestamp, author = row
+        return size, max(timestamp, 0), self.authors[author] if author >= 0 else None
+
+    def label(self, path: str) -> str:
+        info = self.lookup(path)
+        if info is None:
+            return ""
+        size, timestamp, author = info
+        parts = [format_size(size)] if size >= 0 else []
+        if timestamp:
+            day = timestamp // 86400
+            date = self._dates.get(day)
+            if date is None:
+                date = self._dates[day] = time.strftime("%Y-%m-%d", time.gmtime(timestamp))
+            parts.append(date)
+        if author:
+            parts.append(author)
+        return " · ".join(parts)
+
+    def section_digest(self, entries: Sequence[str], exact: bool = False) -> str:
+        # Author indices are only stable within one history pass, so hash what is shown.
+        digest = hashlib.sha256()
+        for entry in entries:
+            shown = repr(self.lookup(entry)) if exact else self.label(entry)
+            digest.update(shown.encode("utf-8", "surrogateescape"))
+            digest.update(b"\n")
+        return digest.hexdigest()
+
+    def fields(self, path: str) -> Dict[str, object]:
+        info = self.lookup(path)
+        if info is None:
+            return {"size": None, "modified": None, "author": None}
+        size, timestamp, author = info
+        return {"size": size if size >= 0 else None, "modified": timestamp or None, "author": author}
+
+    def to_json(self) -> Dict[str, object]:
+        return {
+            "head": self.head,
+            "authors": self.authors,
+            "files": {path: list(row) for path, row in self.committed.items()},
+        }
+
+    @classmethod
+    def from_json(cls, data: object) -> Optional["FileMetadata"]:
+        if not isinstance(data, dict):
+            return None
+        head, authors, files = data.get("head"), data.get("authors"), data.get("files")
+        if not (isinstance(head, str) and isinstance(authors, list) and isinstance(files, dict)):
+            return None
+        if not all(isinstance(author, str) for author in authors):
+            return None
+        try:
+            committed = {path: (int(size), int(timestamp), int(author)) for path, (size, timestamp, author) in files.items()}
+        except (TypeError, ValueError):
+            return None
+        if any(not -1 <= row[2] < len(authors) for row in committed.values()):
+            return None
+        return cls(head, committed, authors)
+
+
+def metadata_rows(files: Iterable[Path | str]) -> Iterator[Tuple[str, str]]:
+    if isinstance(files, PathTable):
+        directories = files.directories
+        return ((directories[parent], name) for parent, name in files.unordered_rows())
+    if isinstance(files, LiveSections):
+        return ((parent, name) for parent, names in files.by_directory.items() for name in names)
+    return (path.rpartition("/")[::2] for path in (entry.as_posix() if isinstance(entry, Path) else entry for entry in files))
+
+
+def stat_paths(root: Path, rows: Iterable[Tuple[str, str]]) -> Dict[str, Tuple[int, int, int]]:
+    by_directory: Dict[str, List[str]] = {}
+    for directory, name in rows:
+        by_directory.setdefault(directory, []).append(name)
+    # Stat relative to each directory's descriptor.
+    use_dir_fd = os.stat in os.supports_dir_fd and hasattr(os, "O_DIRECTORY")
+    stats: Dict[str, Tuple[int, int, int]] = {}
+    for directory, names in by_directory.items():
+        location = os.path.join(root, directory) if directory else os.fspath(root)
+        prefix = f"{directory}/" if directory else ""
+        descriptor: Optional[int] = None
+        if use_dir_fd:
+            try:
+                descriptor = os.open(location, os.O_RDONLY | os.O_DIRECTORY)
+            except OSError:
+                continue
+        try:
+            for name in names:
+                try:
+                    if descriptor is not None:
+                        info = os.stat(name, dir_fd=descriptor)
+                    else:
+                        info = os.stat(os.path.join(location, name))
+                except OSError:
+                    continue
+                stats[prefix + name] = (info.st_size, int(info.st_mtime), -1)
+        finally:
+            if descriptor is not None:
+                os.close(descriptor)
+    return stats
+
+
+def git_head_sha(root: Path) -> Optional[str]:
+    try:
+        return (
+            run_command(
+                ["git", "rev-parse", "--verify", "--quiet", "HEAD"],
+                cwd=root,
+                check=True,
+                capture_output=True,
+                text=True,
+            ).stdout.strip()
+            or None
+        )
+    except (subprocess.CalledProcessError, FileNotFoundError, OSError) as exc:
+        logging.debug("Unable to resolve HEAD: %s", exc)
+        return None
+
+
+def source_commit(config: GeneratorConfig) -> Optional[str]:
+    return config.source_ref if config.source_ref is not None else git_head_sha(config.directory)
+
+
+def git_is_ancestor(root: Path, ancestor: str, descendant: str) -> bool:
+    try:
+        return run_command(["git", "merge-base", "--is-ancestor", ancestor, descendant], cwd=root, capture_output=True, check=False).returncode == 0
+    except (FileNotFoundError, OSError):
+        return False
+
+
+def git_resolve_commit(root: Path, revision: str) -> Optional[str]:
+    try:
+        return (
+            run_command(
+                ["git", "rev-parse", "--verify", "--quiet", "--end-of-options", f"{revision}^{{commit}}"],
+                cwd=root,
+                check=True,
+                capture_output=True,
+                text=True,
+            ).stdout.strip()
+            or None
+        )
+    except (subprocess.CalledProcessError, FileNotFoundError, OSError) as exc:
+        logging.debug("Unable to resolve %s: %s", revision, exc)
+        return None
+
+
+def read_git_diff(root: Path, old: str, new: str) -> Optional[Tuple[List[str], List[str]]]:
+    command = ["git", "diff", "-z", "--name-status", "--no-renames", "--relative", old, new, "--", "."]
+    start = time.perf_counter()
+    try:
+        process = subprocess.Popen(command, cwd=root, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    except (FileNotFoundError, OSError) as exc:
+        run_metrics.record_command(command, time.perf_counter() - start)
+        logging.debug("git diff failed to start: %s", exc)
+        return None
+    added: List[str] = []
+    removed: List[str] = []
+    with process:
+        records = iter_nul_records(process.stdout)  # type: ignore[arg-type]
+        for status in records:
+            path = next(records, b"").decode("utf-8", "surrogateescape")
+            if status == b"A":
+                added.append(path)
+            elif status == b"D":
+                removed.append(path)
+        returncode = process.wait()
+    run_metrics.record_command(command, time.perf_counter() - start)
+    if returncode != 0:
+        logging.debug("git diff exited with status %d", returncode)
+        return None
+    return added, removed
+
+
+def git_is_partial_clone(root: Path) -> bool:
+    try:
+        return (
+            run_command(
+                ["git", "config", "--get-regexp", r"^(remote\..*\.promisor|extensions\.partialclone)$"],
+                cwd=root,
+                capture_output=True,
+            ).returncode
+            == 0
+        )
+    except (FileNotFoundError, OSError):
+        return False
+
+
+def read_git_blob_sizes(root: Path, revision: str, with_sizes: bool = True) -> Optional[Dict[str, int]]:
+    command = ["git", "ls-tree", "-r", *(["-l"] if with_sizes else []), "-z", revision]
+    start = time.perf_counter()
+    try:
+        process = subprocess.Popen(command, cwd=root, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    except (FileNotFoundError, OSError) as exc:
+        run_metrics.record_command(command, time.perf_counter() - start)
+        logging.debug("git ls-tree failed to start: %s", exc)
+        return None
+    sizes: Dict[str, int] = {}
+    with process:
+        for record in iter_nul_records(process.stdout):  # type: ignore[arg-type]
+            info, _, path = record.partition(b"\t")
+            fields = info.split()
+            # Submodules are "commit" entries without a size.
+            if len(fields) >= 3 and fields[1] == b"blob":
+                sizes[path.decode("utf-8", "surrogateescape")] = int(fields[3]) if with_sizes else -1
+        returncode = process.wait()
+    run_metrics.record_command(command, time.perf_counter() - start)
+    if returncode != 0:
+        logging.debug("git ls-tree exited with status %d", returncode)
+        return None
+    return sizes
+
+
+def scan_git_log(
+    root: Path, revision: str, wanted: Optional[Set[str]], authors: Dict[str, int]
+) -> Optional[Dict[str, Tuple[int, int]]]:
+    command = [
+        "git", "log", "-z", "--name-only", "--no-renames", "--relative",
+        "--format=%x01%ct%x00%aN", revision, "--", ".",
+    ]  # fmt: skip
+    remaining = set(wanted) if wanted is not None else None
+    found: Dict[str, Tuple[int, int]] = {}
+    start = time.perf_counter()
+    try:
+        process = subprocess.Popen(command, cwd=root, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    except (FileNotFoundError, OSError) as exc:
+        run_metrics.record_command(command, time.perf_counter() - start)
+        logging.debug("git log failed to start: %s", exc)
+        return None
+    stopped = False
+    with process:
+        timestamp, author = 0, -1
+        expecting_author = first_name = False
+        for record in iter_nul_records(process.stdout):  # type: ignore[arg-type]
+            # Each commit is "\x01<time>", "<author>", then its paths.
+            if record.startswith(b"\x01"):
+                timestamp = int(record[1:] or 0)
+                expecting_author = True
+                continue
+            if expecting_author:
+                name = record.decode("utf-8", "replace")
+                author = authors.setdefault(name, len(authors))
+                expecting_author = False
+                first_name = True
+                continue
+            if first_name:
+                record = record[1:] if record.startswith(b"\n") else record
+                first_name = False
+            path = record.decode("utf-8", "surrogateescape")
+            if path in found:
+                continue
+            if remaining is None:
+                found[path] = (timestamp, author)
+            elif path in remaining:
+                found[path] = (timestamp, author)
+                remaining.discard(path)
+                if not remaining:
+                    stopped = True
+                    process.kill()
+                    break
+        returncode = process.wait()
+    run_metrics.record_command(command, time.perf_counter() - start)
+    if returncode != 0 and not stopped:
+        logging.debug("git log exited with status %d", returncode)
+        return None
+    return found
+
+
+def git_committed_metadata(root: Path, head: str, previous: Optional[FileMetadata]) -> Optional[FileMetadata]:
+    sizes = read_git_blob_sizes(root, head, not git_is_partial_clone(root))
+    if sizes is None:
+        return None
+    authors: Dict[str, int] = {}
+    committed: Dict[str, Tuple[int, int, int]] = {}
+    base = previous if previous is not None and previous.head and git_is_ancestor(root, previous.head, head) else None
+    touched: Optional[Dict[str, Tuple[int, int]]] = None
+    if base is not None:
+        touched = scan_git_log(root, f"{base.head}..{head}", None, authors)
+    for path, size in sizes.items():
+        change = touched.get(path) if touched is not None else None
+        cached = base.committed.get(path) if base is not None and touched is not None else None
+        if change is not None:
+            committed[path] = (size, *change)
+        elif cached is not None and cached[1] >= 0:
+            author = cached[2]
+            if author >= 0:
+                author = authors.setdefault(base.authors[author], len(authors))  # type: ignore[union-attr]
+            committed[path] = (size, cached[1], author)
+        else:
+            committed[path] = (size, -1, -1)
+    return FileMetadata(head, committed, list(authors))
+
+
+def resolve_commits(root: Path, metadata: FileMetadata, paths: Iterable[str]) -> None:
+    pending = {path for path in paths if metadata.committed[path][1] < 0}
+    if not pending or metadata.head is None:
+        return
+    authors = {author: index for index, author in enumerate(metadata.authors)}
+    found = scan_git_log(root, metadata.head, pending, authors)
+    if found is None:
+        return
+    metadata.authors = list(authors)
+    for path in pending:
+        size = metadata.committed[path][0]
+        timestamp, author = found.get(path, (0, -1))
+        metadata.committed[path] = (size, timestamp, author)
+
+
+def collect_file_metadata(
+    config: GeneratorConfig, files: Iterable[Path | str], previous: Optional[FileMetadata] = None
+) -> FileMetadata:
+    root = config.directory
+    head = source_commit(config)
+    metadata: Optional[FileMetadata] = None
+    if head is not None:
+        if previous is not None and previous.head == head:
+            metadata = FileMetadata(head, previous.committed, previous.authors)
+        else:
+            metadata = git_committed_metadata(root, head, previous)
+    if metadata is None:
+        metadata = FileMetadata()
+    tracked: List[str] = []
+    untracked: List[Tuple[str, str]] = []
+    for directory, name in metadata_rows(files):
+        path = f"{directory}/{name}" if directory else name
+        if path in metadata.committed:
+            tracked.append(path)
+        else:
+            untracked.append((directory, name))
+    resolve_commits(root, metadata, tracked)
+    metadata.local = stat_paths(root, untracked)
+    logging.debug("File metadata: %d committed, %d from disk", len(tracked), len(metadata.local))
+    return metadata
+
+
+def normalize_repo_url(url: Optional[str]) -> Optional[str]:
+    if not url:
+        return None
+    candidate = url.strip()
+    if not candidate:
+        return None
+    if candidate.startswith("git@") and ":" in candidate:
+        user_host, path = candidate.split(":", 1)
+        host = user_host.split("@", 1)[1]
+        candidate = f"https://{host}/{path}"
+    if candidate.startswith("ssh://"):
+        candidate = candidate.replace("ssh://", "https://", 1)
+        candidate = candidate.replace("git@", "", 1)
+    candidate = candidate.rstrip("/")
+    if candidate.endswith(".git"):
+        candidate = candidate[:-4]
+    return candidate
+
+
+def resolve_repo_url(provided: Optional[str], fallback: Optional[str], directory: Path) -> Optional[str]:
+    explicit = normalize_repo_url(provided)
+    if explicit:
+        return explicit
+    env_repo = os.getenv("GITHUB_REPOSITORY")
+    if env_repo:
+        env_url = normalize_repo_url(f"https://github.com/{env_repo}")
+        if env_url:
+            return env_url
+    remote_url = read_git_remote_url(directory)
+    if remote_url is None:
+        try:
+            remote_url = (
+                run_command(
+                    ["git", "config", "--get", "remote.origin.url"],
+                    cwd=directory,
+                    check=True,
+                    capture_output=True,
+                    text=True,
+                )
+                .stdout.strip()
+            )
+        except (subprocess.CalledProcessError, FileNotFoundError, OSError):
+            remote_url = ""
+    normalized_remote = normalize_repo_url(remote_url)
+    if normalized_remote:
+        return normalized_remote
+    fallback_url = normalize_repo_url(fallback)
+    if fallback_url:
+        return fallback_url
+    return normalize_repo_url(DEFAULT_FALLBACK_REPO_URL)
+
+
+def resolve_default_branch(provided: Optional[str], directory: Path) -> str:
+    if provided and provided.strip():
+        return provided.strip()
+    env_branch = os.getenv("GITHUB_REF_NAME") or os.getenv("GITHUB_HEAD_REF")
+    if env_branch:
+        return env_branch
+    head_branch = read_git_head_branch(directory)
+    if head_branch is not None:
+        return head_branch or DEFAULT_LINK_REFERENCE
+    try:
+        branch = (
+            run_command(
+                ["git", "symbolic-ref", "--short", "HEAD"],
+                cwd=directory,
+                check=True,
+                capture_output=True,
+                text=True,
+            )
+            .stdout.strip()
+        )
+        if branch:
+            return branch
+    except (subprocess.CalledProcessError, FileNotFoundError, OSError):
+        pass
+    return DEFAULT_LINK_REFERENCE
+
+
+def resolve_link_reference(link_ref: Optional[str], default_branch: Optional[str], directory: Path) -> str:
+    if link_ref and link_ref.strip():
+        return link_ref.strip()
+    return resolve_default_branch(default_branch, directory)
+
+
+def build_file_url(repo_url: Optional[str], link_reference: str, relative_path: str) -> str:
+    encoded_path = urllib.parse.quote(relative_path, safe="/")
+    if not repo_url:
+        return encoded_path
+    base = repo_url.rstrip("/")
+    return f"{base}/blob/{link_reference}/{encoded_path}"
+
+
+class CategoryMatcher:
+    def __init__(self, categories: Sequence[Category]) -> None:
+        self.categories = list(categories)
+        self._by_suffix: Dict[str, int] = {}
+        self._catch_all: Optional[int] = None
+        for index, category in enumerate(self.categories):
+            suffix = category.ext.lower()
+            if not suffix:
+                if self._catch_all is None:
+                    self._catch_all = index
+                continue
+            self._by_suffix.setdefault(suffix, index)
+        self._lengths = sorted({len(suffix) for suffix in self._by_suffix})
+        # A suffix without a slash can only ever match inside the basename.
+        self.basename_only = all("/" not in suffix for suffix in self._by_suffix)
+
+    def match_index(self, lower: str) -> Optional[int]:
+        # One probe per distinct suffix length; the lowest index still wins.
+        best = self._catch_all
+        by_suffix = self._by_suffix
+        size = len(lower)
+        for length in self._lengths:
+            if length > size:
+                break
+            index = by_suffix.get(lower[-length:])
+            if index is not None and (best is None or index < best):
+                best = index
+        return best
+
+    def match(self, path: str) -> Optional[Category]:
+        index = self.match_index(path.lower())
+        return None if index is None else self.categories[index]
+
+
+def iter_sections(
+    files: Iterable[Path | str], categories: Sequence[Category], repo_root_header: str
+) -> Iterator[Tuple[str, List[str]]]:
+    root_files: List[str] = []
+    category_map: Dict[str, List[str]] = {category.name: [] for category in categories}
+    other_folders: Dict[str, List[str]] = {}
+    matcher = CategoryMatcher(categories)
+    category_entries = [category_map[category.name] for category in categories]
+    if isinstance(files, PathTable):
+        # Rows already carry their directory; categories match on the basename.
+        directories, prefixes = files.directories, files.prefixes
+        by_name = matcher.basename_only
+        for parent, name in files.unordered_rows():
+            prefix = prefixes[parent]
+            posix = prefix + name
+            index = matcher.match_index(name.lower() if by_name else posix.lower())
+            if index is not None:
+                category_entries[index].append(posix)
+            elif prefix:
+                other_folders.setdefault(directories[parent], []).append(posix)
+            else:
+                root_files.append(posix)
+    else:
+        for path in files:
+            posix = path if isinstance(path, str) else path.as_posix()
+            index = matcher.match_index(posix.lower())
+            if index is not None:
+                category_entries[index].append(posix)
+                continue
+            if "/" in posix:
+                folder = posix.rsplit("/", 1)[0]
+                other_folders.setdefault(folder, []).append(posix)
+            else:
+                root_files.append(posix)
+    # Release each group once yielded to bound streaming memory.
+    if root_files:
+        root_files.sort()
+        yield repo_root_header, root_files
+    del root_files
+    for category in categories:
+        entries = category_map.pop(category.name, None)
+        if entries:
+            entries.sort()
+            yield category.name, entries
+    for folder in sorted(other_folders.keys(), key=lambda item: item.lower()):
+        entries = other_folders.pop(folder)
+        entries.sort()
+        yield folder, entries
+
+
+def build_sections(files: Sequence[Path | str], categories: Sequence[Category], repo_root_header: str) -> List[Tuple[str, List[str]]]:
+    return list(iter_sections(files, categories, repo_root_header))
+
+
+class SectionEntries(List[str]):
+    __slots__ = ("digest",)
+
+    def __init__(self, entries: Iterable[str] = ()) -> None:
+        super().__init__(entries)
+        self.digest: Optional[bytes] = None
+
+
+def entries_digest(entries: Sequence[str]) -> bytes:
+    cached = getattr(entries, "digest", None)
+    if cached is not None:
+        return cached
+    digest = hashlib.sha256()
+    for entry in entries:
+        digest.update(entry.encode("utf-8", "surrogateescape"))
+        digest.update(b"\n")
+    value = digest.digest()
+    if isinstance(entries, SectionEntries):
+        entries.digest = value
+    return value
+
+
+class SectionCache:
+    def __init__(self, fragments: Optional[Dict[str, List[str]]] = None) -> None:
+        self._previous: Dict[str, List[str]] = dict(fragments or {})
+        self.fragments: Dict[str, List[str]] = {}
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def section_key(kind: str, title: str, entries: Sequence[str]) -> str:
+        digest = hashlib.sha256(f"{kind}\0{title}\0".encode("utf-8", "surrogateescape"))
+        digest.update(entries_digest(entries))
+        return digest.hexdigest()
+
+    def get(self, key: str) -> Optional[List[str]]:
+        lines = self.fragments.get(key)
+        if lines is None:
+            lines = self._previous.get(key)
+            if lines is None:
+                return None
+            self.fragments[key] = lines
+        self.hits += 1
+        return lines
+
+    def put(self, key: str, lines: List[str]) -> None:
+        self.misses += 1
+        self.fragments[key] = lines
+
+    def get_or_render(self, kind: str, title: str, entries: Sequence[str], render: Callable[[], List[str]]) -> List[str]:
+        key = self.section_key(kind, title, entries)
+        lines = self.get(key)
+        if lines is None:
+            lines = render()
+            self.put(key, lines)
+        return lines
+
+
+class LiveSections:
+    def __init__(self, files: Iterable[str], categories: Sequence[Category], repo_root_header: str) -> None:
+        self.categories = list(categories)
+        self.repo_root_header = repo_root_header
+        self._matcher = CategoryMatcher(self.categories)
+        self.groups: Dict[Tuple[int, str], SectionEntries] = {}
+        self.by_directory: Dict[str, Set[str]] = {}
+        for path in files:
+            self.groups.setdefault(self._group(path), SectionEntries()).append(path)
+            parent, _, name = path.rpartition("/")
+            self.by_directory.setdefault(parent, set()).add(name)
+        for entries in self.groups.values():
+            entries.sort()
+
+    def _group(self, path: str) -> Tuple[int, str]:
+        # Mirrors iter_sections: root files, then categories, then folders.
+        index = self._matcher.match_index(path.lower())
+        if index is not None:
+            return 1, self.categories[index].name
+        if "/" in path:
+            return 2, path.rsplit("/", 1)[0]
+        return 0, self.repo_root_header
+
+    def __contains__(self, path: object) -> bool:
+        if not isinstance(path, str):
+            return False
+        parent, _, name = path.rpartition("/")
+        return name in self.by_directory.get(parent, ())
+
+    def __len__(self) -> int:
+        return sum(len(names) for names in self.by_directory.values())
+
+    def __iter__(self) -> Iterator[str]:
+        paths = [f"{parent}/{name}" if parent else name for parent, names in self.by_directory.items() for name in names]
+        paths.sort(key=str.lower)
+        return iter(paths)
+
+    def add(self, path: str) -> bool:
+        if path in self:
+            return False
+        parent, _, name = path.rpartition("/")
+        self.by_directory.setdefault(parent, set()).add(name)
+        entries = self.groups.setdefault(self._group(path), SectionEntries())
+        bisect.insort(entries, path)
+        entries.digest = None
+        return True
+
+    def discard(self, path: str) -> bool:
+        if path not in self:
+            return False
+        parent, _, name = path.rpartition("/")
+        names = self.by_directory[parent]
+        names.discard(name)
+        if not names:
+            del self.by_directory[parent]
+        group = self._group(path)
+        entries = self.groups[group]
+        del entries[bisect.bisect_left(entries, path)]
+        entries.digest = None
+        if not entries:
+            del self.groups[group]
+        return True
+
+    def discard_tree(self, relative: str) -> bool:
+        removed = self.discard(relative)
+        prefix = relative + "/"
+        for directory in [name for name in self.by_directory if name == relative or name.startswith(prefix)]:
+            for name in list(self.by_directory.get(directory, ())):
+                removed = self.discard(f"{directory}/{name}") or removed
+        return removed
+
+    def sections(self) -> List[Tuple[str, List[str]]]:
+        ordered: List[Tuple[str, List[str]]] = []
+        root_files = self.groups.get((0, self.repo_root_header))
+        if root_files:
+            ordered.append((self.repo_root_header, root_files))
+        seen: Set[str] = set()
+        for category in self.categories:
+            entries = self.groups.get((1, category.name))
+            if entries and category.name not in seen:
+                seen.add(category.name)
+                ordered.append((category.name, entries))
+        folders = sorted((key[1] for key in self.groups if key[0] == 2), key=str.lower)
+        ordered.extend((folder, self.groups[(2, folder)]) for folder in folders)
+        return ordered
+
+
+def section_groups(files: Iterable[Path | str], config: GeneratorConfig) -> Iterable[Tuple[str, List[str]]]:
+    if isinstance(files, LiveSections):
+        return files.sections()
+    return iter_sections(files, config.categories, config.repo_root_header)
+
+
+def config_fingerprint(config: GeneratorConfig, exclude: Sequence[str] = ()) -> str:
+    data = asdict(config)
+    for key in ("log_level", "cache_file", "output_file", "jobs", "watch", "watch_debounce", "watch_backend", "since", *exclude):
+        data.pop(key, None)
+    payload = json.dumps(data, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def content_digest(content: str) -> str:
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+def load_manifest(path: Path) -> Optional[Dict[str, object]]:
+    try:
+        manifest = json.loads(path.read_text(encoding="utf-8"))
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as exc:
+        logging.warning("Ignoring unreadable manifest cache '%s': %s", path, exc)
+        return None
+    if not isinstance(manifest, dict) or manifest.get("version") != MANIFEST_VERSION:
+        logging.info("Ignoring manifest cache '%s' written by an incompatible version.", path)
+        return None
+    return manifest
+
+
+def save_manifest(path: Path, manifest: Dict[str, object]) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(manifest, separators=(",", ":")), encoding="utf-8")
+
+
+def combined_digest(digests: Sequence[str]) -> str:
+    if len(digests) == 1:
+        return digests[0]
+    return hashlib.sha256("".join(digests).encode("ascii")).hexdigest()
+
+
+def file_digest(path: Path) -> Optional[str]:
+    hasher = hashlib.sha256()
+    try:
+        with path.open("rb") as handle:
+            for block in iter(lambda: handle.read(STREAM_BUFFER_SIZE), b""):
+                hasher.update(block)
+    except OSError:
+        return None
+    return hasher.hexdigest()
+
+
+def output_matches_digest(path: Optional[Path], digest: object, assets: Sequence[Path] = ()) -> bool:
+    if path is None or not isinstance(digest, str):
+        return False
+    digests: List[str] = []
+    for candidate in (path, *assets):
+        candidate_digest = file_digest(candidate)
+        if candidate_digest is None:
+            return False
+        digests.append(candidate_digest)
+    return combined_digest(digests) == digest
+
+
+def chunk_directory(output_file: Path) -> Path:
+    return output_file.with_name(f"{output_file.stem}_chunks")
+
+
+def chunk_asset_paths(output_file: Path) -> List[Path]:
+    directory = chunk_directory(output_file)
+    if not directory.is_dir():
+        return []
+    paths = [path for path in directory.glob("file-list-*.html") if path.stem[len("file-list-") :].isdigit()]
+    return sorted(paths, key=lambda path: int(path.stem[len("file-list-") :]))
+
+
+def search_index_path(config: GeneratorConfig) -> Optional[Path]:
+    if config.output_file is None or config.output_format != "html" or not config.search_index:
+        return None
+    return config.output_file.with_name(f"{config.output_file.stem}_search.json")
+
+
+def search_index_url(config: GeneratorConfig) -> Optional[str]:
+    path = search_index_path(config)
+    return None if path is None else urllib.parse.quote(path.name)
+
+
+def shared_prefix_length(first: str, second: str) -> int:
+    # Bisect over startswith rather than os.path.commonprefix's Python loop.
+    low, high = 0, min(len(first), len(second))
+    while low < high:
+        middle = (low + high + 1) >> 1
+        if second.startswith(first[:middle]):
+            low = middle
+        else:
+            high = middle - 1
+    return low
+
+
+def build_search_index(files: Iterable[Path | str], config: GeneratorConfig) -> bytes:
+    chunk_size = max(1, config.lazy.chunk_size)
+    counts: List[int] = []
+    shared: List[int] = []
+    suffixes: List[str] = []
+    previous = ""
+    line = 0
+    for _title, entries in section_groups(files, config):
+        line += 1  # the section heading
+        for entry in entries:
+            chunk = line // chunk_size
+            if chunk >= len(counts):
+                counts.extend([0] * (chunk + 1 - len(counts)))
+            counts[chunk] += 1
+            common = shared_prefix_length(previous, entry)
+            shared.append(common)
+            suffixes.append(entry[common:])
+            previous = entry
+            line += 1
+    index = {"version": SEARCH_INDEX_VERSION, "chunks": counts, "shared": shared, "suffix": suffixes}
+    return json.dumps(index, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+class ChunkFileWriter:
+    def __init__(self, directory: Path, compress: Sequence[str] = ()) -> None:
+        self.directory = directory
+        self.compress = list(compress)
+        self.names: List[str] = []
+        self.digests: List[str] = []
+
+    def write(self, key: str, markup: str) -> None:
+        name = f"{key}.html"
+        data = markup.encode("utf-8")
+        write_file(self.directory / name, data, self.compress)
+        self.names.append(name)
+        self.digests.append(hashlib.sha256(data).hexdigest())
+
+    def prune(self) -> None:
+        if not self.directory.is_dir():
+            return
+        keep = set(self.names)
+        for path in self.directory.glob("file-list-*"):
+            name = path.name
+            for suffix in COMPRESSION_SUFFIXES.values():
+                name = name.removesuffix(suffix)
+            if name not in keep:
+                try:
+                    path.unlink()
+                except OSError as exc:
+                    logging.warning("Could not remove stale chunk '%s': %s", path, exc)
+        if not keep:
+            try:
+                self.directory.rmdir()
+            except OSError:
+                pass
+
+
+SEARCH_BOX_MARKUP = '<input type="search" id="file-list-search" placeholder="Search files" aria-label="Search files">'
+SEARCH_SCRIPT = """
+const searchBox = document.getElementById("file-list-search");
+if (searchBox) {
+  // Chunks can now be requested by both the observer and the search, so
+  // each is loaded at most once and callers wait on the same promise.
+  const loadChunkOnce = loadChunk;
+  const loading = new Map();
+  loadChunk = function(placeholder) {
+    if (!loading.has(placeholder)) {
+      loading.set(placeholder, Promise.resolve(loadChunkOnce(placeholder)));
+    }
+    return loading.get(placeholder);
+  };
+  let searchIndex = null;
+  function loadSearchIndex() {
+    if (!searchIndex) {
+      searchIndex = fetch(searchUrl)
+        .then(response => response.json())
+        .then(data => {
+          const paths = new Array(data.suffix.length);
+          let previous = "";
+          for (let i = 0; i < paths.length; i++) {
+            previous = previous.slice(0, data.shared[i]) + data.suffix[i];
+            paths[i] = previous.toLowerCase();
+          }
+          const chunkOf = new Int32Array(paths.length);
+          let position = 0;
+          data.chunks.forEach((count, chunk) => {
+            chunkOf.fill(chunk, position, position + count);
+            position += count;
+          });
+          return { paths, chunkOf };
+        });
+    }
+    return searchIndex;
+  }
+  function matchesTerms(text, terms) {
+    return terms.every(term => text.includes(term));
+  }
+  function chunkNumber(placeholder) {
+    return Number(placeholder.dataset.content.slice("file-list-".length)) - 1;
+  }
+  function filterChunk(placeholder, terms) {
+    let heading = null;
+    placeholder.querySelectorAll("li").forEach(item => {
+      const link = item.querySelector("a");
+      if (!link) {
+        heading = item;
+        item.hidden = terms.length > 0;
+        return;
+      }
+      item.hidden = terms.length > 0 && !matchesTerms(link.textContent.toLowerCase(), terms);
+      if (!item.hidden && heading) {
+        heading.hidden = false;
+      }
+    });
+    placeholder.style.minHeight = terms.length ? "0" : "";
+  }
+  let generation = 0;
+  function applySearch() {
+    const terms = searchBox.value.toLowerCase().split(/\\s+/).filter(Boolean);
+    const current = ++generation;
+    if (!terms.length) {
+      lazyLoadElements.forEach(placeholder => {
+        placeholder.hidden = false;
+        if (loading.has(placeholder)) {
+          loading.get(placeholder).then(() => filterChunk(placeholder, terms));
+        }
+      });
+      return;
+    }
+    loadSearchIndex()
+      .then(index => {
+        if (current !== generation) {
+          return;
+        }
+        const hits = new Set();
+        index.paths.forEach((path, i) => {
+          if (matchesTerms(path, terms)) {
+            hits.add(index.chunkOf[i]);
+          }
+        });
+        lazyLoadElements.forEach(placeholder => {
+          const hit = hits.has(chunkNumber(placeholder));
+          placeholder.hidden = !hit;
+          if (hit) {
+            loadChunk(placeholder).then(() => {
+              if (current === generation) {
+                filterChunk(placeholder, terms);
+              }
+            });
+          }
+        });
+      })
+      .catch(() => {});
+  }
+  let searchTimer = null;
+  searchBox.addEventListener("input", () => {
+    clearTimeout(searchTimer);
+    searchTimer = setTimeout(applySearch, 100);
+  });
+}
+""".strip()
+
+
+def lazyload_viewport_rules(lazy: LazyLoadPreferences) -> List[Dict[str, object]]:
+    return [
+        {
+            "maxWidth": lazy.viewport_mobile,
+            "rootMargin": lazy.root_margin_mobile,
+            "threshold": 0.1,
+        },
+        {
+            "maxWidth": lazy.viewport_tablet,
+            "rootMargin": lazy.root_margin_tablet,
+            "threshold": 0.3,
         },
         {
             "maxWidth": lazy.viewport_small_desktop,
@@ -445,11 +2509,60 @@ def build_lazyload_script(lazy: LazyLoadPreferences, chunk_data: Dict[str, str])
             "threshold": 0.5,
         },
     ]
+
+
+def build_lazyload_script(
+    lazy: LazyLoadPreferences,
+    chunk_data: Optional[Dict[str, str]],
+    chunk_base: Optional[str] = None,
+    search_url: Optional[str] = None,
+) -> str:
+    viewport_rules = lazyload_viewport_rules(lazy)
+    if chunk_base is not None:
+        # Chunks load when their placeholder scrolls into view.
+        chunk_source = f"const chunkBase = {script_json(chunk_base)};"
+        load_chunk = textwrap.indent(
+            textwrap.dedent(
+                """
+                function loadChunk(placeholder) {
+                  const key = placeholder.dataset.content;
+                  return fetch(chunkBase + encodeURIComponent(key) + ".html")
+                    .then(response => response.ok ? response.text() : "")
+                    .then(markup => {
+                      if (markup) {
+                        placeholder.innerHTML = markup;
+                      }
+                    })
+                    .catch(() => {});
+                }
+                """
+            ).strip(),
+            "          ",
+        ).lstrip()
+    else:
+        chunk_source = f"const chunkData = {'window.fileListChunks || {}' if chunk_data is None else json.dumps(chunk_data)};"
+        load_chunk = textwrap.indent(
+            textwrap.dedent(
+                """
+                function loadChunk(placeholder) {
+                  const key = placeholder.dataset.content;
+                  if (chunkData[key]) {
+                    placeholder.innerHTML = chunkData[key];
+                  }
+                }
+                """
+            ).strip(),
+            "          ",
+        ).lstrip()
+    # Spliced in after dedent; the chunk data can be megabytes.
+    marker = "/* chunk source */"
+    search_marker = "/* search */"
     script = textwrap.dedent(
         f"""
         <script>
         document.addEventListener("DOMContentLoaded", function() {{
-          const chunkData = {json.dumps(chunk_data)};
+          {marker}
+          {load_chunk}
           const lazyLoadElements = document.querySelectorAll(".lazyload-placeholder");
           if (!lazyLoadElements.length) {{
             return;
@@ -469,52 +2582,393 @@ def build_lazyload_script(lazy: LazyLoadPreferences, chunk_data: Dict[str, str])
             const observer = new IntersectionObserver((entries, obs) => {{
               entries.forEach(entry => {{
                 if (entry.isIntersecting) {{
-                  const placeholder = entry.target;
-                  const key = placeholder.dataset.content;
-                  if (chunkData[key]) {{
-                    placeholder.innerHTML = chunkData[key];
-                  }}
-                  obs.unobserve(placeholder);
+                  loadChunk(entry.target);
+                  obs.unobserve(entry.target);
                 }}
               }});
             }}, {{ rootMargin: currentConfig.rootMargin, threshold: currentConfig.threshold }});
             lazyLoadElements.forEach(element => observer.observe(element));
           }} else {{
-            lazyLoadElements.forEach(placeholder => {{
-              const key = placeholder.dataset.content;
-              if (chunkData[key]) {{
-                placeholder.innerHTML = chunkData[key];
-              }}
-            }});
+            lazyLoadElements.forEach(loadChunk);
           }}
+          {search_marker}
         }});
         </script>
         """
     ).strip()
-    return script
+    search_code = ""
+    if search_url is not None:
+        # Only chunks containing a hit are loaded.
+        search_code = "\n" + textwrap.indent(f"const searchUrl = {script_json(search_url)};\n{SEARCH_SCRIPT}", "  ")
+    script = script.replace("\n  " + search_marker, search_code, 1)
+    return script.replace(marker, chunk_source, 1)
+
+
+VIRTUAL_LIST_MARKUP = '<ul id="file-list-virtual" style="position: relative; list-style: none; margin: 0; padding: 0;"></ul>'
+VIRTUAL_SCRIPT = """
+const list = document.getElementById("file-list-virtual");
+const rows = window.fileListRows || [];
+if (!list || !rows.length) {
+  return;
+}
+function pickViewportRule(width) {
+  for (const rule of viewportRules) {
+    if (rule.maxWidth === null || width <= rule.maxWidth) {
+      return rule;
+    }
+  }
+  return viewportRules[viewportRules.length - 1];
+}
+// Rows within the rule's root margin above and below the viewport are drawn,
+// mirroring how far ahead the lazy-load observer starts loading.
+function overscan() {
+  const width = window.innerWidth || document.documentElement.clientWidth || 0;
+  const parts = pickViewportRule(width).rootMargin.trim().split(/\\s+/).map(part => parseFloat(part) || 0);
+  return { above: parts[0], below: parts.length > 2 ? parts[2] : parts[0] };
+}
+const tops = new Float64Array(rows.length + 1);
+for (let i = 0; i < rows.length; i++) {
+  tops[i + 1] = tops[i] + (rows[i][2] ? headingHeight : rowHeight);
+}
+list.style.height = tops[rows.length] + "px";
+function rowAt(y) {
+  let low = 0;
+  let high = rows.length;
+  while (low < high) {
+    const middle = (low + high) >> 1;
+    if (tops[middle + 1] > y) {
+      high = middle;
+    } else {
+      low = middle + 1;
+    }
+  }
+  return low;
+}
+function encodePath(path) {
+  return encodeURIComponent(path)
+    .replace(/%2F/g, "/")
+    .replace(/[!'()*]/g, c => "%" + c.charCodeAt(0).toString(16).toUpperCase());
+}
+const shown = new Map();
+const spare = [[], []];
+function createItem(heading) {
+  const item = document.createElement("li");
+  item.style.cssText = "position: absolute; left: 0; right: 0; overflow: hidden; white-space: nowrap; text-overflow: ellipsis;";
+  const height = (heading ? headingHeight : rowHeight) + "px";
+  item.style.height = height;
+  item.style.lineHeight = height;
+  const content = document.createElement(heading ? "h2" : "a");
+  if (heading) {
+    content.style.margin = "0";
+  }
+  item.appendChild(content);
+  if (!heading) {
+    item.appendChild(document.createElement("small"));
+  }
+  return list.appendChild(item);
+}
+function showRow(index) {
+  const row = rows[index];
+  const kind = row[2] ? 1 : 0;
+  const item = spare[kind].pop() || createItem(kind);
+  const content = item.firstChild;
+  content.textContent = row[0];
+  content.style.color = row[1];
+  if (!kind) {
+    content.href = urlBase + encodePath(row[0]);
+    item.lastChild.textContent = row[3] ? " " + row[3] : "";
+  }
+  item.style.top = tops[index] + "px";
+  item.hidden = false;
+  shown.set(index, item);
+}
+let margins = overscan();
+let scheduled = false;
+function update() {
+  scheduled = false;
+  const offset = -list.getBoundingClientRect().top;
+  const height = window.innerHeight || document.documentElement.clientHeight || 0;
+  const first = rowAt(offset - margins.above);
+  const last = Math.min(rowAt(offset + height + margins.below), rows.length - 1);
+  // Rows that left the window are hidden and reused rather than removed,
+  // so the list never holds more nodes than fit in the window at once.
+  for (const [index, item] of shown) {
+    if (index < first || index > last) {
+      item.hidden = true;
+      spare[rows[index][2] ? 1 : 0].push(item);
+      shown.delete(index);
+    }
+  }
+  for (let index = first; index <= last; index++) {
+    if (!shown.has(index)) {
+      showRow(index);
+    }
+  }
+}
+function schedule() {
+  if (!scheduled) {
+    scheduled = true;
+    requestAnimationFrame(update);
+  }
+}
+window.addEventListener("scroll", schedule, { passive: true });
+window.addEventListener("resize", () => {
+  margins = overscan();
+  schedule();
+});
+update();
+""".strip()
+
+
+def build_virtual_script(lazy: LazyLoadPreferences, url_base: str) -> str:
+    settings = "\n".join(
+        [
+            f"const urlBase = {script_json(url_base)};",
+            f"const rowHeight = {VIRTUAL_ROW_HEIGHT};",
+            f"const headingHeight = {VIRTUAL_HEADING_HEIGHT};",
+            f"const viewportRules = {json.dumps(lazyload_viewport_rules(lazy))};",
+        ]
+    )
+    body = textwrap.indent(f"{settings}\n{VIRTUAL_SCRIPT}", "  ")
+    return f'<script>\ndocument.addEventListener("DOMContentLoaded", function() {{\n{body}\n}});\n</script>'
+
+
+def render_virtual_section(
+    title: str, entries: Sequence[str], color_gen: ColorGenerator, heading: bool = True, metadata: Optional[FileMetadata] = None
+) -> List[str]:
+    # [text, colour, heading flag, metadata label] rows; links are rebuilt client side.
+    quote = json.encoder.encode_basestring_ascii
+    lines: List[str] = []
+    if heading:
+        lines.append(f'[{quote(title)},"{color_gen.next_color()}",1]'.replace("</", "<\\/"))
+    for entry in entries:
+        label = metadata.label(entry) if metadata is not None else ""
+        extra = f",0,{quote(label)}" if label else ""
+        lines.append(f'[{quote(entry)},"{color_gen.next_color()}"{extra}]'.replace("</", "<\\/"))
+    return lines
+
+
+def render_html_section(
+    title: str,
+    entries: Sequence[str],
+    config: GeneratorConfig,
+    color_gen: ColorGenerator,
+    heading: bool = True,
+    metadata: Optional[FileMetadata] = None,
+) -> List[str]:
+    lines: List[str] = []
+    if heading:
+        header_color = color_gen.next_color()
+        lines.append(f'<li><h2 style="color: {header_color};">{html.escape(title)}</h2></li>')
+    for entry in entries:
+        color = color_gen.next_color()
+        url = build_file_url(config.repo_url, config.link_reference, entry)
+        label = metadata.label(entry) if metadata is not None else ""
+        details = f" <small>{html.escape(label)}</small>" if label else ""
+        lines.append(f'<li><a href="{url}" style="color: {color};">{html.escape(entry)}</a>{details}</li>')
+    return lines
+
+
+def _section_lines(
+    kind: str,
+    title: str,
+    entries: Sequence[str],
+    section_cache: Optional[SectionCache],
+    render: Callable[[], List[str]],
+) -> List[str]:
+    if section_cache is None:
+        return render()
+    return section_cache.get_or_render(kind, title, entries, render)
 
 
-def render_html(files: Sequence[Path], config: GeneratorConfig) -> str:
-    sections = build_sections(files, config.categories, config.repo_root_header)
-    color_gen = ColorGenerator(config.color)
+def _html_header(config: GeneratorConfig) -> str:
     header_parts: List[str] = []
     if config.header_text.strip():
         header_parts.append(f"<h1>{config.header_text}</h1>")
     if config.intro_text.strip():
         header_parts.append(f"<p>{config.intro_text}</p>")
-    content_parts: List[str] = []
-    if header_parts:
-        content_parts.append("\n".join(header_parts))
-    body_lines: List[str] = []
+    return "\n".join(header_parts)
+
+
+def section_cache_kind(
+    kind: str, config: GeneratorConfig, offset: int, metadata: Optional[FileMetadata] = None, entries: Sequence[str] = ()
+) -> str:
+    # Fragments are only reusable at the same list-colour phase and metadata.
+    if kind in COLORED_KINDS and config.color.source == "list" and config.color.colors:
+        kind = f"{kind}@{offset % len(config.color.colors)}"
+    if metadata is not None:
+        kind = f"{kind}+{metadata.section_digest(entries, exact=kind == 'records')}"
+    return kind
+
+
+def iter_section_slices(
+    title: str, entries: Sequence[str], offset: int
+) -> Iterator[Tuple[str, Sequence[str], int, int, bool]]:
+    count = max(1, -(-len(entries) // RENDER_SLICE_SIZE))
+    for index in range(count):
+        start = index * RENDER_SLICE_SIZE
+        yield title, entries[start : start + RENDER_SLICE_SIZE], index, offset + start + (index > 0), index == count - 1
+
+
+def render_section_slice(
+    kind: str,
+    title: str,
+    entries: Sequence[str],
+    index: int,
+    offset: int,
+    last: bool,
+    config: GeneratorConfig,
+    metadata: Optional[FileMetadata] = None,
+) -> List[str]:
+    if kind == "markdown":
+        return render_markdown_section(title, entries, config, heading=index == 0, trailer=last, metadata=metadata)
+    if kind == "records":
+        return render_record_section(title, entries, config, metadata)
+    color_gen = slice_color_generator(config.color, title, index, offset)
+    if kind == "virtual":
+        return render_virtual_section(title, entries, color_gen, heading=index == 0, metadata=metadata)
+    return render_html_section(title, entries, config, color_gen, heading=index == 0, metadata=metadata)
+
+
+def count_rendered_colors(kind: str, config: GeneratorConfig, count: int) -> None:
+    if kind not in COLORED_KINDS:
+        return
+    run_metrics.add("colors_generated", count)
+    if config.color.source != "list" and not build_color_palette(config.color).size:
+        run_metrics.add("colors_fallbacks", count)
+
+
+def render_section(
+    kind: str, title: str, entries: Sequence[str], offset: int, config: GeneratorConfig, metadata: Optional[FileMetadata] = None
+) -> List[str]:
+    count_rendered_colors(kind, config, len(entries) + 1)
+    lines: List[str] = []
+    for unit in iter_section_slices(title, entries, offset):
+        lines.extend(render_section_slice(kind, *unit, config, metadata))
+    return lines
+
+
+_WORKER_RENDER_STATE: Dict[str, object] = {}
+
+
+def _init_render_worker(kind: str, config: GeneratorConfig, metadata: Optional[FileMetadata] = None) -> None:
+    _WORKER_RENDER_STATE.update(kind=kind, config=config, metadata=metadata)
+
+
+def _render_slice_in_worker(unit: Tuple[str, Sequence[str], int, int, bool]) -> List[str]:
+    state = _WORKER_RENDER_STATE
+    return render_section_slice(state["kind"], *unit, state["config"], state["metadata"])  # type: ignore[arg-type]
+
+
+def _iter_parallel_section_lines(
+    kind: str,
+    sections: Iterable[Tuple[str, List[str]]],
+    config: GeneratorConfig,
+    section_cache: Optional[SectionCache],
+    metadata: Optional[FileMetadata] = None,
+) -> Iterator[str]:
+    # Consumed in submission order, so the output matches a serial run.
+    plan: List[Tuple[Optional[str], Optional[List[str]]]] = []
+    units: List[Tuple[str, Sequence[str], int, int, bool]] = []
+    offset = 0
     for title, entries in sections:
-        header_color = color_gen.next_color()
-        body_lines.append(f'<li><h2 style="color: {header_color};">{html.escape(title)}</h2></li>')
-        for entry in entries:
-            color = color_gen.next_color()
-            url = build_file_url(config.repo_url, config.link_reference, entry)
-            body_lines.append(
-                f'<li><a href="{url}" style="color: {color};">{html.escape(entry)}</a></li>'
-            )
+        key = None
+        if section_cache is not None:
+            key = section_cache.section_key(section_cache_kind(kind, config, offset, metadata, entries), title, entries)
+        cached = None if section_cache is None or key is None else section_cache.get(key)
+        if cached is None:
+            count_rendered_colors(kind, config, len(entries) + 1)
+            units.extend(iter_section_slices(title, entries, offset))
+        plan.append((key, cached))
+        offset += len(entries) + 1
+    if not units:
+        for _key, cached in plan:
+            yield from cached or []
+        return
+    from concurrent.futures import ProcessPoolExecutor
+
+    with ProcessPoolExecutor(
+        max_workers=config.jobs, initializer=_init_render_worker, initargs=(kind, config, metadata)
+    ) as executor:
+        rendered = executor.map(_render_slice_in_worker, units)
+        unit_flags = iter(unit[4] for unit in units)
+        for key, cached in plan:
+            if cached is not None:
+                yield from cached
+                continue
+            lines: List[str] = []
+            for last in unit_flags:
+                lines.extend(next(rendered))
+                if last:
+                    break
+            if section_cache is not None and key is not None:
+                section_cache.put(key, lines)
+            yield from lines
+
+
+def counted_sections(sections: Iterable[Tuple[str, List[str]]]) -> Iterator[Tuple[str, List[str]]]:
+    for title, entries in sections:
+        run_metrics.add("sections")
+        run_metrics.add("entries", len(entries))
+        yield title, entries
+
+
+def iter_section_lines(
+    kind: str,
+    files: Iterable[Path | str],
+    config: GeneratorConfig,
+    section_cache: Optional[SectionCache] = None,
+    metadata: Optional[FileMetadata] = None,
+) -> Iterator[str]:
+    sections = run_metrics.timed("sectioning", counted_sections(section_groups(files, config)))
+    if config.jobs > 1:
+        yield from _iter_parallel_section_lines(kind, sections, config, section_cache, metadata)
+        return
+    offset = 0
+    for title, entries in sections:
+        yield from _section_lines(
+            section_cache_kind(kind, config, offset, metadata, entries) if section_cache is not None else kind,
+            title,
+            entries,
+            section_cache,
+            functools.partial(render_section, kind, title, entries, offset, config, metadata),
+        )
+        offset += len(entries) + 1
+
+
+def iter_html_body_lines(
+    files: Iterable[Path | str],
+    config: GeneratorConfig,
+    section_cache: Optional[SectionCache] = None,
+    metadata: Optional[FileMetadata] = None,
+) -> Iterator[str]:
+    return iter_section_lines("html", files, config, section_cache, metadata)
+
+
+def iter_line_chunks(lines: Iterable[str], chunk_size: int) -> Iterator[List[str]]:
+    chunk: List[str] = []
+    for line in lines:
+        chunk.append(line)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def render_html(
+    files: Sequence[Path | str],
+    config: GeneratorConfig,
+    section_cache: Optional[SectionCache] = None,
+    metadata: Optional[FileMetadata] = None,
+) -> str:
+    if config.html_layout == "virtual":
+        return "".join(iter_render_html_virtual(files, config, section_cache, metadata))
+    content_parts: List[str] = []
+    header = _html_header(config)
+    if header:
+        content_parts.append(header)
+    body_lines = list(iter_html_body_lines(files, config, section_cache, metadata))
     if not body_lines:
         content_parts.append("<p>No files found.</p>")
         return "\n\n".join(content_parts).strip() + "\n"
@@ -528,42 +2982,238 @@ def render_html(files: Sequence[Path], config: GeneratorConfig) -> str:
         f'<div class="lazyload-placeholder" data-content="file-list-{idx + 1}" style="min-height: 400px;"></div>'
         for idx in range(len(chunks))
     )
+    search_url = search_index_url(config)
+    if search_url is not None:
+        content_parts.append(SEARCH_BOX_MARKUP)
     content_parts.append(placeholders)
-    content_parts.append(build_lazyload_script(config.lazy, chunk_map))
+    content_parts.append(build_lazyload_script(config.lazy, chunk_map, search_url=search_url))
     return "\n\n".join(content_parts).strip() + "\n"
 
 
-def render_markdown(files: Sequence[Path], config: GeneratorConfig) -> str:
-    sections = build_sections(files, config.categories, config.repo_root_header)
+def script_json(value: object) -> str:
+    return json.dumps(value, separators=(",", ":")).replace("</", "<\\/")
+
+
+def iter_render_html(
+    files: Iterable[Path | str],
+    config: GeneratorConfig,
+    section_cache: Optional[SectionCache] = None,
+    metadata: Optional[FileMetadata] = None,
+) -> Iterator[str]:
+    if config.html_layout == "virtual":
+        yield from iter_render_html_virtual(files, config, section_cache, metadata)
+        return
+    # Each chunk registers itself right after its placeholder.
+    header = _html_header(config)
+    if header:
+        yield header + "\n\n"
+    search_url = search_index_url(config)
+    chunk_count = 0
+    body_lines = iter_html_body_lines(files, config, section_cache, metadata)
+    for chunk_count, chunk in enumerate(iter_line_chunks(body_lines, max(1, config.lazy.chunk_size)), start=1):
+        key = f"file-list-{chunk_count}"
+        markup = "<ul>" + "\n".join(chunk) + "</ul>"
+        if chunk_count == 1:
+            if search_url is not None:
+                yield SEARCH_BOX_MARKUP + "\n\n"
+            yield "<script>window.fileListChunks = {};</script>\n"
+        yield (
+            f'<div class="lazyload-placeholder" data-content="{key}" style="min-height: 400px;"></div>\n'
+            f"<script>fileListChunks[{script_json(key)}] = {script_json(markup)};</script>\n"
+        )
+    if not chunk_count:
+        yield "<p>No files found.</p>\n"
+        return
+    yield "\n" + build_lazyload_script(config.lazy, None, search_url=search_url) + "\n"
+
+
+def iter_render_html_external(
+    files: Iterable[Path | str],
+    config: GeneratorConfig,
+    write_chunk: Callable[[str, str], None],
+    chunk_base: str,
+    section_cache: Optional[SectionCache] = None,
+    metadata: Optional[FileMetadata] = None,
+) -> Iterator[str]:
+    header = _html_header(config)
+    if header:
+        yield header + "\n\n"
+    search_url = search_index_url(config)
+    chunk_count = 0
+    body_lines = iter_html_body_lines(files, config, section_cache, metadata)
+    for chunk_count, chunk in enumerate(iter_line_chunks(body_lines, max(1, config.lazy.chunk_size)), start=1):
+        key = f"file-list-{chunk_count}"
+        if chunk_count == 1 and search_url is not None:
+            yield SEARCH_BOX_MARKUP + "\n\n"
+        write_chunk(key, "<ul>" + "\n".join(chunk) + "</ul>")
+        yield f'<div class="lazyload-placeholder" data-content="{key}" style="min-height: 400px;"></div>\n'
+    if not chunk_count:
+        yield "<p>No files found.</p>\n"
+        return
+    yield "\n" + build_lazyload_script(config.lazy, None, chunk_base, search_url) + "\n"
+
+
+def iter_render_html_virtual(
+    files: Iterable[Path | str],
+    config: GeneratorConfig,
+    section_cache: Optional[SectionCache] = None,
+    metadata: Optional[FileMetadata] = None,
+) -> Iterator[str]:
+    header = _html_header(config)
+    if header:
+        yield header + "\n\n"
+    rows = iter_section_lines("virtual", files, config, section_cache, metadata)
+    first = next(rows, None)
+    if first is None:
+        yield "<p>No files found.</p>\n"
+        return
+    yield VIRTUAL_LIST_MARKUP + "\n"
+    yield "<script>window.fileListRows = [\n" + first
+    for row in rows:
+        yield ",\n" + row
+    yield "\n];</script>\n\n"
+    yield build_virtual_script(config.lazy, build_file_url(config.repo_url, config.link_reference, "")) + "\n"
+
+
+def render_markdown_section(
+    title: str,
+    entries: Sequence[str],
+    config: GeneratorConfig,
+    heading: bool = True,
+    trailer: bool = True,
+    metadata: Optional[FileMetadata] = None,
+) -> List[str]:
     lines: List[str] = []
+    cleaned_title = title.strip()
+    if heading and cleaned_title:
+        if cleaned_title.startswith("#"):
+            lines.append(cleaned_title)
+        else:
+            lines.append(f"### {cleaned_title}")
+        lines.append("")
+    for entry in entries:
+        url = build_file_url(config.repo_url, config.link_reference, entry)
+        label = metadata.label(entry) if metadata is not None else ""
+        details = f" · {html.escape(label)}" if label else ""
+        lines.append(f"- [{html.escape(entry)}]({url}){details}")
+    if trailer:
+        lines.append("")
+    return lines
+
 
+def iter_markdown_lines(
+    files: Iterable[Path | str],
+    config: GeneratorConfig,
+    section_cache: Optional[SectionCache] = None,
+    metadata: Optional[FileMetadata] = None,
+) -> Iterator[str]:
     header_text = config.header_text.strip()
     if header_text:
         if header_text.startswith("#"):
-            lines.append(header_text)
+            yield header_text
         else:
-            lines.append(f"## {header_text}")
-        lines.append("")
+            yield f"## {header_text}"
+        yield ""
 
     intro_text = config.intro_text.strip()
     if intro_text:
-        lines.append(intro_text)
-        lines.append("")
+        yield intro_text
+        yield ""
+
+    yield from iter_section_lines("markdown", files, config, section_cache, metadata)
+
+
+def iter_stripped_document(lines: Iterable[str]) -> Iterator[str]:
+    # Streaming form of "\n".join(lines).strip() + "\n".
+    pending_blanks: List[str] = []
+    started = False
+    for line in lines:
+        if not line.strip():
+            if started:
+                pending_blanks.append(line)
+            continue
+        if not started:
+            started = True
+            yield line.lstrip()
+            continue
+        yield "\n" + "".join(blank + "\n" for blank in pending_blanks) + line
+        pending_blanks = []
+    yield "\n"
+
+
+def iter_render_markdown(
+    files: Iterable[Path | str],
+    config: GeneratorConfig,
+    section_cache: Optional[SectionCache] = None,
+    metadata: Optional[FileMetadata] = None,
+) -> Iterator[str]:
+    return iter_stripped_document(iter_markdown_lines(files, config, section_cache, metadata))
+
+
+def render_markdown(
+    files: Sequence[Path | str],
+    config: GeneratorConfig,
+    section_cache: Optional[SectionCache] = None,
+    metadata: Optional[FileMetadata] = None,
+) -> str:
+    return "".join(iter_render_markdown(files, config, section_cache, metadata))
+
+
+def section_category(title: str, entries: Sequence[str], categories: Sequence[Category]) -> Optional[str]:
+    # Sections never mix matching and non-matching files.
+    if not entries:
+        return None
+    category = CategoryMatcher(categories).match(entries[0])
+    return category.name if category is not None and category.name == title else None
+
+
+def file_record(
+    path: str, section: str, category: Optional[str], config: GeneratorConfig, metadata: Optional[FileMetadata] = None
+) -> Dict[str, object]:
+    record: Dict[str, object] = {
+        "path": path,
+        "section": section,
+        "category": category,
+        "url": build_file_url(config.repo_url, config.link_reference, path),
+    }
+    if metadata is not None:
+        record.update(metadata.fields(path))
+    return record
+
+
+def render_record_section(
+    title: str, entries: Sequence[str], config: GeneratorConfig, metadata: Optional[FileMetadata] = None
+) -> List[str]:
+    # ensure_ascii keeps surrogate-escaped paths encodable.
+    category = section_category(title, entries, config.categories)
+    return [json.dumps(file_record(entry, title, category, config, metadata), separators=(",", ":")) for entry in entries]
 
-    for title, entries in sections:
-        cleaned_title = title.strip()
-        if cleaned_title:
-            if cleaned_title.startswith("#"):
-                lines.append(cleaned_title)
-            else:
-                lines.append(f"### {cleaned_title}")
-            lines.append("")
-        for entry in entries:
-            url = build_file_url(config.repo_url, config.link_reference, entry)
-            lines.append(f"- [{html.escape(entry)}]({url})")
-        lines.append("")
 
-    return "\n".join(lines).strip() + "\n"
+def iter_render_records(
+    files: Iterable[Path | str],
+    config: GeneratorConfig,
+    section_cache: Optional[SectionCache] = None,
+    metadata: Optional[FileMetadata] = None,
+) -> Iterator[str]:
+    lines = iter_section_lines("records", files, config, section_cache, metadata)
+    if config.output_format == "ndjson":
+        for line in lines:
+            yield line + "\n"
+        return
+    separator = "[\n"
+    for line in lines:
+        yield separator + line
+        separator = ",\n"
+    yield "[]\n" if separator == "[\n" else "\n]\n"
+
+
+def render_records(
+    files: Sequence[Path | str],
+    config: GeneratorConfig,
+    section_cache: Optional[SectionCache] = None,
+    metadata: Optional[FileMetadata] = None,
+) -> str:
+    return "".join(iter_render_records(files, config, section_cache, metadata))
 
 
 def build_parser() -> argparse.ArgumentParser:
@@ -572,12 +3222,13 @@ def build_parser() -> argparse.ArgumentParser:
     parser.add_argument("--log-level", default="INFO", choices=["DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"])
     parser.add_argument("--repo-url", help="Primary repository URL for generated links.")
     parser.add_argument("--fallback-repo-url", default=DEFAULT_FALLBACK_REPO_URL, help="Fallback repository URL when automatic detection fails.")
-    parser.add_argument("--output-format", choices=["html", "markdown"], default=DEFAULT_OUTPUT_FORMAT)
+    parser.add_argument("--output-format", choices=OUTPUT_FORMATS, default=DEFAULT_OUTPUT_FORMAT)
     parser.add_argument("--output-file", default=DEFAULT_OUTPUT_FILE, help="Destination file name. Use '-' to write to stdout.")
     parser.add_argument("--color-source", choices=["random", "list"], default=DEFAULT_COLOR_SOURCE)
     parser.add_argument("--color-list", nargs="+", help="Colour list when using color-source=list (hex codes).")
     parser.add_argument("--color-range", nargs=2, metavar=("MIN", "MAX"), help="Random colour range bounds (#RRGGBB).")
-    parser.add_argument("--max-attempts", type=int, default=DEFAULT_MAX_ATTEMPTS, help="Maximum attempts when searching for compliant colours.")
+    parser.add_argument("--max-attempts", type=optional_int, default=None, help="Deprecated and ignored; random colours are drawn from a precomputed palette.")
+    parser.add_argument("--color-seed", type=optional_int, default=None, help="Seed for random colour generation so repeated runs produce identical output.")
     parser.add_argument("--exclude-dark-colors", nargs="?", const=True, default=False, type=str_to_bool, help="Exclude colours below the dark luminance threshold.")
     parser.add_argument("--exclude-bright-colors", nargs="?", const=True, default=False, type=str_to_bool, help="Exclude colours above the bright luminance threshold.")
     parser.add_argument("--exclude-blacks", nargs="?", const=True, default=False, type=str_to_bool, help="Exclude colours darker than the black threshold.")
@@ -604,9 +3255,54 @@ def build_parser() -> argparse.ArgumentParser:
     parser.add_argument("--link-ref", help="Explicit branch, tag, or SHA to use when building links.")
     parser.add_argument("--default-branch", help="Fallback branch name when link-ref is not supplied.")
     parser.add_argument("--output-file-stdout", dest="output_file_stdout", nargs="?", const=True, default=False, type=str_to_bool, help="Write output to stdout regardless of output-file value.")
+    parser.add_argument("--discovery-engine", choices=DISCOVERY_ENGINES, default=DEFAULT_DISCOVERY_ENGINE, help="Filesystem walker used when git-aware discovery is not in effect.")
+    parser.add_argument("--discovery-workers", type=int, default=0, help="Thread pool size for the scandir engine (0 picks a default from the CPU count).")
+    parser.add_argument("--git-backend", choices=GIT_BACKENDS, default=DEFAULT_GIT_BACKEND, help="How git-aware discovery lists tracked files: run git ls-files or read .git/index directly.")
+    parser.add_argument("--git-untracked", nargs="?", const=True, default=True, type=str_to_bool, help="Include untracked, non-ignored files when reading .git/index directly.")
+    parser.add_argument("--stream", nargs="?", const=True, default=False, type=str_to_bool, help="Render and write output incrementally instead of building the whole document in memory.")
+    parser.add_argument("--html-chunk-mode", choices=HTML_CHUNK_MODES, default=DEFAULT_HTML_CHUNK_MODE, help="Embed lazily loaded chunks in the page or write each one to its own file fetched on demand.")
+    parser.add_argument("--html-layout", choices=HTML_LAYOUTS, default=DEFAULT_HTML_LAYOUT, help="Expand lazily loaded chunks into the page, or draw only the rows near the viewport with a virtual scroller.")
+    parser.add_argument("--search-index", nargs="?", const=True, default=False, type=str_to_bool, help="Write a path index next to the HTML page and add a search box that loads only the chunks with matches.")
+    parser.add_argument("--source-ref", help="List files from this commit's tree with git ls-tree instead of the working tree (works in bare and blobless clones); links point at its SHA.")
+    parser.add_argument("--since", help="Update the file list stored in --cache-file with the git changes since this commit and the current untracked files instead of listing the whole tree.")
+    parser.add_argument("--file-metadata", nargs="?", const=True, default=False, type=str_to_bool, help="Show each file's size, last commit date and author, read from a single git history pass (size and mtime outside git).")
+    parser.add_argument("--compress", nargs="+", help="Also write precompressed siblings of the output: gzip (.gz) and/or brotli (.br).")
+    parser.add_argument("--jobs", type=int, default=0, help="Render sections in this many worker processes (0 or 1 renders in-process).")
+    parser.add_argument("--batch-config", default="", help="JSON file listing several output targets rendered from a single scan.")
+    parser.add_argument("--metrics-file", default="", help="Write per-phase timings, counters, subprocess and memory statistics to this JSON file.")
+    parser.add_argument("--profile-phases", nargs="+", help=f"Run cProfile around these phases ({', '.join(METRIC_PHASES)}) and save them as <metrics-file>.PHASE.prof.")
+    parser.add_argument("--trace-memory-phases", nargs="+", help="Record tracemalloc peaks and top allocation sites for these phases in the metrics file.")
+    parser.add_argument("--cache-file", default="", help="Manifest cache used to skip regeneration when the tree and configuration are unchanged.")
+    parser.add_argument("--watch", nargs="?", const=True, default=False, type=str_to_bool, help="Keep running and rewrite the output whenever files are added, removed or renamed.")
+    parser.add_argument("--watch-debounce", type=float, default=DEFAULT_WATCH_DEBOUNCE, help="Seconds of quiet to wait for after a filesystem event before rebuilding.")
+    parser.add_argument("--watch-backend", choices=WATCH_BACKENDS, default=DEFAULT_WATCH_BACKEND, help="Use inotify (Linux), poll directory modification times, or pick automatically.")
+    parser.set_defaults(command="generate")
+    return parser
+
+
+def build_serve_parser() -> argparse.ArgumentParser:
+    parser = build_parser()
+    parser.prog = f"{parser.prog} serve"
+    parser.description = "Serve the file index over HTTP: an HTML page backed by a paginated JSON API."
+    serve = parser.add_argument_group("serve options")
+    serve.add_argument("--host", default=DEFAULT_SERVE_HOST, help="Interface to listen on.")
+    serve.add_argument("--port", type=int, default=DEFAULT_SERVE_PORT, help="Port to listen on (0 picks a free port).")
+    serve.add_argument("--page-size", type=int, default=DEFAULT_SERVE_PAGE_SIZE, help=f"Default number of entries per JSON page (at most {SERVE_MAX_PAGE_SIZE}).")
+    serve.add_argument("--refresh-interval", type=float, default=0.0, help="Rescan the tree every this many seconds (0 serves the first scan until restarted).")
+    parser.set_defaults(command="serve")
     return parser
 
 
+def resolve_optional_path(value: Optional[str], directory: Path) -> Optional[Path]:
+    raw = (value or "").strip()
+    if not raw:
+        return None
+    path = Path(raw)
+    if not path.is_absolute():
+        path = (directory / path).resolve()
+    return path
+
+
 def build_config(args: argparse.Namespace) -> GeneratorConfig:
     directory = Path(args.directory).resolve()
     if not directory.exists():
@@ -671,10 +3367,25 @@ def build_config(args: argparse.Namespace) -> GeneratorConfig:
             deduped_ignore.append(key)
     ignore_list = deduped_ignore
     repo_url = resolve_repo_url(args.repo_url, args.fallback_repo_url, directory)
-    link_reference = resolve_link_reference(args.link_ref, args.default_branch, directory)
+    source_ref = (args.source_ref or "").strip()
+    resolved_ref: Optional[str] = None
+    if source_ref:
+        if args.watch:
+            raise ValueError("--source-ref lists a fixed commit and cannot be combined with --watch.")
+        resolved_ref = git_resolve_commit(directory, source_ref)
+        if resolved_ref is None:
+            raise ValueError(f"--source-ref '{source_ref}' does not name a commit in {directory}.")
+        # Link to the listed commit, not a branch that may move.
+        link_reference = resolved_ref
+    else:
+        link_reference = resolve_link_reference(args.link_ref, args.default_branch, directory)
     output_file_arg = args.output_file
     if args.output_format == "html" and output_file_arg.lower().endswith(".md"):
         output_file_arg = output_file_arg[:-3] + ".html"
+    elif args.output_format in (*RECORD_FORMATS, "sqlite"):
+        stem, dot, suffix = output_file_arg.rpartition(".")
+        if dot and suffix.lower() in ("md", "html"):
+            output_file_arg = f"{stem}.{args.output_format}"
     output_path: Optional[Path]
     if args.output_file_stdout or (output_file_arg.strip() == "-"):
         output_path = None
@@ -683,11 +3394,46 @@ def build_config(args: argparse.Namespace) -> GeneratorConfig:
         if not candidate.is_absolute():
             candidate = (directory / candidate).resolve()
         output_path = candidate
+    if args.output_format == "sqlite" and output_path is None:
+        raise ValueError("--output-format sqlite writes a database file and needs an output file.")
+    if args.output_format == "html" and args.html_chunk_mode == "external" and output_path is None:
+        raise ValueError("--html-chunk-mode external writes chunk files next to the page and needs an output file.")
+    if args.output_format == "html" and args.search_index and output_path is None:
+        raise ValueError("--search-index writes its index next to the page and needs an output file.")
+    if args.output_format == "html" and args.html_layout == "virtual":
+        if args.html_chunk_mode == "external":
+            raise ValueError("--html-layout virtual keeps every row in the page and cannot use external chunks.")
+        if args.search_index:
+            raise ValueError("--search-index filters lazily loaded chunks and needs --html-layout lazyload.")
+    compress_entries = args.compress
+    if isinstance(compress_entries, list) and len(compress_entries) == 1:
+        single_value = compress_entries[0]
+        if isinstance(single_value, str) and " " in single_value:
+            compress_entries = [value for value in single_value.split() if value]
+    compress: List[str] = []
+    for entry in compress_entries or []:
+        method = entry.strip().lower()
+        if not method or method in compress:
+            continue
+        if method not in COMPRESSION_SUFFIXES:
+            raise ValueError(f"Unsupported compression '{entry}'; choose from {', '.join(COMPRESSION_SUFFIXES)}.")
+        if method == "brotli" and load_brotli() is None:
+            raise ValueError("brotli compression requires the optional 'brotli' package (pip install brotli).")
+        compress.append(method)
+    if compress and output_path is None:
+        raise ValueError("--compress writes files next to the output and needs an output file.")
+    if args.watch and output_path is None:
+        raise ValueError("--watch rewrites the output file on every change and cannot write to stdout.")
+    cache_path = resolve_optional_path(args.cache_file, directory)
+    if (args.since or "").strip():
+        if cache_path is None:
+            raise ValueError("--since updates the file list stored in --cache-file and needs one.")
+        if args.watch:
+            raise ValueError("--since applies one commit range and cannot be combined with --watch.")
     color_preferences = ColorPreferences(
         source=args.color_source,
         colors=color_list,
         color_range=color_range,
-        max_attempts=max(args.max_attempts, 1),
         exclude_dark=args.exclude_dark_colors,
         exclude_bright=args.exclude_bright_colors,
         exclude_blacks=args.exclude_blacks,
@@ -695,6 +3441,7 @@ def build_config(args: argparse.Namespace) -> GeneratorConfig:
         ensure_readable=args.ensure_readable_colors,
         dark_luminance_threshold=args.dark_color_luminance_threshold,
         bright_luminance_threshold=args.bright_color_luminance_threshold,
+        seed=args.color_seed,
     )
     lazy_preferences = LazyLoadPreferences(
         chunk_size=max(1, args.chunk_size),
@@ -722,38 +3469,1453 @@ def build_config(args: argparse.Namespace) -> GeneratorConfig:
         lazy=lazy_preferences,
         respect_gitignore=args.respect_gitignore,
         log_level=args.log_level,
+        cache_file=cache_path,
+        discovery_engine=args.discovery_engine,
+        discovery_workers=max(0, args.discovery_workers),
+        stream=args.stream,
+        git_backend=args.git_backend,
+        git_untracked=args.git_untracked,
+        html_chunk_mode=args.html_chunk_mode,
+        html_layout=args.html_layout,
+        search_index=args.search_index,
+        file_metadata=args.file_metadata,
+        since=(args.since or "").strip() or None,
+        source_ref=resolved_ref,
+        compress=compress,
+        jobs=max(0, args.jobs),
+        watch=args.watch,
+        watch_debounce=max(0.0, args.watch_debounce),
+        watch_backend=args.watch_backend,
     )
 
 
+def load_brotli():  # noqa: ANN201
+    try:
+        import brotli  # type: ignore[import-not-found]
+    except ImportError:
+        try:
+            import brotlicffi as brotli  # type: ignore[import-not-found]
+        except ImportError:
+            return None
+    return brotli
+
+
+@functools.lru_cache(maxsize=None)
+def default_file_mode() -> int:
+    # mkstemp uses 0600; apply the umask-derived mode instead.
+    umask = os.umask(0)
+    os.umask(umask)
+    return 0o666 & ~umask
+
+
+def atomic_write(target: Path, blocks: Iterable[bytes]) -> Tuple[str, bool]:
+    target.parent.mkdir(parents=True, exist_ok=True)
+    handle, temp_name = tempfile.mkstemp(prefix=f".{target.name}.", suffix=".tmp", dir=target.parent)
+    hasher = hashlib.sha256()
+    size = 0
+    try:
+        with os.fdopen(handle, "wb", buffering=STREAM_BUFFER_SIZE) as stream:
+            for block in blocks:
+                stream.write(block)
+                hasher.update(block)
+                size += len(block)
+        digest = hasher.hexdigest()
+        try:
+            current = target.stat()
+        except OSError:
+            current = None
+        if current is not None and current.st_size == size and file_digest(target) == digest:
+            os.unlink(temp_name)
+            return digest, False
+        os.chmod(temp_name, current.st_mode & 0o777 if current is not None else default_file_mode())
+        os.replace(temp_name, target)
+    except BaseException:
+        try:
+            os.unlink(temp_name)
+        except OSError:
+            pass
+        raise
+    return digest, True
+
+
+def iter_file_blocks(path: Path) -> Iterator[bytes]:
+    with path.open("rb") as handle:
+        yield from iter(lambda: handle.read(STREAM_BUFFER_SIZE), b"")
+
+
+def iter_compressed_blocks(blocks: Iterable[bytes], method: str) -> Iterator[bytes]:
+    if method == "gzip":
+        # zlib leaves the gzip header mtime at zero, so output is reproducible.
+        compressor = zlib.compressobj(9, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        process, finish = compressor.compress, compressor.flush
+    else:
+        brotli = load_brotli()
+        if brotli is None:
+            raise RuntimeError("brotli compression requires the optional 'brotli' package.")
+        compressor = brotli.Compressor(quality=11)
+        process, finish = compressor.process, compressor.finish
+    for block in blocks:
+        compressed = process(block)
+        if compressed:
+            yield compressed
+    yield finish()
+
+
+def write_compressed_siblings(path: Path, methods: Sequence[str], changed: bool) -> None:
+    for method in methods:
+        target = path.with_name(path.name + COMPRESSION_SUFFIXES[method])
+        if not changed and target.exists():
+            continue
+        atomic_write(target, iter_compressed_blocks(iter_file_blocks(path), method))
+        run_metrics.add("output_compressed_bytes", target.stat().st_size)
+
+
+def write_file(path: Path, data: bytes, compress: Sequence[str] = ()) -> bool:
+    try:
+        unchanged = path.stat().st_size == len(data) and path.read_bytes() == data
+    except OSError:
+        unchanged = False
+    if not unchanged:
+        atomic_write(path, [data])
+    run_metrics.add("output_bytes", len(data))
+    run_metrics.add("output_files_unchanged" if unchanged else "output_files_written")
+    write_compressed_siblings(path, compress, not unchanged)
+    return not unchanged
+
+
 def write_output(config: GeneratorConfig, content: str) -> None:
     if config.output_file is None:
         sys.stdout.write(content)
+        run_metrics.add("output_bytes", len(content.encode("utf-8")))
         return
+    if not write_file(config.output_file, content.encode("utf-8"), config.compress):
+        logging.info("%s is already up to date; left untouched.", config.output_file)
+
+
+def _write_pieces(handle: TextIO, pieces: Iterable[str]) -> str:
+    digest = hashlib.sha256()
+    size = 0
+    for piece in pieces:
+        handle.write(piece)
+        encoded = piece.encode("utf-8")
+        digest.update(encoded)
+        size += len(encoded)
+    run_metrics.add("output_bytes", size)
+    return digest.hexdigest()
+
+
+def write_output_stream(config: GeneratorConfig, pieces: Iterable[str]) -> str:
+    if config.output_file is None:
+        return _write_pieces(sys.stdout, pieces)
+    digest, changed = atomic_write(config.output_file, (piece.encode("utf-8") for piece in pieces))
+    run_metrics.add("output_bytes", config.output_file.stat().st_size)
+    run_metrics.add("output_files_written" if changed else "output_files_unchanged")
+    if not changed:
+        logging.info("%s is already up to date; left untouched.", config.output_file)
+    write_compressed_siblings(config.output_file, config.compress, changed)
+    return digest
+
+
+def render_content(
+    files: Sequence[Path | str],
+    config: GeneratorConfig,
+    section_cache: Optional[SectionCache] = None,
+    metadata: Optional[FileMetadata] = None,
+) -> str:
+    if config.output_format == "html":
+        return render_html(files, config, section_cache, metadata)
+    if config.output_format in RECORD_FORMATS:
+        return render_records(files, config, section_cache, metadata)
+    return render_markdown(files, config, section_cache, metadata)
+
+
+def iter_content(
+    files: Iterable[Path | str],
+    config: GeneratorConfig,
+    section_cache: Optional[SectionCache] = None,
+    metadata: Optional[FileMetadata] = None,
+) -> Iterator[str]:
+    if config.output_format == "html":
+        return iter_render_html(files, config, section_cache, metadata)
+    if config.output_format in RECORD_FORMATS:
+        return iter_render_records(files, config, section_cache, metadata)
+    return iter_render_markdown(files, config, section_cache, metadata)
+
+
+def emit_external_html(
+    config: GeneratorConfig,
+    files: Sequence[Path | str],
+    section_cache: Optional[SectionCache] = None,
+    metadata: Optional[FileMetadata] = None,
+) -> List[str]:
+    if config.output_file is None:
+        raise ValueError("External HTML chunks need an output file to be written next to.")
+    directory = chunk_directory(config.output_file)
+    writer = ChunkFileWriter(directory, config.compress)
+    chunk_base = urllib.parse.quote(directory.name) + "/"
+    pieces = iter_render_html_external(files, config, writer.write, chunk_base, section_cache, metadata)
+    if config.stream:
+        with run_metrics.phase("stream"):
+            digest = write_output_stream(config, pieces)
+    else:
+        with run_metrics.phase("render"):
+            content = "".join(pieces)
+        with run_metrics.phase("write"):
+            write_output(config, content)
+        digest = content_digest(content)
+    writer.prune()
+    return [digest, *writer.digests]
+
+
+def emit_search_index(config: GeneratorConfig, files: Sequence[Path | str]) -> Optional[str]:
+    path = search_index_path(config)
+    if path is None:
+        return None
+    with run_metrics.phase("render"):
+        data = build_search_index(files, config)
+    with run_metrics.phase("write"):
+        write_file(path, data, config.compress)
+    return hashlib.sha256(data).hexdigest()
+
+
+def section_kind(title: str, entries: Sequence[str], categories: Sequence[Category]) -> Tuple[str, Optional[str]]:
+    category = section_category(title, entries, categories)
+    if category is not None:
+        return "category", category
+    return ("folder" if entries and "/" in entries[0] else "root"), None
+
+
+def iter_sqlite_rows(
+    sections: Iterable[Tuple[str, str, Optional[str], List[str]]],
+    config: GeneratorConfig,
+    metadata: Optional[FileMetadata] = None,
+) -> Iterator[Tuple[object, ...]]:
+    for kind, title, category, entries in sections:
+        for path in entries:
+            directory, _, name = path.rpartition("/")
+            size = timestamp = author = None
+            info = metadata.lookup(path) if metadata is not None else None
+            if info is not None:
+                size = info[0] if info[0] >= 0 else None
+                timestamp = info[1] or None
+                author = info[2]
+            yield (
+                path,
+                directory,
+                name,
+                os.path.splitext(name)[1].lower(),
+                kind,
+                title,
+                category,
+                build_file_url(config.repo_url, config.link_reference, path),
+                size,
+                timestamp,
+                author,
+            )
+
+
+def sqlite_section_digest(
+    kind: str, title: str, entries: Sequence[str], salt: str, metadata: Optional[FileMetadata] = None
+) -> str:
+    digest = hashlib.sha256(f"{salt}\0{kind}\0{title}\0".encode("utf-8", "surrogateescape"))
+    digest.update(entries_digest(entries))
+    if metadata is not None:
+        digest.update(metadata.section_digest(entries, exact=True).encode("ascii"))
+    return digest.hexdigest()
+
+
+def emit_sqlite(config: GeneratorConfig, files: Iterable[Path | str], metadata: Optional[FileMetadata] = None) -> str:
+    import sqlite3
+
+    if config.output_file is None:
+        raise ValueError("--output-format sqlite needs an output file.")
     config.output_file.parent.mkdir(parents=True, exist_ok=True)
-    config.output_file.write_text(content, encoding="utf-8")
+    salt = config_fingerprint(config)
+    sections: List[Tuple[str, str, Optional[str], List[str], str]] = []
+    for title, entries in counted_sections(section_groups(files, config)):
+        kind, category = section_kind(title, entries, config.categories)
+        sections.append((kind, title, category, entries, sqlite_section_digest(kind, title, entries, salt, metadata)))
+    connection = sqlite3.connect(config.output_file, isolation_level=None)
+    try:
+        try:
+            version = connection.execute("PRAGMA user_version").fetchone()[0]
+            connection.execute("BEGIN IMMEDIATE")
+        except sqlite3.DatabaseError as exc:
+            raise ValueError(f"{config.output_file} exists but is not a SQLite database: {exc}") from None
+        try:
+            if version != SQLITE_SCHEMA_VERSION:
+                connection.execute("DROP TABLE IF EXISTS files")
+                connection.execute("DROP TABLE IF EXISTS sections")
+            for statement in SQLITE_TABLES:
+                connection.execute(statement)
+            stored = {(kind, title): digest for kind, title, digest in connection.execute("SELECT kind, title, digest FROM sections")}
+            # No sections yet means no stale rows.
+            existing = bool(stored)
+            changed = [
+                (kind, title, category, entries)
+                for kind, title, category, entries, digest in sections
+                if stored.pop((kind, title), None) != digest
+            ]
+            before = connection.total_changes
+            connection.executemany(SQLITE_UPSERT, iter_sqlite_rows(changed, config, metadata))
+            written = connection.total_changes - before
+            # Stale rows can only sit under changed or vanished sections.
+            listed = {path for _kind, _title, _category, entries in changed for path in entries}
+            stale: List[Tuple[str]] = []
+            suspects = [(kind, title) for kind, title, _category, _entries in changed] + list(stored) if existing else []
+            for key in suspects:
+                query = connection.execute("SELECT path FROM files WHERE section_kind = ? AND section = ?", key)
+                stale.extend(row for row in query if row[0] not in listed)
+            connection.executemany("DELETE FROM files WHERE path = ?", stale)
+            for statement in SQLITE_INDEXES:
+                connection.execute(statement)
+            connection.execute("DELETE FROM sections")
+            connection.executemany(
+                "INSERT INTO sections (position, kind, title, files, digest) VALUES (?, ?, ?, ?, ?)",
+                (
+                    (position, kind, title, len(entries), digest)
+                    for position, (kind, title, _category, entries, digest) in enumerate(sections)
+                ),
+            )
+            connection.execute(f"PRAGMA user_version = {SQLITE_SCHEMA_VERSION}")
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+    finally:
+        connection.close()
+    run_metrics.add("sqlite_sections_written", len(changed))
+    run_metrics.add("sqlite_rows_written", written)
+    run_metrics.add("sqlite_rows_deleted", len(stale))
+    logging.info(
+        "SQLite: %d of %d sections changed, %d rows inserted or updated, %d removed",
+        len(changed),
+        len(sections),
+        written,
+        len(stale),
+    )
+    run_metrics.add("output_bytes", config.output_file.stat().st_size)
+    return file_digest(config.output_file) or ""
+
+
+def emit_document(
+    config: GeneratorConfig,
+    files: Sequence[Path | str],
+    section_cache: Optional[SectionCache] = None,
+    metadata: Optional[FileMetadata] = None,
+) -> List[str]:
+    if config.output_format == "html" and config.html_chunk_mode == "external":
+        return emit_external_html(config, files, section_cache, metadata)
+    if config.output_format == "sqlite":
+        with run_metrics.phase("write"):
+            return [emit_sqlite(config, files, metadata)]
+    if config.stream:
+        with run_metrics.phase("stream"):
+            return [write_output_stream(config, iter_content(files, config, section_cache, metadata))]
+    with run_metrics.phase("render"):
+        content = render_content(files, config, section_cache, metadata)
+    with run_metrics.phase("write"):
+        write_output(config, content)
+    return [content_digest(content)]
+
+
+def emit_output(
+    config: GeneratorConfig,
+    files: Sequence[Path | str],
+    section_cache: Optional[SectionCache] = None,
+    metadata: Optional[FileMetadata] = None,
+) -> str:
+    # Same order as output_matches_digest recombines them.
+    if metadata is None and config.file_metadata:
+        with run_metrics.phase("metadata"):
+            metadata = collect_file_metadata(config, files)
+    digests = emit_document(config, files, section_cache, metadata)
+    search_digest = emit_search_index(config, files)
+    if search_digest is not None:
+        digests.append(search_digest)
+    return combined_digest(digests)
+
+
+def external_asset_names(config: GeneratorConfig) -> List[str]:
+    if config.output_file is None or config.output_format != "html":
+        return []
+    assets: List[Path] = []
+    if config.html_chunk_mode == "external":
+        assets.extend(chunk_asset_paths(config.output_file))
+    search_path = search_index_path(config)
+    if search_path is not None:
+        assets.append(search_path)
+    return [path.relative_to(config.output_file.parent).as_posix() for path in assets]
+
+
+def manifest_asset_paths(config: GeneratorConfig, manifest: Dict[str, object]) -> List[Path]:
+    if config.output_file is None:
+        return []
+    return [config.output_file.parent / name for name in manifest.get("assets", [])]  # type: ignore[union-attr]
+
+
+def compressed_siblings_present(config: GeneratorConfig, assets: Sequence[Path]) -> bool:
+    if config.output_file is None:
+        return True
+    return all(
+        path.with_name(path.name + COMPRESSION_SUFFIXES[method]).exists()
+        for path in (config.output_file, *assets)
+        for method in config.compress
+    )
+
+
+def generate_with_manifest(config: GeneratorConfig, cache_file: Path) -> bool:
+    with run_metrics.phase("manifest"):
+        manifest = load_manifest(cache_file)
+        fingerprint = config_fingerprint(config)
+        # --since trusts the commit range instead of a source key.
+        source_key = compute_source_key(config) if config.since is None else None
+        head = source_commit(config)
+        # The diff misses untracked files, so those are compared separately.
+        untracked: Optional[List[str]] = None
+        if config.since is not None and config.source_ref is not None:
+            untracked = []
+        elif config.since is not None:
+            listed = git_untracked_paths(
+                config.directory, compile_ignore_matcher(tuple(config.ignore_list)), config.respect_gitignore
+            )
+            untracked = sorted(listed) if listed is not None else None
+        cached_fragments: Optional[Dict[str, List[str]]] = None
+        source_unchanged = False
+        # Commit metadata only depends on HEAD, so it survives option changes.
+        cached_metadata = FileMetadata.from_json(manifest.get("metadata")) if manifest is not None else None
+        config_unchanged = manifest is not None and manifest.get("config") == fingerprint
+        # The ref only affects links, so --since can update an older listing.
+        listing = config_fingerprint(config, ("source_ref", "link_reference"))
+        listing_unchanged = manifest is not None and manifest.get("listing") == listing
+        if config_unchanged:
+            cached_fragments = manifest.get("sections")  # type: ignore[assignment]
+            if config.since is None:
+                source_unchanged = manifest.get("source") == source_key
+            else:
+                source_unchanged = (
+                    head is not None
+                    and untracked is not None
+                    and manifest.get("commit") == head
+                    and manifest.get("untracked") == untracked
+                )
+            assets = manifest_asset_paths(config, manifest)
+            if (
+                source_unchanged
+                and output_matches_digest(config.output_file, manifest.get("digest"), assets)
+                and compressed_siblings_present(config, assets)
+            ):
+                return False
+    files = PathTable.from_json(manifest.get("files")) if source_unchanged and manifest is not None else None
+    if files is not None:
+        logging.info("Reusing %d files from manifest cache", len(files))
+    elif config.since is not None and listing_unchanged and head is not None and untracked is not None:
+        with run_metrics.phase("discovery"):
+            files = paths_since(config, manifest, head, untracked)  # type: ignore[arg-type]
+        if files is not None:
+            logging.info("Updated the cached list to %d files from the git diff", len(files))
+    if files is None:
+        with run_metrics.phase("discovery"):
+            files = discover_paths(config)
+        logging.info("Discovered %d files", len(files))
+    run_metrics.add("files", len(files))
+    metadata = None
+    if config.file_metadata:
+        with run_metrics.phase("metadata"):
+            metadata = collect_file_metadata(config, files, cached_metadata)
+    # Streaming keeps no section fragments; the manifest still skips unchanged runs.
+    section_cache = None if config.stream else SectionCache(cached_fragments)
+    digest = emit_output(config, files, section_cache, metadata)
+    if section_cache is not None:
+        logging.debug("Section cache: %d reused, %d rendered", section_cache.hits, section_cache.misses)
+    manifest = {
+        "version": MANIFEST_VERSION,
+        "config": fingerprint,
+        "listing": listing,
+        "source": None,
+        "digest": digest,
+        "files": files.to_json(),
+        "sections": section_cache.fragments if section_cache is not None else {},
+        "assets": external_asset_names(config),
+        "commit": head,
+    }
+    if untracked is not None:
+        manifest["untracked"] = untracked
+    if metadata is not None and metadata.head is not None:
+        manifest["metadata"] = metadata.to_json()
+    elif cached_metadata is not None:
+        manifest["metadata"] = cached_metadata.to_json()
+    # Taken after writing, since the writes themselves can move mtimes.
+    with run_metrics.phase("manifest"):
+        save_manifest(cache_file, manifest)
+        if config.since is None:
+            manifest["source"] = compute_source_key(config)
+            save_manifest(cache_file, manifest)
+    return True
+
+
+def paths_since(
+    config: GeneratorConfig, manifest: Dict[str, object], head: str, untracked: Sequence[str]
+) -> Optional[PathTable]:
+    since = git_resolve_commit(config.directory, config.since or "")
+    if since is None or manifest.get("commit") != since:
+        logging.info(
+            "The manifest was written at %s, not at --since %s; listing the whole tree.",
+            manifest.get("commit") or "an unknown commit",
+            config.since,
+        )
+        return None
+    previous = manifest.get("untracked")
+    if not isinstance(previous, list):
+        logging.info("The manifest does not record untracked files; listing the whole tree.")
+        return None
+    files = PathTable.from_json(manifest.get("files"))
+    changes = read_git_diff(config.directory, since, head) if files is not None else None
+    if files is None or changes is None:
+        return None
+    added, removed = changes
+    # Re-added paths are dropped first so that a file never appears twice.
+    files.discard_paths([*added, *removed, *previous, *untracked])
+    matcher = compile_ignore_matcher(tuple(config.ignore_list))
+    for path in sorted({path for path in added if not matcher.ignores(path)}.union(untracked)):
+        files.append_path(path)
+    files.compact()
+    run_metrics.add("changed_paths", len(added) + len(removed))
+    logging.info(
+        "Applied %d added and %d removed paths between %s and %s, and %d untracked files",
+        len(added),
+        len(removed),
+        since[:12],
+        head[:12],
+        len(untracked),
+    )
+    return files
+
+
+def scan_subtree(root: str, relative: str, matcher: IgnoreMatcher) -> List[str]:
+    collected: List[str] = []
+    pending = [relative]
+    while pending:
+        current = pending.pop()
+        files, subdirs = _scan_directory(root, current, matcher)
+        prefix = f"{current}/" if current else ""
+        collected.extend(prefix + name for name in files)
+        pending.extend(subdirs)
+    return collected
+
+
+def git_check_ignore(root: Path, paths: Sequence[str]) -> Set[str]:
+    if not paths:
+        return set()
+    try:
+        completed = run_command(
+            ["git", "check-ignore", "-z", "--stdin"],
+            cwd=root,
+            input=b"\0".join(os.fsencode(path) for path in paths) + b"\0",
+            capture_output=True,
+            check=False,
+        )
+    except (FileNotFoundError, OSError) as exc:
+        logging.debug("Unable to run git check-ignore: %s", exc)
+        return set()
+    # Exit status 1 means nothing was ignored; anything else is an error.
+    if completed.returncode not in (0, 1):
+        logging.debug("git check-ignore failed: %s", completed.stderr.decode("utf-8", "replace").strip())
+        return set()
+    return {os.fsdecode(entry) for entry in completed.stdout.split(b"\0") if entry}
+
+
+class PollingWatcher:
+    def __init__(
+        self, root: Path, matcher: IgnoreMatcher, interval: float = WATCH_POLL_INTERVAL, track_files: bool = False
+    ) -> None:
+        self.root = os.fspath(root)
+        self.matcher = matcher
+        self.interval = interval
+        self.track_files = track_files
+        self.directories: Dict[str, Tuple[int, Set[str]]] = {}
+        self.files: Dict[str, int] = {}
+        self._track("")
+
+    def _file_mtime(self, relative: str) -> Optional[int]:
+        try:
+            return os.stat(os.path.join(self.root, relative)).st_mtime_ns
+        except OSError:
+            return None
+
+    def _track_files(self, prefix: str, names: Iterable[str]) -> None:
+        for name in names:
+            mtime = self._file_mtime(prefix + name)
+            if mtime is not None:
+                self.files.setdefault(prefix + name, mtime)
+
+    def _track(self, relative: str) -> None:
+        pending = [relative]
+        while pending:
+            current = pending.pop()
+            try:
+                mtime = os.stat(os.path.join(self.root, current)).st_mtime_ns
+            except OSError:
+                continue
+            files, subdirs = _scan_directory(self.root, current, self.matcher)
+            prefix = f"{current}/" if current else ""
+            self.directories[current] = (mtime, {prefix + name for name in files} | set(subdirs))
+            if self.track_files:
+                self._track_files(prefix, files)
+            pending.extend(subdirs)
+
+    def _forget(self, relative: str) -> None:
+        prefix = relative + "/"
+        for directory in [name for name in self.directories if name == relative or name.startswith(prefix)]:
+            del self.directories[directory]
+        for path in [name for name in self.files if name == relative or name.startswith(prefix)]:
+            del self.files[path]
+
+    def _poll(self) -> Set[str]:
+        changed: Set[str] = set()
+        for relative in list(self.directories):
+            known = self.directories.get(relative)
+            if known is None:
+                continue
+            try:
+                mtime = os.stat(os.path.join(self.root, relative)).st_mtime_ns
+            except OSError:
+                self._forget(relative)
+                continue
+            if mtime == known[0]:
+                continue
+            files, subdirs = _scan_directory(self.root, relative, self.matcher)
+            prefix = f"{relative}/" if relative else ""
+            entries = {prefix + name for name in files} | set(subdirs)
+            self.directories[relative] = (mtime, entries)
+            for gone in known[1] - entries:
+                self._forget(gone)
+            changed |= known[1] ^ entries
+            if self.track_files:
+                self._track_files(prefix, files)
+            for subdir in subdirs:
+                if subdir not in self.directories:
+                    self._track(subdir)
+        # Rewriting a file in place leaves its directory's mtime alone.
+        for path, known_mtime in list(self.files.items()):
+            mtime = self._file_mtime(path)
+            if mtime is not None and mtime != known_mtime:
+                self.files[path] = mtime
+                changed.add(path)
+        return changed
+
+    def read(self, timeout: Optional[float] = None) -> Optional[Set[str]]:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            remaining = self.interval if deadline is None else max(0.0, min(self.interval, deadline - time.monotonic()))
+            time.sleep(remaining)
+            changed = self._poll()
+            if changed or (deadline is not None and time.monotonic() >= deadline):
+                return changed
+
+    def close(self) -> None:
+        self.directories.clear()
+        self.files.clear()
+
+
+def load_inotify():  # noqa: ANN201
+    if not sys.platform.startswith("linux"):
+        return None
+    import ctypes
+
+    try:
+        libc = ctypes.CDLL(None, use_errno=True)
+        libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        libc.inotify_rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+        libc.inotify_init1.argtypes = [ctypes.c_int]
+    except (OSError, AttributeError):
+        return None
+    return libc
+
+
+class InotifyWatcher:
+    def __init__(self, root: Path, matcher: IgnoreMatcher, libc, mask: int = INOTIFY_WATCH_MASK) -> None:  # noqa: ANN001
+        import ctypes
+
+        self._get_errno = ctypes.get_errno
+        self.root = os.fspath(root)
+        self.matcher = matcher
+        self.libc = libc
+        self.mask = mask
+        self.watches: Dict[int, str] = {}
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            code = self._get_errno()
+            raise OSError(code, os.strerror(code))
+        try:
+            self._watch_tree("")
+        except OSError:
+            self.close()
+            raise
+
+    def _watch_tree(self, relative: str) -> None:
+        pending = [relative]
+        while pending:
+            current = pending.pop()
+            path = os.path.join(self.root, current) if current else self.root
+            wd = self.libc.inotify_add_watch(self.fd, os.fsencode(path), self.mask)
+            if wd < 0:
+                code = self._get_errno()
+                if code in (errno.ENOENT, errno.ENOTDIR, errno.EACCES):
+                    continue
+                if code == errno.ENOSPC:
+                    raise OSError(code, "inotify watch limit reached; raise fs.inotify.max_user_watches")
+                raise OSError(code, os.strerror(code))
+            self.watches[wd] = current
+            pending.extend(_scan_directory(self.root, current, self.matcher)[1])
+
+    def _unwatch_tree(self, relative: str) -> None:
+        # A moved directory would keep reporting under its old name.
+        prefix = relative + "/"
+        for wd, directory in list(self.watches.items()):
+            if directory == relative or directory.startswith(prefix):
+                self.libc.inotify_rm_watch(self.fd, wd)
+                del self.watches[wd]
+
+    def read(self, timeout: Optional[float] = None) -> Optional[Set[str]]:
+        changed: Set[str] = set()
+        overflowed = False
+        if not select.select([self.fd], [], [], timeout)[0]:
+            return changed
+        while True:
+            try:
+                data = os.read(self.fd, 1 << 16)
+            except BlockingIOError:
+                break
+            position = 0
+            while position < len(data):
+                wd, mask, _cookie, length = INOTIFY_EVENT.unpack_from(data, position)
+                name = data[position + INOTIFY_EVENT.size : position + INOTIFY_EVENT.size + length].split(b"\0", 1)[0]
+                position += INOTIFY_EVENT.size + length
+                if mask & IN_Q_OVERFLOW:
+                    overflowed = True
+                    continue
+                if mask & IN_IGNORED:
+                    self.watches.pop(wd, None)
+                    continue
+                parent = self.watches.get(wd)
+                if parent is None or not name:
+                    continue
+                relative = f"{parent}/{os.fsdecode(name)}" if parent else os.fsdecode(name)
+                changed.add(relative)
+                if not mask & IN_ISDIR:
+                    continue
+                if mask & IN_MOVED_FROM:
+                    self._unwatch_tree(relative)
+                elif mask & (IN_CREATE | IN_MOVED_TO) and not self.matcher.ignores(relative, is_dir=True):
+                    self._watch_tree(relative)
+        if overflowed:
+            # Events were dropped; re-add watches and let the caller rescan.
+            self._watch_tree("")
+            return None
+        return changed
+
+    def close(self) -> None:
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+        self.watches.clear()
+
+
+def open_watcher(config: GeneratorConfig, matcher: IgnoreMatcher) -> PollingWatcher | InotifyWatcher:
+    if config.watch_backend != "poll":
+        libc = load_inotify()
+        if libc is None and config.watch_backend == "inotify":
+            raise OSError(errno.ENOSYS, "inotify is not available on this platform")
+        if libc is not None:
+            try:
+                # Metadata runs also need to hear about files rewritten in place.
+                mask = INOTIFY_WATCH_MASK | (IN_CLOSE_WRITE if config.file_metadata else 0)
+                return InotifyWatcher(config.directory, matcher, libc, mask)
+            except OSError as exc:
+                if config.watch_backend == "inotify":
+                    raise
+                logging.warning("Cannot watch with inotify (%s); polling for changes instead.", exc)
+    return PollingWatcher(config.directory, matcher, track_files=config.file_metadata)
+
+
+def wait_for_changes(watcher: PollingWatcher | InotifyWatcher, debounce: float) -> Optional[Set[str]]:
+    # Collect until quiet for the debounce interval: one rebuild per burst.
+    changed = watcher.read(None)
+    while changed is not None:
+        more = watcher.read(debounce)
+        if more is None:
+            return None
+        if not more:
+            break
+        changed |= more
+    return changed
+
+
+def apply_watch_changes(config: GeneratorConfig, live: LiveSections, matcher: IgnoreMatcher, changed: Iterable[str]) -> bool:
+    root = os.fspath(config.directory)
+    modified = False
+    present: List[Tuple[str, bool]] = []
+    for relative in sorted(changed):
+        full = os.path.join(root, relative)
+        is_dir = os.path.isdir(full)
+        # Symlinked directories are skipped by discovery, so they count as absent.
+        if not os.path.lexists(full) or (is_dir and os.path.islink(full)) or should_ignore(Path(relative), matcher, is_dir):
+            modified = live.discard_tree(relative) or modified
+            continue
+        present.append((relative, is_dir))
+    if config.respect_gitignore:
+        ignored = git_check_ignore(config.directory, [relative + "/" if is_dir else relative for relative, is_dir in present])
+        present = [(relative, is_dir) for relative, is_dir in present if (relative + "/" if is_dir else relative) not in ignored]
+    added: List[str] = []
+    nested: List[str] = []
+    for relative, is_dir in present:
+        if is_dir:
+            nested.extend(scan_subtree(root, relative, matcher))
+        else:
+            added.append(relative)
+    if config.respect_gitignore and nested:
+        # Files inside a new directory may be excluded by its own .gitignore.
+        ignored = git_check_ignore(config.directory, nested)
+        nested = [relative for relative in nested if relative not in ignored]
+    for relative in added + nested:
+        modified = live.add(relative) or modified
+    # A rewritten file keeps its place in the list but not its metadata.
+    return modified or bool(config.file_metadata and added)
+
+
+def watch_output(config: GeneratorConfig) -> int:
+    matcher = compile_ignore_matcher(tuple(config.ignore_list))
+    with run_metrics.phase("discovery"):
+        files = discover_paths(config)
+    run_metrics.add("files", len(files))
+    live = LiveSections(files, config.categories, config.repo_root_header)
+    del files
+    # Streaming output keeps no sections to reuse.
+    section_cache = None if config.stream else SectionCache()
+    # Opened first so changes made during the first render are seen.
+    watcher = open_watcher(config, matcher)
+    logging.info("Watching %s with %s", config.directory, type(watcher).__name__)
+    metadata: Optional[FileMetadata] = None
+    try:
+        while True:
+            started = time.perf_counter()
+            if config.file_metadata:
+                with run_metrics.phase("metadata"):
+                    metadata = collect_file_metadata(config, live, metadata)
+            emit_output(config, live, section_cache, metadata)
+            if section_cache is not None:
+                logging.debug("Section cache: %d reused, %d rendered", section_cache.hits, section_cache.misses)
+                section_cache = SectionCache(section_cache.fragments)
+            logging.info("Wrote %d files to %s in %.3fs", len(live), config.output_file, time.perf_counter() - started)
+            while True:
+                changed = wait_for_changes(watcher, config.watch_debounce)
+                if changed is None:
+                    logging.info("Filesystem events were dropped; rescanning %s", config.directory)
+                    with run_metrics.phase("discovery"):
+                        live = LiveSections(discover_paths(config), config.categories, config.repo_root_header)
+                    break
+                if apply_watch_changes(config, live, matcher, changed):
+                    logging.debug("%d path(s) changed", len(changed))
+                    break
+    except KeyboardInterrupt:
+        return 0
+    finally:
+        watcher.close()
+
+
+def entry_colors(prefs: ColorPreferences, title: str, offset: int, start: int, count: int) -> List[str]:
+    colors: List[str] = []
+    position = start
+    while len(colors) < count:
+        index = position // RENDER_SLICE_SIZE
+        slice_start = index * RENDER_SLICE_SIZE
+        generator = slice_color_generator(prefs, title, index, offset + slice_start + (index > 0))
+        # The first slice starts with the heading colour.
+        for _ in range(position - slice_start + (index == 0)):
+            generator.next_color()
+        take = min(count - len(colors), slice_start + RENDER_SLICE_SIZE - position)
+        colors.extend(generator.next_color() for _ in range(take))
+        position += take
+    return colors
+
+
+class FileIndex:
+    def __init__(self, config: GeneratorConfig, files: Sequence[str], metadata: Optional[FileMetadata] = None) -> None:
+        self.config = config
+        self.metadata = metadata
+        self.sections = build_sections(files, config.categories, config.repo_root_header)
+        # Plain code-point order keeps every prefix in one contiguous range.
+        self.paths = sorted(files)
+        self.offsets: List[int] = []
+        # A folder can be named like a category.
+        self.kinds: List[Tuple[str, Optional[str]]] = []
+        self._keys: Dict[Tuple[str, str], int] = {}
+        self._matcher = CategoryMatcher(config.categories)
+        digest = hashlib.sha256(config_fingerprint(config).encode("ascii"))
+        offset = 0
+        for number, (title, entries) in enumerate(self.sections):
+            self.offsets.append(offset)
+            kind = section_kind(title, entries, config.categories)
+            self.kinds.append(kind)
+            self._keys[(kind[0], title)] = number
+            offset += len(entries) + 1
+            digest.update(title.encode("utf-8", "surrogateescape") + b"\0")
+            digest.update(entries_digest(entries))
+        self.etag = digest.hexdigest()
+
+    @classmethod
+    def from_config(cls, config: GeneratorConfig) -> "FileIndex":
+        with run_metrics.phase("discovery"):
+            files = discover_paths(config)
+        run_metrics.add("files", len(files))
+        metadata = None
+        if config.file_metadata:
+            with run_metrics.phase("metadata"):
+                metadata = collect_file_metadata(config, files)
+        return cls(config, files, metadata)
+
+    def __len__(self) -> int:
+        return len(self.paths)
+
+    def __contains__(self, path: object) -> bool:
+        if not isinstance(path, str):
+            return False
+        index = bisect.bisect_left(self.paths, path)
+        return index < len(self.paths) and self.paths[index] == path
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.paths)
+
+    def titles(self) -> List[str]:
+        return [title for title, _entries in self.sections]
+
+    def section(self, title: str, kind: Optional[str] = None) -> List[str]:
+        if kind is not None:
+            return self.sections[self._keys[(kind, title)]][1]
+        for candidate in ("root", "category", "folder"):
+            number = self._keys.get((candidate, title))
+            if number is not None:
+                return self.sections[number][1]
+        raise KeyError(title)
+
+    def prefix_range(self, prefix: str) -> Tuple[int, int]:
+        low = bisect.bisect_left(self.paths, prefix)
+        if not prefix:
+            return low, len(self.paths)
+        upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+        return low, bisect.bisect_left(self.paths, upper, low)
+
+    def with_prefix(self, prefix: str) -> List[str]:
+        low, high = self.prefix_range(prefix)
+        return self.paths[low:high]
+
+    def in_category(self, name: str) -> List[str]:
+        if not any(category.name == name for category in self.config.categories):
+            raise KeyError(name)
+        number = self._keys.get(("category", name))
+        return [] if number is None else self.sections[number][1]
+
+    def category_of(self, path: str) -> Optional[str]:
+        category = self._matcher.match(path)
+        return None if category is None else category.name
+
+    def section_of(self, path: str) -> Optional[str]:
+        if path not in self:
+            return None
+        category = self.category_of(path)
+        if category is not None:
+            return category
+        folder, slash, _name = path.rpartition("/")
+        return folder if slash else self.config.repo_root_header
+
+    def url(self, path: str) -> str:
+        return build_file_url(self.config.repo_url, self.config.link_reference, path)
+
+    def record(self, path: str) -> Dict[str, object]:
+        section = self.section_of(path)
+        if section is None:
+            raise KeyError(path)
+        return file_record(path, section, self.category_of(path), self.config, self.metadata)
+
+    def records(self) -> Iterator[Dict[str, object]]:
+        for (title, entries), (_kind, category) in zip(self.sections, self.kinds):
+            for entry in entries:
+                yield file_record(entry, title, category, self.config, self.metadata)
+
+
+class IndexSource:
+    def __init__(self, config: GeneratorConfig) -> None:
+        self.config = config
+        self.index = self.build()
+
+    def build(self) -> FileIndex:
+        with run_metrics.phase("discovery"):
+            files = discover_paths(self.config)
+        run_metrics.add("files", len(files))
+        return FileIndex(self.config, files)
+
+    def refresh(self) -> bool:
+        rebuilt = self.build()
+        if rebuilt.etag == self.index.etag:
+            return False
+        # Handlers read self.index once per request, so no lock is needed.
+        self.index = rebuilt
+        logging.info("Index refreshed: %d files", len(rebuilt.paths))
+        return True
+
+    def refresh_every(self, interval: float, stop: threading.Event) -> None:
+        while not stop.wait(interval):
+            try:
+                self.refresh()
+            except (OSError, subprocess.CalledProcessError) as exc:
+                logging.warning("Refreshing the index failed (%s); keeping the previous snapshot.", exc)
+            except Exception:
+                logging.exception("Unexpected error while refreshing the index; it will no longer be refreshed.")
+                raise
+
+
+def build_serve_shell(config: GeneratorConfig, page_size: int) -> str:
+    header = _html_header(config)
+    script = textwrap.dedent(
+        f"""
+        <script>
+        (async function() {{
+          const root = document.getElementById("file-list");
+          const pageSize = {page_size};
+          const response = await fetch("api/sections");
+          const summary = await response.json();
+          if (!summary.sections.length) {{
+            root.innerHTML = "<p>No files found.</p>";
+            return;
+          }}
+          const observer = new IntersectionObserver(entries => {{
+            entries.forEach(entry => {{
+              if (entry.isIntersecting) {{
+                observer.unobserve(entry.target);
+                loadPage(entry.target);
+              }}
+            }});
+          }}, {{ rootMargin: {script_json(config.lazy.root_margin_large_desktop)} }});
+          async function loadPage(placeholder) {{
+            const url = "api/sections/" + placeholder.dataset.section + "?offset=" + placeholder.dataset.offset + "&limit=" + pageSize;
+            const page = await (await fetch(url)).json();
+            const items = document.createDocumentFragment();
+            page.entries.forEach(entry => {{
+              const item = document.createElement("li");
+              const link = document.createElement("a");
+              link.href = entry.url;
+              link.textContent = entry.path;
+              link.style.color = entry.color;
+              item.appendChild(link);
+              items.appendChild(item);
+            }});
+            placeholder.before(items);
+            if (page.next === null) {{
+              placeholder.remove();
+            }} else {{
+              placeholder.dataset.offset = page.next;
+              observer.observe(placeholder);
+            }}
+          }}
+          summary.sections.forEach(section => {{
+            const heading = document.createElement("h2");
+            heading.textContent = section.title;
+            heading.style.color = section.color;
+            const list = document.createElement("ul");
+            const placeholder = document.createElement("li");
+            placeholder.className = "lazyload-placeholder";
+            placeholder.style.minHeight = "400px";
+            placeholder.dataset.section = section.index;
+            placeholder.dataset.offset = 0;
+            list.appendChild(placeholder);
+            root.append(heading, list);
+            observer.observe(placeholder);
+          }});
+        }})();
+        </script>
+        """
+    ).strip()
+    return (
+        '<!DOCTYPE html>\n<html>\n<head>\n<meta charset="utf-8">\n'
+        f"<title>{html.escape(config.header_text.strip().lstrip('#').strip() or 'File List')}</title>\n"
+        f'</head>\n<body>\n{header}\n<div id="file-list"></div>\n{script}\n</body>\n</html>\n'
+    )
+
+
+def _query_int(query: Dict[str, List[str]], name: str, default: int, low: int, high: int) -> int:
+    values = query.get(name)
+    if not values:
+        return default
+    try:
+        value = int(values[-1])
+    except ValueError:
+        raise ValueError(f"'{name}' must be an integer") from None
+    if not low <= value <= high:
+        raise ValueError(f"'{name}' must be between {low} and {high}")
+    return value
+
+
+def _page(offset: int, limit: int, total: int) -> Dict[str, object]:
+    end = min(total, offset + limit)
+    return {"total": total, "offset": offset, "limit": limit, "next": end if end < total else None}
+
+
+def index_response(
+    index: FileIndex, config: GeneratorConfig, target: str, page_size: int
+) -> Tuple[int, str, object]:
+    parsed = urllib.parse.urlsplit(target)
+    path = parsed.path.rstrip("/") or "/"
+    query = urllib.parse.parse_qs(parsed.query)
+    if path in ("/", "/index.html"):
+        return 200, "text/html; charset=utf-8", build_serve_shell(config, page_size)
+    if path == "/api/sections":
+        return 200, "application/json", {
+            "files": len(index.paths),
+            "sections": [
+                {
+                    "index": number,
+                    "title": title,
+                    "count": len(entries),
+                    "color": slice_color_generator(config.color, title, 0, index.offsets[number]).next_color(),
+                }
+                for number, (title, entries) in enumerate(index.sections)
+            ],
+        }
+    offset = _query_int(query, "offset", 0, 0, sys.maxsize)
+    limit = _query_int(query, "limit", page_size, 1, SERVE_MAX_PAGE_SIZE)
+    if path.startswith("/api/sections/"):
+        try:
+            number = int(path[len("/api/sections/") :])
+            title, entries = index.sections[number]
+        except (ValueError, IndexError):
+            return 404, "application/json", {"error": "unknown section"}
+        window = entries[offset : offset + limit]
+        colors = entry_colors(config.color, title, index.offsets[number], offset, len(window))
+        return 200, "application/json", {
+            "section": number,
+            "title": title,
+            **_page(offset, limit, len(entries)),
+            "entries": [
+                {"path": entry, "url": build_file_url(config.repo_url, config.link_reference, entry), "color": color}
+                for entry, color in zip(window, colors)
+            ],
+        }
+    if path == "/api/files":
+        prefix = (query.get("prefix") or [""])[-1].lstrip("/")
+        low, high = index.prefix_range(prefix)
+        window = index.paths[low + offset : min(high, low + offset + limit)]
+        return 200, "application/json", {
+            "prefix": prefix,
+            **_page(offset, limit, high - low),
+            "entries": [{"path": entry, "url": build_file_url(config.repo_url, config.link_reference, entry)} for entry in window],
+        }
+    return 404, "application/json", {"error": "not found"}
+
+
+def etag_matches(header: Optional[str], etag: str) -> bool:
+    if not header:
+        return False
+    candidates = [candidate.strip() for candidate in header.split(",")]
+    return "*" in candidates or any(candidate.removeprefix("W/") == etag for candidate in candidates)
+
+
+def handle_index_request(
+    source: IndexSource, target: str, headers: Mapping[str, str], page_size: int = DEFAULT_SERVE_PAGE_SIZE
+) -> Tuple[int, Dict[str, str], bytes]:
+    index = source.index
+    try:
+        status, content_type, payload = index_response(index, source.config, target, page_size)
+    except ValueError as exc:
+        status, content_type, payload = 400, "application/json", {"error": str(exc)}
+    body = (payload if isinstance(payload, str) else json.dumps(payload, separators=(",", ":"))).encode("utf-8")
+    response_headers = {"Content-Type": content_type, "Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+    if status != 200:
+        return status, response_headers, body
+    accepts_gzip = "gzip" in (headers.get("Accept-Encoding") or "")
+    compress = accepts_gzip and len(body) >= SERVE_GZIP_MIN_BYTES
+    # Encodings of the same snapshot get distinct tags.
+    etag = hashlib.sha256(f"{index.etag}\0{target}\0{page_size}".encode("utf-8", "surrogateescape")).hexdigest()[:32]
+    etag = f'"{etag}{"-gzip" if compress else ""}"'
+    response_headers["ETag"] = etag
+    if etag_matches(headers.get("If-None-Match"), etag):
+        return 304, {key: value for key, value in response_headers.items() if key != "Content-Type"}, b""
+    if compress:
+        body = b"".join(iter_compressed_blocks([body], "gzip"))
+        response_headers["Content-Encoding"] = "gzip"
+    return status, response_headers, body
+
+
+def make_index_server(source: IndexSource, host: str, port: int, page_size: int = DEFAULT_SERVE_PAGE_SIZE):  # noqa: ANN201
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class IndexRequestHandler(BaseHTTPRequestHandler):
+        server_version = "generate-file-list"
+        # Content-Length lets paginating clients reuse the connection.
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self) -> None:  # noqa: N802
+            self._respond(send_body=True)
+
+        def do_HEAD(self) -> None:  # noqa: N802
+            self._respond(send_body=False)
+
+        def _respond(self, send_body: bool) -> None:
+            status, headers, body = handle_index_request(source, self.path, self.headers, page_size)
+            self.send_response(status)
+            for key, value in headers.items():
+                self.send_header(key, value)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            if send_body and body:
+                self.wfile.write(body)
+
+        def log_message(self, format: str, *args: object) -> None:  # noqa: A002
+            logging.debug("%s - %s", self.address_string(), format % args)
+
+    server = ThreadingHTTPServer((host, port), IndexRequestHandler)
+    server.daemon_threads = True
+    return server
+
+
+def serve_index(config: GeneratorConfig, host: str, port: int, refresh_interval: float, page_size: int) -> int:
+    source = IndexSource(config)
+    server = make_index_server(source, host, port, page_size)
+    stop = threading.Event()
+    if refresh_interval > 0:
+        threading.Thread(target=source.refresh_every, args=(refresh_interval, stop), daemon=True).start()
+    bound_host, bound_port = server.server_address[:2]
+    logging.info("Serving %d files from %s at http://%s:%d/", len(source.index.paths), config.directory, bound_host, bound_port)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop.set()
+        server.server_close()
+    return 0
+
+
+def load_batch_targets(path: Path) -> List[Dict[str, object]]:
+    try:
+        data = json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError) as exc:
+        raise ValueError(f"Cannot read batch config '{path}': {exc}") from exc
+    targets = data.get("targets") if isinstance(data, dict) else data
+    if not isinstance(targets, list) or not targets:
+        raise ValueError(f"Batch config '{path}' must contain a non-empty list of targets.")
+    for index, target in enumerate(targets, start=1):
+        if not isinstance(target, dict):
+            raise ValueError(f"Batch target {index} must be an object of option names to values.")
+    return targets
+
+
+def batch_target_argv(target: Dict[str, object], root: Path) -> List[str]:
+    argv: List[str] = []
+    for key, value in target.items():
+        option = key.replace("_", "-").lstrip("-")
+        if option in BATCH_SHARED_OPTIONS:
+            raise ValueError(f"'{option}' applies to the whole batch and cannot be set per target.")
+        if value is None:
+            continue
+        flag = f"--{option}"
+        if option in ("directory", "output-file") and isinstance(value, str) and value.strip() != "-":
+            # Relative to the batch root.
+            candidate = Path(value)
+            argv.extend([flag, str(candidate if candidate.is_absolute() else root / candidate)])
+        elif isinstance(value, bool):
+            if option in BATCH_FLAG_OPTIONS:
+                if value:
+                    argv.append(flag)
+            else:
+                argv.append(f"{flag}={str(value).lower()}")
+        elif isinstance(value, dict):
+            argv.append(flag)
+            for pair in value.items():
+                argv.extend(str(item) for item in pair)
+        elif isinstance(value, list):
+            values: List[str] = []
+            for item in value:
+                if isinstance(item, list):
+                    values.extend(str(part) for part in item)
+                else:
+                    values.append(str(item))
+            if values:
+                argv.append(flag)
+                argv.extend(values)
+        else:
+            argv.append(f"{flag}={value}")
+    return argv
+
+
+def subtree_paths(files: Sequence[str], relative: str) -> Sequence[str]:
+    if relative in ("", "."):
+        return files if isinstance(files, PathTable) else list(files)
+    if isinstance(files, PathTable):
+        return files.subtree(relative)
+    prefix = relative.rstrip("/") + "/"
+    lowered = prefix.lower()
+    start = bisect.bisect_left(files, lowered, key=str.lower)
+    stop = bisect.bisect_left(files, lowered[:-1] + "0", key=str.lower)
+    return [path[len(prefix) :] for path in files[start:stop] if path.startswith(prefix)]
+
+
+def build_batch_configs(
+    parser: argparse.ArgumentParser, argv: Sequence[str], base: GeneratorConfig, targets: Sequence[Dict[str, object]]
+) -> List[GeneratorConfig]:
+    shared = ["--link-ref", base.link_reference]
+    if base.repo_url:
+        shared.extend(["--repo-url", base.repo_url])
+    configs: List[GeneratorConfig] = []
+    destinations: Set[Optional[Path]] = set()
+    for index, target in enumerate(targets, start=1):
+        target_argv = list(argv) + shared + batch_target_argv(target, base.directory)
+        try:
+            args = parser.parse_args(target_argv)
+        except SystemExit as exc:
+            raise ValueError(f"Batch target {index} has invalid options.") from exc
+        with run_metrics.phase("config"):
+            config = build_config(args)
+        try:
+            config.directory.relative_to(base.directory)
+        except ValueError as exc:
+            raise ValueError(f"Batch target {index} directory '{config.directory}' is outside '{base.directory}'.") from exc
+        if config.output_file in destinations:
+            raise ValueError(f"Batch target {index} writes to {config.output_file or 'stdout'}, which another target already uses.")
+        destinations.add(config.output_file)
+        configs.append(config)
+    return configs
+
+
+def shared_ignore_list(base: GeneratorConfig, configs: Sequence[GeneratorConfig]) -> List[str]:
+    # Targets filter the patterns they do not share themselves.
+    return [pattern for pattern in base.ignore_list if all(pattern in config.ignore_list for config in configs)]
+
+
+def target_paths(files: Sequence[str], base: GeneratorConfig, config: GeneratorConfig) -> Sequence[str]:
+    subset = subtree_paths(files, config.directory.relative_to(base.directory).as_posix())
+    if config.ignore_list != base.ignore_list:
+        matcher = compile_ignore_matcher(tuple(config.ignore_list))
+        subset = PathTable(path for path in subset if not matcher.ignores(path))
+    return subset
+
+
+def run_batch(parser: argparse.ArgumentParser, argv: Sequence[str], base: GeneratorConfig, batch_file: Path) -> int:
+    configs = build_batch_configs(parser, argv, base, load_batch_targets(batch_file))
+    base = replace(base, ignore_list=shared_ignore_list(base, configs))
+    with run_metrics.phase("discovery"):
+        files = discover_paths(base)
+    run_metrics.add("files", len(files))
+    run_metrics.add("batch_targets", len(configs))
+    logging.info("Discovered %d files for %d batch targets", len(files), len(configs))
+    workers = max(1, min(len(configs), default_discovery_workers()))
+    failures = 0
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(emit_output, config, target_paths(files, base, config)): config for config in configs
+        }
+        for future, config in futures.items():
+            destination = "stdout" if config.output_file is None else config.output_file
+            try:
+                future.result()
+            except (OSError, ValueError, subprocess.CalledProcessError) as exc:
+                failures += 1
+                logging.error("Batch target %s failed: %s", destination, exc)
+            else:
+                logging.info("Wrote file list to %s", destination)
+    return 1 if failures else 0
+
+
+def split_multi_value(values: Optional[Sequence[str]]) -> List[str]:
+    return [value for entry in values or [] for value in str(entry).split() if value]
 
 
 def main(argv: Optional[Sequence[str]] = None) -> int:
-    parser = build_parser()
-    args = parser.parse_args(argv)
+    arguments = list(sys.argv[1:] if argv is None else argv)
+    if arguments[:1] == ["serve"]:
+        parser = build_serve_parser()
+        arguments = arguments[1:]
+    else:
+        parser = build_parser()
+    args = parser.parse_args(arguments)
+    metrics_file = resolve_optional_path(args.metrics_file, Path(args.directory).resolve())
+    profile_phases = split_multi_value(args.profile_phases)
+    trace_phases = split_multi_value(args.trace_memory_phases)
+    unknown_phases = sorted(set(profile_phases + trace_phases) - set(METRIC_PHASES))
+    if unknown_phases:
+        parser.error(f"Unknown phase(s) {', '.join(unknown_phases)}; choose from {', '.join(METRIC_PHASES)}.")
+    if (profile_phases or trace_phases) and metrics_file is None:
+        parser.error("--profile-phases and --trace-memory-phases need --metrics-file.")
+    # Reset in place: helpers record into the module-level instance.
+    metrics = run_metrics
+    metrics.reset(profile_phases, trace_phases, metrics_file)
+    try:
+        return run(parser, args, arguments, metrics)
+    finally:
+        if metrics_file is not None:
+            save_metrics(metrics_file, metrics)
+
+
+def run(parser: argparse.ArgumentParser, args: argparse.Namespace, argv: Sequence[str], metrics: RunMetrics) -> int:
     try:
-        config = build_config(args)
+        with metrics.phase("config"):
+            config = build_config(args)
     except (ValueError, FileNotFoundError) as exc:
         parser.error(str(exc))
         return 1
     numeric_level = getattr(logging, config.log_level.upper(), logging.INFO)
     logging.basicConfig(level=numeric_level, format="%(asctime)s - %(levelname)s - %(message)s")
     logging.getLogger("tqdm").setLevel(logging.ERROR)
+    if args.max_attempts is not None:
+        logging.warning("--max-attempts is deprecated and has no effect; it will be removed in a future release.")
     logging.info("Scanning directory: %s", config.directory)
     logging.debug("Using repository URL: %s", config.repo_url)
     logging.debug("Link reference: %s", config.link_reference)
-    files = collect_files(config)
-    logging.info("Discovered %d files", len(files))
-    if config.output_format == "html":
-        content = render_html(files, config)
-    else:
-        content = render_markdown(files, config)
-    write_output(config, content)
+    batch_file_arg = (args.batch_config or "").strip()
+    if batch_file_arg and config.watch:
+        parser.error("--watch cannot be combined with --batch-config.")
+        return 1
+    if batch_file_arg and config.cache_file is not None:
+        parser.error("--cache-file cannot be combined with --batch-config; every target is rendered from a fresh scan.")
+        return 1
+    if config.since is not None and (batch_file_arg or args.command == "serve"):
+        parser.error("--since updates a single cached listing and cannot be combined with --batch-config or serve.")
+        return 1
+    if args.command == "serve":
+        if batch_file_arg or config.watch:
+            parser.error("serve cannot be combined with --batch-config or --watch; use --refresh-interval instead.")
+            return 1
+        try:
+            return serve_index(config, args.host, args.port, args.refresh_interval, max(1, min(args.page_size, SERVE_MAX_PAGE_SIZE)))
+        except OSError as exc:
+            parser.error(f"Cannot serve on {args.host}:{args.port}: {exc}")
+            return 1
+    if batch_file_arg:
+        batch_file = Path(batch_file_arg)
+        if not batch_file.is_absolute():
+            batch_file = config.directory / batch_file
+        try:
+            return run_batch(parser, argv, config, batch_file)
+        except (ValueError, FileNotFoundError) as exc:
+            parser.error(str(exc))
+            return 1
+    if config.watch:
+        if config.cache_file is not None:
+            logging.info("--cache-file is not used in watch mode; sections are cached in memory instead.")
+        try:
+            return watch_output(config)
+        except OSError as exc:
+            parser.error(f"Cannot watch {config.directory}: {exc}")
+            return 1
+    if config.cache_file is None:
+        with metrics.phase("discovery"):
+            files = discover_paths(config)
+        metrics.add("files", len(files))
+        logging.info("Discovered %d files", len(files))
+        emit_output(config, files)
+    elif not generate_with_manifest(config, config.cache_file):
+        logging.info("Tree and configuration unchanged since last run; %s is up to date.", config.output_file)
+        return 0
     logging.info(
         "Wrote file list to %s",
         "stdout" if config.output_file is None else config.output_file,
@@ -1,4 +1,11 @@
 import argparse
+import contextlib
+import gzip
+import io
+import json
+import logging
+import os
+import shutil
 import subprocess
 import sys
 from pathlib import Path
@@ -20,7 +27,6 @@ def make_config(directory: Path, **overrides) -> gfl.GeneratorConfig:
         source="list",
         colors=["#112233", "#445566"],
         color_range=("#000000", "#FFFFFF"),
-        max_attempts=10,
         exclude_dark=False,
         exclude_bright=False,
         exclude_blacks=False,
@@ -72,6 +78,21 @@ class FakeCompletedProcess:
         self.stdout = stdout
 
 
+class FakePopen:
+    def __init__(self, stdout: bytes = b"", returncode: int = 0) -> None:
+        self.stdout = io.BytesIO(stdout)
+        self.returncode = returncode
+
+    def __enter__(self) -> "FakePopen":
+        return self
+
+    def __exit__(self, *exc_info) -> None:  # noqa: ANN002
+        return None
+
+    def wait(self) -> int:
+        return self.returncode
+
+
 def test_str_to_bool_variants() -> None:
     assert gfl.str_to_bool(True) is True
     assert gfl.str_to_bool("True") is True
@@ -166,11 +187,14 @@ def test_collect_files_prefers_git_when_available(tmp_path: Path, monkeypatch: p
     def fake_run(cmd, **kwargs):  # noqa: ANN001
         if cmd[:3] == ["git", "rev-parse", "--show-toplevel"]:
             return FakeCompletedProcess(stdout=str(repo_dir))
-        if cmd[:2] == ["git", "ls-files"]:
-            return FakeCompletedProcess(stdout="keep.txt\nignored/file.txt\n")
         raise subprocess.CalledProcessError(1, cmd)
 
+    def fake_popen(cmd, **kwargs):  # noqa: ANN001
+        assert cmd[:3] == ["git", "ls-files", "-z"]
+        return FakePopen(stdout=b"keep.txt\0ignored/file.txt\0")
+
     monkeypatch.setattr(gfl.subprocess, "run", fake_run)
+    monkeypatch.setattr(gfl.subprocess, "Popen", fake_popen)
 
     files = gfl.collect_files(config)
     assert files == [Path("keep.txt")]
@@ -197,3 +221,1015 @@ def test_collect_files_falls_back_to_os(tmp_path: Path, monkeypatch: pytest.Monk
 
     files = gfl.collect_files(config)
     assert set(files) == {Path("kept/keep.txt"), Path("root.txt")}
+
+
+def test_section_cache_reuses_unchanged_sections(tmp_path: Path) -> None:
+    config = make_config(tmp_path)
+    files = [Path("main.py"), Path("docs/data.csv")]
+    first = gfl.SectionCache()
+    output = gfl.render_markdown(files, config, first)
+    assert first.misses == 2 and first.hits == 0
+
+    second = gfl.SectionCache(first.fragments)
+    changed = gfl.render_markdown(files + [Path("docs/more.csv")], config, second)
+    assert second.hits == 1 and second.misses == 1
+    assert "docs/more.csv" in changed
+    assert output.split("### docs")[0] == changed.split("### docs")[0]
+
+
+def test_live_sections_match_a_full_regroup(tmp_path: Path) -> None:
+    config = make_config(tmp_path)
+    files = ["README", "main.py", "docs/data.csv", "docs/guide.md", "pkg/a.txt", "pkg/sub/b.txt", "Pkg/c.txt"]
+    live = gfl.LiveSections(sorted(files, key=str.lower), config.categories, config.repo_root_header)
+    cache = gfl.SectionCache()
+    gfl.render_markdown(live, config, cache)
+
+    assert live.add("pkg/sub/a.py") and not live.add("main.py")
+    assert live.discard("README") and not live.discard("README")
+    assert live.discard_tree("pkg")
+    live.add("docs/zz.csv")
+    expected = sorted(["main.py", "docs/data.csv", "docs/guide.md", "Pkg/c.txt", "docs/zz.csv"], key=str.lower)
+    assert list(live) == expected
+    cache = gfl.SectionCache(cache.fragments)
+    assert gfl.render_markdown(live, config, cache) == gfl.render_markdown(expected, config)
+    # Only the docs folder changed; Python, Markdown and Pkg were reused.
+    assert cache.misses == 1 and cache.hits == 3
+    config.output_format = "html"
+    assert gfl.render_html(live, config) == gfl.render_html(expected, config)
+
+
+@pytest.mark.parametrize("backend", ["poll", "inotify"])
+def test_watcher_changes_update_the_live_sections(tmp_path: Path, backend: str) -> None:
+    libc = gfl.load_inotify()
+    if backend == "inotify" and libc is None:
+        pytest.skip("inotify is not available")
+    root = tmp_path / "repo"
+    (root / "src").mkdir(parents=True)
+    (root / "src" / "old.py").write_text("", encoding="utf-8")
+    (root / "keep.md").write_text("", encoding="utf-8")
+    config = make_config(root)
+    matcher = gfl.compile_ignore_matcher(tuple(config.ignore_list))
+    live = gfl.LiveSections(gfl.discover_paths(config), config.categories, config.repo_root_header)
+    if backend == "poll":
+        watcher = gfl.PollingWatcher(root, matcher, interval=0.02)
+    else:
+        watcher = gfl.InotifyWatcher(root, matcher, libc)
+    try:
+        (root / "new" / "deep").mkdir(parents=True)
+        (root / "new" / "deep" / "file.py").write_text("", encoding="utf-8")
+        (root / "node_modules").mkdir()
+        (root / "node_modules" / "dep.js").write_text("", encoding="utf-8")
+        (root / "src" / "old.py").unlink()
+        changed = gfl.wait_for_changes(watcher, 0.1)
+    finally:
+        watcher.close()
+    assert changed is not None and "new" in changed
+    assert gfl.apply_watch_changes(config, live, matcher, changed)
+    assert list(live) == ["keep.md", "new/deep/file.py"]
+
+
+@pytest.mark.parametrize("backend", ["poll", "inotify"])
+def test_watcher_reports_rewritten_files_when_metadata_is_on(tmp_path: Path, backend: str) -> None:
+    libc = gfl.load_inotify()
+    if backend == "inotify" and libc is None:
+        pytest.skip("inotify is not available")
+    root = tmp_path / "repo"
+    root.mkdir()
+    target = root / "main.py"
+    target.write_text("", encoding="utf-8")
+    config = make_config(root, file_metadata=True, watch_backend=backend)
+    matcher = gfl.compile_ignore_matcher(tuple(config.ignore_list))
+    live = gfl.LiveSections(gfl.discover_paths(config), config.categories, config.repo_root_header)
+    if backend == "poll":
+        watcher = gfl.PollingWatcher(root, matcher, interval=0.02, track_files=True)
+    else:
+        watcher = gfl.open_watcher(config, matcher)
+    try:
+        target.write_text("print()", encoding="utf-8")
+        stamp = target.stat().st_mtime_ns + 1_000_000_000
+        os.utime(target, ns=(stamp, stamp))
+        changed = gfl.wait_for_changes(watcher, 0.1)
+    finally:
+        watcher.close()
+    assert changed == {"main.py"}
+    assert gfl.apply_watch_changes(config, live, matcher, changed)
+    assert list(live) == ["main.py"]
+
+
+def test_main_skips_work_when_manifest_is_current(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch, caplog: pytest.LogCaptureFixture
+) -> None:
+    repo_dir = tmp_path / "repo"
+    repo_dir.mkdir()
+    (repo_dir / "main.py").write_text("print()", encoding="utf-8")
+    monkeypatch.setenv("GITHUB_REPOSITORY", "demo/repo")
+    argv = [
+        "--directory",
+        str(repo_dir),
+        "--output-format",
+        "markdown",
+        "--output-file",
+        "out.md",
+        "--cache-file",
+        "cache/manifest.json",
+    ]
+    assert gfl.main(argv) == 0
+    first_output = (repo_dir / "out.md").read_text(encoding="utf-8")
+    assert (repo_dir / "cache" / "manifest.json").exists()
+
+    def fail_discover(config):  # noqa: ANN001
+        raise AssertionError("discovery should be skipped")
+
+    monkeypatch.setattr(gfl, "discover_paths", fail_discover)
+    assert gfl.main(argv) == 0
+    assert (repo_dir / "out.md").read_text(encoding="utf-8") == first_output
+    # --max-attempts is deprecated: it warns but keeps the cache valid.
+    with caplog.at_level(logging.WARNING):
+        assert gfl.main(argv + ["--max-attempts", "5"]) == 0
+    assert "--max-attempts is deprecated" in caplog.text
+
+    (repo_dir / "out.md").write_text("stale", encoding="utf-8")
+    assert gfl.main(argv) == 0
+    assert (repo_dir / "out.md").read_text(encoding="utf-8") == first_output
+
+    monkeypatch.undo()
+    monkeypatch.setenv("GITHUB_REPOSITORY", "demo/repo")
+    (repo_dir / "extra.py").write_text("", encoding="utf-8")
+    assert gfl.main(argv) == 0
+    assert "extra.py" in (repo_dir / "out.md").read_text(encoding="utf-8")
+
+
+def test_scandir_engine_matches_os_walk(tmp_path: Path) -> None:
+    for relative in ["a.txt", "B.md", "src/main.py", "src/node_modules/dep.js", "src/deep/er/x.css", "node_modules/y.js"]:
+        target = tmp_path / relative
+        target.parent.mkdir(parents=True, exist_ok=True)
+        target.write_text("", encoding="utf-8")
+    (tmp_path / "linked").symlink_to(tmp_path / "src", target_is_directory=True)
+    ignore = ["node_modules"]
+    expected = gfl.collect_via_os(tmp_path, ignore)
+    assert expected == [Path("a.txt"), Path("B.md"), Path("src/deep/er/x.css"), Path("src/main.py")]
+    for workers in (1, 3):
+        assert gfl.collect_via_scandir(tmp_path, ignore, workers) == expected
+
+
+def test_path_table_behaves_like_a_sorted_path_list(tmp_path: Path) -> None:
+    paths = ["src/b.py", "README.md", "src/A.md", "docs/guide.md", "src/lib/c.py", "a.py"]
+    table = gfl.PathTable(paths)
+    assert len(table) == len(paths)
+    assert table == sorted(paths, key=str.lower)
+    assert table[-1] == "src/lib/c.py" and table[1:3] == ["docs/guide.md", "README.md"]
+    restored = gfl.PathTable.from_json(json.loads(json.dumps(table.to_json())))
+    assert restored == table
+    assert gfl.PathTable.from_json({"directories": [""], "parents": [3], "names": ["x"]}) is None
+    assert list(table.subtree("src")) == ["A.md", "b.py", "lib/c.py"]
+    config = make_config(tmp_path)
+    assert list(gfl.iter_sections(table, config.categories, "Root")) == list(
+        gfl.iter_sections(paths, config.categories, "Root")
+    )
+
+
+def test_ignore_matcher_supports_gitignore_style_globs() -> None:
+    matcher = gfl.IgnoreMatcher(["node_modules", "*.min.js", "build/**", "docs/*.md", "logs/", "/top.txt", "**/gen/*.py"])
+    assert matcher.ignores("src/node_modules/pkg/index.js")
+    assert matcher.ignores("static/app.min.js")
+    assert not matcher.ignores("static/app.js")
+    assert matcher.ignores("build/out/bundle.js")
+    assert matcher.ignores_dir("build")
+    assert not matcher.ignores("src/build.py")
+    assert matcher.ignores("docs/index.md")
+    assert not matcher.ignores("docs/nested/index.md")
+    assert matcher.ignores("app/logs/today.txt")
+    assert not matcher.ignores("app/logs")
+    assert matcher.ignores("top.txt")
+    assert not matcher.ignores("nested/top.txt")
+    assert matcher.ignores("a/b/gen/x.py")
+    assert gfl.should_ignore(Path("./a/node_modules/x"), ["node_modules"])
+    assert not gfl.should_ignore(Path("a/b"), ["node_modules"])
+
+
+def test_collectors_apply_glob_ignores(tmp_path: Path) -> None:
+    for relative in ["keep.js", "drop.min.js", "build/a.txt", "src/build/b.txt"]:
+        target = tmp_path / relative
+        target.parent.mkdir(parents=True, exist_ok=True)
+        target.write_text("", encoding="utf-8")
+    ignore = ["*.min.js", "build/**"]
+    expected = [Path("keep.js"), Path("src/build/b.txt")]
+    assert gfl.collect_via_os(tmp_path, ignore) == expected
+    assert gfl.collect_via_scandir(tmp_path, ignore, 2) == expected
+
+
+def test_streaming_markdown_matches_buffered_render(tmp_path: Path) -> None:
+    config = make_config(tmp_path)
+    files = ["main.py", "docs/data.csv", "notes.txt", "README.md"]
+    assert "".join(gfl.iter_render_markdown(files, config)) == gfl.render_markdown(files, config)
+    config.header_text = ""
+    config.intro_text = ""
+    assert "".join(gfl.iter_render_markdown([], config)) == gfl.render_markdown([], config)
+
+
+def test_streaming_html_registers_each_chunk(tmp_path: Path) -> None:
+    config = make_config(tmp_path, output_format="html")
+    config.lazy.chunk_size = 2
+    pieces = list(gfl.iter_render_html([f"file_{idx}.txt" for idx in range(5)], config))
+    output = "".join(pieces)
+    assert output.count('class="lazyload-placeholder"') == 3
+    assert output.count("fileListChunks[") == 3
+    assert "window.fileListChunks || {}" in output
+    assert "file_4.txt" in output
+    assert "".join(gfl.iter_render_html([], config)).endswith("<p>No files found.</p>\n")
+
+
+def test_virtual_layout_embeds_compact_rows(tmp_path: Path) -> None:
+    config = make_config(tmp_path, output_format="html", html_layout="virtual")
+    files = ["main.py", "docs/data.csv", "notes.txt"]
+    output = gfl.render_html(files, config)
+    assert "".join(gfl.iter_render_html(files, config)) == output
+    assert 'id="file-list-virtual"' in output
+    assert "lazyload-placeholder" not in output
+    assert 'const urlBase = "https://example.com/repo/blob/main/";' in output
+    rows = json.loads(output.split("window.fileListRows = ", 1)[1].split(";</script>", 1)[0])
+    headings = [row[0] for row in rows if len(row) == 3]
+    assert headings == ["Root", "Python", "docs"]
+    assert [row[0] for row in rows if len(row) == 2] == ["notes.txt", "main.py", "docs/data.csv"]
+    # Colours follow the same cycle as the lazily loaded list.
+    assert [row[1] for row in rows] == ["#112233", "#445566"] * 3
+    assert "<p>No files found.</p>" in gfl.render_html([], config)
+
+    args = gfl.build_parser().parse_args(
+        ["--directory", str(tmp_path), "--html-layout", "virtual", "--html-chunk-mode", "external"]
+    )
+    with pytest.raises(ValueError):
+        gfl.build_config(args)
+
+
+def test_main_stream_writes_output(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    repo_dir = tmp_path / "repo"
+    repo_dir.mkdir()
+    (repo_dir / "main.py").write_text("", encoding="utf-8")
+    monkeypatch.setenv("GITHUB_REPOSITORY", "demo/repo")
+    argv = ["--directory", str(repo_dir), "--output-format", "markdown", "--output-file", str(tmp_path / "out.md")]
+    assert gfl.main(argv) == 0
+    buffered = (tmp_path / "out.md").read_text(encoding="utf-8")
+    assert gfl.main(argv + ["--stream"]) == 0
+    assert (tmp_path / "out.md").read_text(encoding="utf-8") == buffered
+
+
+def test_main_external_chunks_are_written_beside_page(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    repo_dir = tmp_path / "repo"
+    repo_dir.mkdir()
+    for idx in range(5):
+        (repo_dir / f"file_{idx}.txt").write_text("", encoding="utf-8")
+    monkeypatch.setenv("GITHUB_REPOSITORY", "demo/repo")
+    page = tmp_path / "site" / "index.html"
+    chunks = tmp_path / "site" / "index_chunks"
+    argv = [
+        "--directory",
+        str(repo_dir),
+        "--output-file",
+        str(page),
+        "--chunk-size",
+        "2",
+        "--html-chunk-mode",
+        "external",
+        "--cache-file",
+        str(tmp_path / "manifest.json"),
+    ]
+    assert gfl.main(argv) == 0
+    content = page.read_text(encoding="utf-8")
+    assert 'const chunkBase = "index_chunks/";' in content
+    assert "file_0.txt" not in content
+    assert sorted(path.name for path in chunks.iterdir()) == [f"file-list-{idx}.html" for idx in (1, 2, 3)]
+    assert "file_4.txt" in (chunks / "file-list-3.html").read_text(encoding="utf-8")
+
+    (chunks / "file-list-2.html").unlink()
+    assert gfl.main(argv) == 0
+    assert (chunks / "file-list-2.html").exists()
+
+    for idx in range(3, 5):
+        (repo_dir / f"file_{idx}.txt").unlink()
+    assert gfl.main(argv + ["--stream"]) == 0
+    assert sorted(path.name for path in chunks.iterdir()) == ["file-list-1.html", "file-list-2.html"]
+    with pytest.raises(SystemExit):
+        gfl.main(argv + ["--output-file", "-"])
+
+
+def test_search_index_maps_paths_to_their_chunks(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    repo_dir = tmp_path / "repo"
+    for name in ["main.py", "setup.py", "docs/guide.md", "docs/api/index.md", "notes.txt"]:
+        (repo_dir / name).parent.mkdir(parents=True, exist_ok=True)
+        (repo_dir / name).write_text("", encoding="utf-8")
+    monkeypatch.setenv("GITHUB_REPOSITORY", "demo/repo")
+    page = tmp_path / "site" / "index.html"
+    sidecar = tmp_path / "site" / "index_search.json"
+    argv = [
+        "--directory",
+        str(repo_dir),
+        "--output-file",
+        str(page),
+        "--chunk-size",
+        "2",
+        "--html-chunk-mode",
+        "external",
+        "--search-index",
+        "--cache-file",
+        str(tmp_path / "manifest.json"),
+    ]
+    assert gfl.main(argv) == 0
+    content = page.read_text(encoding="utf-8")
+    assert content.count('id="file-list-search"') == 1
+    assert 'const searchUrl = "index_search.json";' in content
+
+    index = json.loads(sidecar.read_text(encoding="utf-8"))
+    assert index["version"] == gfl.SEARCH_INDEX_VERSION
+    paths, previous = [], ""
+    for shared, suffix in zip(index["shared"], index["suffix"]):
+        previous = previous[:shared] + suffix
+        paths.append(previous)
+    chunk_of = [chunk for chunk, count in enumerate(index["chunks"]) for _ in range(count)]
+    assert len(chunk_of) == len(paths)
+    assert set(paths) == {"main.py", "setup.py", "docs/guide.md", "docs/api/index.md", "notes.txt"}
+    chunks = tmp_path / "site" / "index_chunks"
+    for path, chunk in zip(paths, chunk_of):
+        assert f">{path}</a>" in (chunks / f"file-list-{chunk + 1}.html").read_text(encoding="utf-8")
+
+    manifest = json.loads((tmp_path / "manifest.json").read_text(encoding="utf-8"))
+    assert manifest["assets"][-1] == "index_search.json"
+    sidecar.unlink()
+    assert gfl.main(argv) == 0
+    assert sidecar.exists()
+    with pytest.raises(SystemExit):
+        gfl.main(argv + ["--output-file", "-", "--html-chunk-mode", "inline"])
+
+
+def test_write_output_leaves_identical_files_untouched(tmp_path: Path) -> None:
+    target = tmp_path / "out" / "list.md"
+    config = make_config(tmp_path, output_file=target)
+    gfl.write_output(config, "same\n")
+    assert target.stat().st_mode & 0o777 == gfl.default_file_mode()
+    os.utime(target, ns=(1_000_000_000, 1_000_000_000))
+    gfl.write_output(config, "same\n")
+    config.stream = True
+    assert gfl.write_output_stream(config, iter(["sa", "me\n"])) == gfl.content_digest("same\n")
+    assert target.stat().st_mtime_ns == 1_000_000_000
+    gfl.write_output_stream(config, iter(["changed\n"]))
+    assert target.read_text(encoding="utf-8") == "changed\n"
+    assert [path.name for path in target.parent.iterdir()] == ["list.md"]
+
+
+def test_write_output_emits_precompressed_siblings(tmp_path: Path) -> None:
+    target = tmp_path / "list.html"
+    methods = ["gzip", "brotli"] if gfl.load_brotli() is not None else ["gzip"]
+    config = make_config(tmp_path, output_file=target, compress=methods)
+    content = "<p>x</p>\n" * 1000
+    gfl.write_output(config, content)
+    packed = target.with_name("list.html.gz").read_bytes()
+    assert gzip.decompress(packed).decode("utf-8") == content
+    gfl.write_output_stream(config, iter([content]))
+    assert target.with_name("list.html.gz").read_bytes() == packed
+    if "brotli" in methods:
+        brotli = gfl.load_brotli()
+        assert brotli.decompress(target.with_name("list.html.br").read_bytes()).decode("utf-8") == content
+    gfl.write_output(config, "<p>y</p>\n")
+    assert gzip.decompress(target.with_name("list.html.gz").read_bytes()) == b"<p>y</p>\n"
+
+
+def test_subtree_paths_rebases_sorted_listing() -> None:
+    files = sorted(["docs/a.md", "Docs/B.md", "docs/sub/c.md", "docs.txt", "docsx/d.md", "e.py"], key=str.lower)
+    assert gfl.subtree_paths(files, "docs") == ["a.md", "sub/c.md"]
+    assert gfl.subtree_paths(files, "docs/sub/") == ["c.md"]
+    assert gfl.subtree_paths(files, ".") == files
+    assert gfl.subtree_paths(files, "missing") == []
+
+
+def test_main_batch_renders_targets_from_one_scan(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    repo_dir = tmp_path / "repo"
+    for relative in ["main.py", "docs/guide.md", "docs/api/ref.rst", "docs/notes.tmp"]:
+        target = repo_dir / relative
+        target.parent.mkdir(parents=True, exist_ok=True)
+        target.write_text("", encoding="utf-8")
+    monkeypatch.setenv("GITHUB_REPOSITORY", "demo/repo")
+    batch = {
+        "targets": [
+            {"output-format": "markdown", "output-file": "out/all.md"},
+            {
+                "output-format": "html",
+                "directory": "docs",
+                "output-file": "out/docs.html",
+                "file-categories": [[".rst", "ReStructured"]],
+                "ignore-list": ["*.tmp"],
+                "stream": True,
+            },
+        ]
+    }
+    (repo_dir / "batch.json").write_text(json.dumps(batch), encoding="utf-8")
+    scans = []
+    original = gfl.discover_paths
+
+    def counting_discover(config):  # noqa: ANN001
+        scans.append(config.directory)
+        return original(config)
+
+    monkeypatch.setattr(gfl, "discover_paths", counting_discover)
+    assert gfl.main(["--directory", str(repo_dir), "--ignore-list", "out", "--batch-config", "batch.json"]) == 0
+    assert scans == [repo_dir.resolve()]
+    everything = (repo_dir / "out" / "all.md").read_text(encoding="utf-8")
+    assert "[docs/api/ref.rst](https://github.com/demo/repo/blob/" in everything
+    docs = (repo_dir / "out" / "docs.html").read_text(encoding="utf-8")
+    assert "ReStructured" in docs and "api/ref.rst" in docs and "guide.md" in docs
+    assert "main.py" not in docs and "notes.tmp" not in docs
+
+    # A target that ignores less than the command line still sees those files.
+    narrower = [
+        {"output-format": "markdown", "output-file": "out/all.md"},
+        {"output-format": "markdown", "output-file": "out/tmp.md", "ignore-list": ["out"], "overwrite-ignore-list": True},
+    ]
+    (repo_dir / "batch.json").write_text(json.dumps(narrower), encoding="utf-8")
+    assert gfl.main(["--directory", str(repo_dir), "--ignore-list", "out", "*.tmp", "--batch-config", "batch.json"]) == 0
+    assert "notes.tmp" not in (repo_dir / "out" / "all.md").read_text(encoding="utf-8")
+    assert "docs/notes.tmp" in (repo_dir / "out" / "tmp.md").read_text(encoding="utf-8")
+    with pytest.raises(SystemExit):
+        gfl.main(["--directory", str(repo_dir), "--batch-config", "batch.json", "--cache-file", "manifest.json"])
+
+    (repo_dir / "batch.json").write_text(json.dumps([{"output-file": "a.md"}, {"output-file": "a.md"}]), encoding="utf-8")
+    with pytest.raises(SystemExit):
+        gfl.main(["--directory", str(repo_dir), "--batch-config", "batch.json"])
+    (repo_dir / "batch.json").write_text(json.dumps([{"respect-gitignore": True}]), encoding="utf-8")
+    with pytest.raises(SystemExit):
+        gfl.main(["--directory", str(repo_dir), "--batch-config", "batch.json"])
+
+
+@pytest.mark.parametrize("output_format", ["html", "markdown"])
+@pytest.mark.parametrize("source", ["list", "random"])
+def test_parallel_rendering_matches_serial(tmp_path: Path, monkeypatch: pytest.MonkeyPatch, output_format: str, source: str) -> None:
+    monkeypatch.setattr(gfl, "RENDER_SLICE_SIZE", 3)
+    config = make_config(tmp_path, output_format=output_format)
+    config.color.source = source
+    config.color.colors = ["#111111", "#222222", "#333333"]
+    config.color.seed = 11
+    files = [f"src/mod_{idx}.py" for idx in range(8)] + [f"docs/page_{idx}.txt" for idx in range(4)] + ["top.txt"]
+    serial = gfl.render_content(files, config)
+    serial_stream = "".join(gfl.iter_content(files, config))
+    config.jobs = 2
+    assert gfl.render_content(files, config) == serial
+    assert "".join(gfl.iter_content(files, config)) == serial_stream
+    warm = gfl.SectionCache()
+    gfl.render_content(files[:-1], config, warm)
+    rerun = gfl.SectionCache(warm.fragments)
+    assert gfl.render_content(files, config, rerun) == serial
+    if source == "random":
+        assert rerun.misses == 1
+
+
+def test_list_colours_continue_the_cycle_across_slices(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(gfl, "RENDER_SLICE_SIZE", 2)
+    config = make_config(tmp_path, output_format="html")
+    config.color.colors = ["#111111", "#222222", "#333333"]
+    lines = list(gfl.iter_html_body_lines([f"f{idx}.txt" for idx in range(7)], config))
+    expected = [config.color.colors[idx % 3] for idx in range(len(lines))]
+    assert [line.split("color: ")[1][:7] for line in lines] == expected
+
+
+def test_main_writes_metrics_file(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    repo_dir = tmp_path / "repo"
+    (repo_dir / "docs").mkdir(parents=True)
+    for relative in ["main.py", "docs/guide.md", "docs/data.csv"]:
+        (repo_dir / relative).write_text("", encoding="utf-8")
+    monkeypatch.setenv("GITHUB_REPOSITORY", "demo/repo")
+    monkeypatch.delenv("GITHUB_REF_NAME", raising=False)
+    monkeypatch.delenv("GITHUB_HEAD_REF", raising=False)
+    metrics_path = tmp_path / "metrics.json"
+    output = tmp_path / "out.html"
+    argv = [
+        "--directory",
+        str(repo_dir),
+        "--output-file",
+        str(output),
+        "--metrics-file",
+        str(metrics_path),
+        "--profile-phases",
+        "render",
+        "--trace-memory-phases",
+        "discovery",
+    ]
+    assert gfl.main(argv) == 0
+    metrics = json.loads(metrics_path.read_text(encoding="utf-8"))
+    assert {"config", "discovery", "render", "write"} <= set(metrics["phases"])
+    assert metrics["phases"]["discovery"]["tracemalloc_peak_bytes"] > 0
+    assert Path(metrics["phases"]["render"]["profile"]).exists()
+    assert metrics["counts"]["files"] == 3
+    assert metrics["counts"]["entries"] == 3
+    assert metrics["phases"]["sectioning"]["calls"] == 1
+    assert metrics["colors"]["generated"] == metrics["counts"]["sections"] + metrics["counts"]["entries"]
+    assert metrics["subprocesses"]["count"] >= 1
+    assert metrics["output"]["bytes"] == output.stat().st_size
+    assert metrics["output"]["files_written"] == 1
+    # A second call starts from clean metrics rather than adding to the first.
+    assert gfl.main(argv) == 0
+    metrics = json.loads(metrics_path.read_text(encoding="utf-8"))
+    assert metrics["counts"]["files"] == 3
+    assert metrics["phases"]["sectioning"]["calls"] == 1
+    with pytest.raises(SystemExit):
+        gfl.main(argv + ["--profile-phases", "bogus"])
+
+
+def test_served_index_paginates_sections_and_prefixes(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    repo_dir = tmp_path / "repo"
+    for relative in ["main.py", "app.py", "tool.py", "docs/a.txt", "docs/b.txt", "docs/sub/c.txt", "docsite/d.txt"]:
+        (repo_dir / relative).parent.mkdir(parents=True, exist_ok=True)
+        (repo_dir / relative).write_text("", encoding="utf-8")
+    monkeypatch.setattr(gfl, "RENDER_SLICE_SIZE", 2)
+    config = make_config(repo_dir, output_format="html")
+    source = gfl.IndexSource(config)
+
+    def get(target: str, **headers: str) -> tuple:
+        status, response_headers, body = gfl.handle_index_request(source, target, headers, page_size=2)
+        return status, response_headers, json.loads(body) if body and status != 304 else body
+
+    status, _, summary = get("/api/sections")
+    assert [(section["title"], section["count"]) for section in summary["sections"]] == [
+        ("Python", 3),
+        ("docs", 2),
+        ("docs/sub", 1),
+        ("docsite", 1),
+    ]
+    status, headers, page = get("/api/sections/0?offset=1")
+    assert status == 200 and page["next"] is None and page["total"] == 3
+    assert [entry["path"] for entry in page["entries"]] == ["main.py", "tool.py"]
+    # Colours match the static page, including across render slices.
+    static = gfl.render_section("html", "Python", ["app.py", "main.py", "tool.py"], 0, config)
+    assert [entry["color"] for entry in page["entries"]] == [line.split("color: ")[1][:7] for line in static[2:]]
+
+    status, _, files = get("/api/files?prefix=docs/&limit=1")
+    assert files["total"] == 3 and files["next"] == 1
+    assert [entry["path"] for entry in files["entries"]] == ["docs/a.txt"]
+    assert get("/api/files?prefix=docs")[2]["total"] == 4
+
+    assert get("/api/sections/0?offset=1", **{"If-None-Match": headers["ETag"]})[0] == 304
+    assert get("/api/sections/9")[0] == 404
+    assert get("/api/sections/0?limit=0")[0] == 400
+    status, headers, body = gfl.handle_index_request(source, "/", {"Accept-Encoding": "gzip"})
+    assert headers["Content-Encoding"] == "gzip" and b"api/sections" in gzip.decompress(body)
+
+    (repo_dir / "new.py").write_text("", encoding="utf-8")
+    assert source.refresh() and not source.refresh()
+    assert get("/api/sections/0?offset=1", **{"If-None-Match": headers["ETag"]})[0] == 200
+
+
+def test_index_refresh_survives_io_errors_only(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    import threading
+
+    (tmp_path / "main.py").write_text("", encoding="utf-8")
+    source = gfl.IndexSource(make_config(tmp_path))
+    stop = threading.Event()
+    errors = [OSError("disk gone"), subprocess.CalledProcessError(128, ["git"]), RuntimeError("bug")]
+
+    def failing_refresh() -> bool:
+        raise errors.pop(0)
+
+    monkeypatch.setattr(source, "refresh", failing_refresh)
+    with pytest.raises(RuntimeError):
+        source.refresh_every(0, stop)
+    assert not errors
+
+
+def test_serve_answers_over_http(tmp_path: Path) -> None:
+    import threading
+    import urllib.request
+
+    (tmp_path / "main.py").write_text("", encoding="utf-8")
+    source = gfl.IndexSource(make_config(tmp_path))
+    server = gfl.make_index_server(source, "127.0.0.1", 0)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        base = f"http://127.0.0.1:{server.server_address[1]}"
+        with urllib.request.urlopen(f"{base}/api/sections/0") as response:
+            assert json.loads(response.read())["entries"][0]["path"] == "main.py"
+        with urllib.request.urlopen(base) as response:
+            assert response.headers["Content-Type"].startswith("text/html")
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_category_matcher_keeps_first_match_semantics() -> None:
+    categories = [
+        gfl.Category(ext=".user.js", name="Userscripts"),
+        gfl.Category(ext=".js", name="JavaScript"),
+        gfl.Category(ext=".JS", name="Shadowed"),
+        gfl.Category(ext="file", name="Suffix"),
+    ]
+    matcher = gfl.CategoryMatcher(categories)
+    assert matcher.match("a/b.user.js").name == "Userscripts"
+    assert matcher.match("A/B.JS").name == "JavaScript"
+    assert matcher.match("Dockerfile").name == "Suffix"
+    assert matcher.match("readme.md") is None
+    reordered = gfl.CategoryMatcher([categories[1], categories[0]])
+    assert reordered.match("x.user.js").name == "JavaScript"
+    assert gfl.CategoryMatcher([gfl.Category(ext="", name="All")]).match("x").name == "All"
+
+
+def _git(cwd: Path, *args: str) -> None:
+    subprocess.run(
+        ["git", "-c", "user.name=Test", "-c", "user.email=test@example.com", *args],
+        cwd=cwd,
+        check=True,
+        capture_output=True,
+    )
+
+
+@pytest.mark.skipif(shutil.which("git") is None, reason="git is not installed")
+@pytest.mark.parametrize("index_version", ["2", "3", "4"])
+def test_git_index_backend_matches_ls_files(tmp_path: Path, monkeypatch: pytest.MonkeyPatch, index_version: str) -> None:
+    repo_dir = tmp_path / "repo"
+    repo_dir.mkdir()
+    _git(repo_dir, "init", "-q")
+    for relative in ["README.md", "src/app.py", "src/pkg/deep/module.py", "src/pkg/deep/modules.py", "docs/a b.txt", "ignored.log"]:
+        target = repo_dir / relative
+        target.parent.mkdir(parents=True, exist_ok=True)
+        target.write_text("x", encoding="utf-8")
+    (repo_dir / ".gitignore").write_text("*.log\n", encoding="utf-8")
+    _git(repo_dir, "add", "README.md", "src", ".gitignore")
+    _git(repo_dir, "commit", "-qm", "init")
+    _git(repo_dir, "add", "-N", "docs/a b.txt")
+    (repo_dir / "src" / "untracked.py").write_text("", encoding="utf-8")
+    _git(repo_dir, "update-index", "--index-version", index_version)
+
+    for target in (repo_dir, repo_dir / "src"):
+        expected = gfl.git_paths(target, ["node_modules"])
+        assert expected
+        assert gfl.git_index_paths(target, ["node_modules"]) == expected
+    tracked_only = gfl.git_index_paths(repo_dir / "src", [], include_untracked=False)
+    assert tracked_only == ["app.py", "pkg/deep/module.py", "pkg/deep/modules.py"]
+
+    # An index chosen through the environment is only known to git.
+    other_index = tmp_path / "other-index"
+    monkeypatch.setenv("GIT_INDEX_FILE", str(other_index))
+    _git(repo_dir, "read-tree", "HEAD")
+    monkeypatch.setattr(gfl, "find_git_dir", lambda start: pytest.fail("the index file should not be read directly"))
+    expected = [".gitignore", "README.md", "src/app.py", "src/pkg/deep/module.py", "src/pkg/deep/modules.py"]
+    assert gfl.git_index_paths(repo_dir, [], include_untracked=False) == expected
+
+
+@pytest.mark.skipif(shutil.which("git") is None, reason="git is not installed")
+def test_file_metadata_comes_from_one_history_pass(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    repo_dir = tmp_path / "repo"
+    (repo_dir / "docs").mkdir(parents=True)
+    _git(repo_dir, "init", "-q")
+    (repo_dir / "a.py").write_text("x" * 2048, encoding="utf-8")
+    (repo_dir / "docs" / "b.md").write_text("b", encoding="utf-8")
+    monkeypatch.setenv("GIT_COMMITTER_DATE", "2024-01-02T00:00:00Z")
+    _git(repo_dir, "add", ".")
+    _git(repo_dir, "commit", "-qm", "init")
+    (repo_dir / "docs" / "b.md").write_text("bb", encoding="utf-8")
+    monkeypatch.setenv("GIT_COMMITTER_DATE", "2024-03-04T00:00:00Z")
+    _git(repo_dir, "commit", "-qam", "docs", "--author", "Other <other@example.com>")
+    (repo_dir / "c.md").write_text("new", encoding="utf-8")
+    config = make_config(repo_dir, respect_gitignore=True)
+    files = gfl.discover_paths(config)
+
+    scanned = []
+    original = gfl.scan_git_log
+
+    def counting_scan(root, revision, wanted, authors):  # noqa: ANN001, ANN202
+        scanned.append(revision)
+        return original(root, revision, wanted, authors)
+
+    monkeypatch.setattr(gfl, "scan_git_log", counting_scan)
+    metadata = gfl.collect_file_metadata(config, files)
+    assert len(scanned) == 1
+    assert metadata.label("a.py") == "2.0 KB · 2024-01-02 · Test"
+    assert metadata.label("docs/b.md") == "2 B · 2024-03-04 · Other"
+    assert metadata.lookup("c.md")[2] is None
+    content = gfl.render_markdown(files, config, metadata=metadata)
+    assert "[docs/b.md](https://example.com/repo/blob/main/docs/b.md) · 2 B · 2024-03-04 · Other" in content
+
+    cached = gfl.FileMetadata.from_json(json.loads(json.dumps(metadata.to_json())))
+    assert gfl.collect_file_metadata(config, files, cached).committed == metadata.committed
+    assert len(scanned) == 1
+    (repo_dir / "a.py").write_text("y", encoding="utf-8")
+    _git(repo_dir, "commit", "-qam", "edit")
+    updated = gfl.collect_file_metadata(config, files, cached)
+    assert scanned[1:] == [f"{metadata.head}..{updated.head}"]
+    assert updated.label("a.py") == "1 B · 2024-03-04 · Test"
+    assert updated.label("docs/b.md") == metadata.label("docs/b.md")
+
+
+@pytest.mark.skipif(shutil.which("git") is None, reason="git is not installed")
+def test_since_applies_the_commit_diff_to_the_cached_listing(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    repo_dir = tmp_path / "repo"
+    (repo_dir / "src").mkdir(parents=True)
+    for relative in ["README.md", "src/app.py", "src/old.py", "src/gone.py"]:
+        (repo_dir / relative).write_text(relative, encoding="utf-8")
+    _git(repo_dir, "init", "-q")
+    _git(repo_dir, "add", ".")
+    _git(repo_dir, "commit", "-qm", "init")
+    monkeypatch.setenv("GITHUB_REPOSITORY", "demo/repo")
+    output = tmp_path / "out.md"
+    argv = ["--directory", str(repo_dir), "--output-format", "markdown", "--output-file", str(output), "--respect-gitignore", "true"]
+    cached = argv + ["--cache-file", str(tmp_path / "manifest.json")]
+    (repo_dir / "notes.txt").write_text("untracked", encoding="utf-8")
+    assert gfl.main(cached + ["--since", "HEAD"]) == 0
+    since = subprocess.run(["git", "rev-parse", "HEAD"], cwd=repo_dir, check=True, capture_output=True, text=True).stdout.strip()
+    # Untracked files are not in the diff and have to be picked up anyway,
+    # even when HEAD has not moved.
+    (repo_dir / "notes.txt").unlink()
+    (repo_dir / "src" / "scratch.py").write_text("untracked", encoding="utf-8")
+    assert gfl.main(cached + ["--since", since]) == 0
+    assert "src/scratch.py" in output.read_text(encoding="utf-8")
+    assert "notes.txt" not in output.read_text(encoding="utf-8")
+    _git(repo_dir, "mv", "src/old.py", "src/new.py")
+    _git(repo_dir, "rm", "-q", "src/gone.py")
+    (repo_dir / "docs").mkdir()
+    (repo_dir / "docs" / "guide.md").write_text("guide", encoding="utf-8")
+    _git(repo_dir, "add", "docs")
+    _git(repo_dir, "commit", "-qm", "change")
+
+    def fail_discover(config):  # noqa: ANN001
+        raise AssertionError("the tree should not be listed again")
+
+    monkeypatch.setattr(gfl, "discover_paths", fail_discover)
+    assert gfl.main(cached + ["--since", since]) == 0
+    updated = output.read_text(encoding="utf-8")
+    monkeypatch.undo()
+    monkeypatch.setenv("GITHUB_REPOSITORY", "demo/repo")
+    assert gfl.main(argv) == 0
+    assert updated == output.read_text(encoding="utf-8")
+    assert "src/new.py" in updated and "src/old.py" not in updated and "src/gone.py" not in updated
+    assert "src/scratch.py" in updated
+    with pytest.raises(SystemExit):
+        gfl.main(argv + ["--since", since])
+
+
+@pytest.mark.skipif(shutil.which("git") is None, reason="git is not installed")
+def test_source_ref_lists_a_commit_without_a_working_tree(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    repo_dir = tmp_path / "repo"
+    (repo_dir / "src").mkdir(parents=True)
+    for relative in ["README.md", "src/app.py", "node_modules/dep.js"]:
+        (repo_dir / relative).parent.mkdir(parents=True, exist_ok=True)
+        (repo_dir / relative).write_text(relative, encoding="utf-8")
+    _git(repo_dir, "init", "-q")
+    _git(repo_dir, "add", ".")
+    _git(repo_dir, "commit", "-qm", "init")
+    _git(repo_dir, "tag", "v1")
+    (repo_dir / "src" / "later.py").write_text("", encoding="utf-8")
+    _git(repo_dir, "add", ".")
+    _git(repo_dir, "commit", "-qm", "later")
+    bare_dir = tmp_path / "bare.git"
+    _git(tmp_path, "clone", "-q", "--bare", str(repo_dir), str(bare_dir))
+    monkeypatch.setenv("GITHUB_REPOSITORY", "demo/repo")
+
+    args = gfl.build_parser().parse_args(["--directory", str(bare_dir), "--source-ref", "v1", "--output-file", "-"])
+    config = gfl.build_config(args)
+    tagged = subprocess.run(["git", "rev-parse", "v1^{commit}"], cwd=repo_dir, check=True, capture_output=True, text=True)
+    assert config.link_reference == config.source_ref == tagged.stdout.strip()
+    assert gfl.discover_paths(config) == ["README.md", "src/app.py"]
+    assert gfl.build_file_url(config.repo_url, config.link_reference, "src/app.py").endswith(f"/blob/{config.source_ref}/src/app.py")
+    assert gfl.git_ref_paths(repo_dir / "src", [], "HEAD") == ["app.py", "later.py"]
+    with pytest.raises(ValueError):
+        gfl.build_config(gfl.build_parser().parse_args(["--directory", str(bare_dir), "--source-ref", "missing"]))
+
+    # Moving the ref updates a cached listing from the diff between the two SHAs.
+    output = tmp_path / "out.md"
+    argv = ["--directory", str(bare_dir), "--output-format", "markdown", "--output-file", str(output)]
+    cached = argv + ["--cache-file", str(tmp_path / "manifest.json")]
+    assert gfl.main(cached + ["--source-ref", "v1", "--since", "v1"]) == 0
+
+    def fail_discover(config):  # noqa: ANN001
+        raise AssertionError("the tree should not be listed again")
+
+    monkeypatch.setattr(gfl, "discover_paths", fail_discover)
+    assert gfl.main(cached + ["--source-ref", "HEAD", "--since", config.source_ref]) == 0
+    updated = output.read_text(encoding="utf-8")
+    monkeypatch.undo()
+    monkeypatch.setenv("GITHUB_REPOSITORY", "demo/repo")
+    assert gfl.main(argv + ["--source-ref", "HEAD"]) == 0
+    assert updated == output.read_text(encoding="utf-8")
+    assert "src/later.py" in updated
+
+
+def test_record_formats_and_file_index_agree(tmp_path: Path) -> None:
+    for relative in ["setup.py", "README.md", "src/app.py", "src/data.txt", "docs/guide.txt"]:
+        (tmp_path / relative).parent.mkdir(parents=True, exist_ok=True)
+        (tmp_path / relative).write_text(relative, encoding="utf-8")
+    config = make_config(tmp_path, output_format="ndjson", file_metadata=True)
+    index = gfl.FileIndex.from_config(config)
+
+    files = gfl.discover_paths(config)
+    records = [json.loads(line) for line in gfl.render_content(files, config, metadata=index.metadata).splitlines()]
+    assert records == list(index.records())
+    assert [record["path"] for record in records] == ["setup.py", "src/app.py", "README.md", "docs/guide.txt", "src/data.txt"]
+    assert records[1]["section"] == "Python" and records[1]["category"] == "Python"
+    assert records[4]["section"] == "src" and records[4]["category"] is None
+    assert records[4]["url"] == "https://example.com/repo/blob/main/src/data.txt"
+    assert records[4]["size"] == len("src/data.txt") and records[4]["author"] is None
+
+    config.output_format = "json"
+    config.jobs = 2
+    assert json.loads(gfl.render_content(files, config, metadata=index.metadata)) == records
+    assert gfl.render_content([], config) == "[]\n"
+
+    assert len(index) == 5 and "src/app.py" in index and "src" not in index
+    assert index.titles() == ["Python", "Markdown", "docs", "src"]
+    assert index.section("src") == ["src/data.txt"]
+    assert index.with_prefix("src/") == ["src/app.py", "src/data.txt"]
+    assert index.in_category("Python") == ["setup.py", "src/app.py"]
+    assert index.section_of("docs/guide.txt") == "docs" and index.section_of("missing.txt") is None
+    assert index.record("src/data.txt") == records[4]
+    with pytest.raises(KeyError):
+        index.in_category("Rust")
+
+
+def test_file_index_tells_a_folder_from_a_category_of_the_same_name(tmp_path: Path) -> None:
+    for relative in ["a.py", "Python/notes.txt"]:
+        (tmp_path / relative).parent.mkdir(parents=True, exist_ok=True)
+        (tmp_path / relative).write_text("", encoding="utf-8")
+    index = gfl.FileIndex.from_config(make_config(tmp_path))
+    assert index.titles() == ["Python", "Python"]
+    assert index.in_category("Python") == ["a.py"]
+    assert index.section("Python") == ["a.py"]
+    assert index.section("Python", kind="folder") == ["Python/notes.txt"]
+    assert index.record("Python/notes.txt")["category"] is None
+
+
+def test_sqlite_output_upserts_only_what_changed(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    sqlite3 = pytest.importorskip("sqlite3")
+    repo_dir = tmp_path / "repo"
+    for relative in ["setup.py", "src/app.py", "src/data.TXT", "docs/guide.txt", "Python/notes.txt"]:
+        (repo_dir / relative).parent.mkdir(parents=True, exist_ok=True)
+        (repo_dir / relative).write_text(relative, encoding="utf-8")
+    database = tmp_path / "files.sqlite"
+    config = make_config(repo_dir, output_format="sqlite", output_file=database)
+
+    def rows() -> list:
+        with contextlib.closing(sqlite3.connect(database)) as connection:
+            return connection.execute(
+                "SELECT path, directory, name, extension, section_kind, section, category, url FROM files ORDER BY path"
+            ).fetchall()
+
+    gfl.emit_output(config, gfl.discover_paths(config))
+    assert rows() == [
+        ("Python/notes.txt", "Python", "notes.txt", ".txt", "folder", "Python", None, "https://example.com/repo/blob/main/Python/notes.txt"),
+        ("docs/guide.txt", "docs", "guide.txt", ".txt", "folder", "docs", None, "https://example.com/repo/blob/main/docs/guide.txt"),
+        ("setup.py", "", "setup.py", ".py", "category", "Python", "Python", "https://example.com/repo/blob/main/setup.py"),
+        ("src/app.py", "src", "app.py", ".py", "category", "Python", "Python", "https://example.com/repo/blob/main/src/app.py"),
+        ("src/data.TXT", "src", "data.TXT", ".txt", "folder", "src", None, "https://example.com/repo/blob/main/src/data.TXT"),
+    ]
+    with contextlib.closing(sqlite3.connect(database)) as connection:
+        indexes = {row[0] for row in connection.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+        plan = connection.execute("EXPLAIN QUERY PLAN SELECT path FROM files WHERE category = 'Python'").fetchall()
+    assert {"files_directory", "files_extension", "files_category"} <= indexes
+    assert "files_category" in plan[0][-1]
+
+    # A folder named like a category is a section of its own, not a change.
+    monkeypatch.setattr(gfl, "run_metrics", gfl.RunMetrics())
+    gfl.emit_output(config, gfl.discover_paths(config))
+    assert gfl.run_metrics.counters["sqlite_sections_written"] == 0
+
+    (repo_dir / "docs" / "guide.txt").unlink()
+    (repo_dir / "docs" / "api.md").write_text("", encoding="utf-8")
+    monkeypatch.setattr(gfl, "run_metrics", gfl.RunMetrics())
+    gfl.emit_output(config, gfl.discover_paths(config))
+    assert gfl.run_metrics.counters["sqlite_sections_written"] == 1
+    assert gfl.run_metrics.counters["sqlite_rows_written"] == 1
+    assert gfl.run_metrics.counters["sqlite_rows_deleted"] == 1
+    assert [row[0] for row in rows()] == ["Python/notes.txt", "docs/api.md", "setup.py", "src/app.py", "src/data.TXT"]
+
+    (repo_dir / "page.html").write_text("<html></html>", encoding="utf-8")
+    with pytest.raises(ValueError):
+        gfl.emit_output(make_config(repo_dir, output_format="sqlite", output_file=repo_dir / "page.html"), ["setup.py"])
+
+
+def test_parse_git_index_rejects_unknown_data() -> None:
+    with pytest.raises(ValueError):
+        gfl.parse_git_index(b"NOPE" + bytes(40))
+
+
+@pytest.mark.skipif(shutil.which("git") is None, reason="git is not installed")
+def test_git_discovery_handles_quoted_file_names(tmp_path: Path) -> None:
+    repo_dir = tmp_path / "repo"
+    (repo_dir / "sub").mkdir(parents=True)
+    names = ['sub/quote"d.txt', "sub/new\nline.txt", "sub/caf\u00e9.md", "other.txt"]
+    for name in names:
+        (repo_dir / name).write_text("", encoding="utf-8")
+    _git(repo_dir, "init", "-q")
+    _git(repo_dir, "add", "sub/quote\"d.txt", "sub/caf\u00e9.md")
+    assert gfl.git_paths(repo_dir / "sub", []) == ["caf\u00e9.md", "new\nline.txt", 'quote"d.txt']
+    assert gfl.git_paths(repo_dir, []) == ["other.txt", "sub/caf\u00e9.md", "sub/new\nline.txt", 'sub/quote"d.txt']
+
+
+def test_repo_metadata_is_read_without_spawning_git(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    for name in ("GITHUB_REPOSITORY", "GITHUB_REF_NAME", "GITHUB_HEAD_REF", *gfl.GIT_ENVIRONMENT_OVERRIDES):
+        monkeypatch.delenv(name, raising=False)
+    common = tmp_path / "main" / ".git"
+    (common / "worktrees" / "feature").mkdir(parents=True)
+    (common / "config").write_text(
+        '[core]\n\tbare = false\n[remote "origin"]\n\turl = "git@github.com:demo/repo.git" ; comment\n',
+        encoding="utf-8",
+    )
+    (common / "HEAD").write_text("ref: refs/heads/main\n", encoding="utf-8")
+    worktree_git = common / "worktrees" / "feature"
+    (worktree_git / "commondir").write_text("../..\n", encoding="utf-8")
+    (worktree_git / "HEAD").write_text("ref: refs/heads/feature/x\n", encoding="utf-8")
+    worktree = tmp_path / "feature"
+    (worktree / "docs").mkdir(parents=True)
+    (worktree / ".git").write_text("gitdir: ../main/.git/worktrees/feature\n", encoding="utf-8")
+
+    def no_subprocess(cmd, **kwargs):  # noqa: ANN001
+        raise AssertionError(f"unexpected subprocess: {cmd}")
+
+    monkeypatch.setattr(gfl.subprocess, "run", no_subprocess)
+    assert gfl.resolve_repo_url(None, None, worktree / "docs") == "https://github.com/demo/repo"
+    assert gfl.resolve_default_branch(None, worktree / "docs") == "feature/x"
+    assert gfl.resolve_default_branch(None, tmp_path / "main") == "main"
+    assert gfl.read_git_toplevel(worktree / "docs") == worktree.resolve()
+
+    (worktree_git / "HEAD").write_text("0123456789abcdef0123456789abcdef01234567\n", encoding="utf-8")
+    assert gfl.resolve_default_branch(None, worktree) == gfl.DEFAULT_LINK_REFERENCE
+    (common / "config").write_text('[include]\n\tpath = extra\n[remote "origin"]\n\turl = x\n', encoding="utf-8")
+    assert gfl.read_git_remote_url(worktree) is None
+
+
+@pytest.mark.skipif(shutil.which("git") is None, reason="git is not installed")
+def test_parse_git_config_agrees_with_git(tmp_path: Path) -> None:
+    config = tmp_path / "config"
+    config.write_text(
+        '[Remote "Origin"]\n  URL = " spaced\\tvalue " # trailing\n[remote.legacy]\nurl=plain;comment\n[core]\n\tbare\n',
+        encoding="utf-8",
+    )
+    parsed = gfl.parse_git_config(config.read_text(encoding="utf-8"))
+    assert parsed is not None
+    for key, options in (("remote.Origin.url", []), ("remote.legacy.url", []), ("core.bare", ["--bool"])):
+        expected = subprocess.run(
+            ["git", "config", "--file", str(config), *options, "--get", key], check=True, capture_output=True, text=True
+        ).stdout[:-1]
+        assert parsed[key] == [expected]
+
+
+def test_iter_nul_records_spans_block_boundaries() -> None:
+    stream = io.BytesIO(b"alpha\0be\0gamma")
+    assert list(gfl.iter_nul_records(stream, block_size=3)) == [b"alpha", b"be", b"gamma"]
+
+
+def _random_prefs(**overrides) -> gfl.ColorPreferences:
+    prefs = gfl.ColorPreferences(
+        source="random",
+        colors=[],
+        color_range=("#406000", "#476FFF"),
+        exclude_dark=False,
+        exclude_bright=False,
+        exclude_blacks=False,
+        exclude_blacks_threshold="#222222",
+        ensure_readable=False,
+        dark_luminance_threshold=128,
+        bright_luminance_threshold=200,
+    )
+    for key, value in overrides.items():
+        setattr(prefs, key, value)
+    return prefs
+
+
+def _excluded(prefs: gfl.ColorPreferences, color: str) -> bool:
+    luminance = gfl.calculate_luminance(color)
+    return (
+        (prefs.exclude_dark and luminance < prefs.dark_luminance_threshold)
+        or (prefs.exclude_bright and luminance > prefs.bright_luminance_threshold)
+        or (prefs.exclude_blacks and gfl.is_black_color(color, prefs.exclude_blacks_threshold))
+        or (prefs.ensure_readable and not 50 < luminance < 200)
+    )
+
+
+@pytest.mark.parametrize(
+    "overrides",
+    [
+        {"exclude_dark": True, "dark_luminance_threshold": 90},
+        {"exclude_bright": True, "bright_luminance_threshold": 90},
+        {"ensure_readable": True, "color_range": ("#002800", "#074FFF")},
+        {"exclude_blacks": True, "exclude_blacks_threshold": "#436880"},
+        {"exclude_dark": True, "exclude_bright": True, "dark_luminance_threshold": 88, "bright_luminance_threshold": 92},
+    ],
+)
+def test_color_palette_matches_exclusion_rules(overrides) -> None:  # noqa: ANN001
+    prefs = _random_prefs(**overrides)
+    generator = gfl.ColorGenerator(prefs)
+    palette = gfl.ColorPalette(prefs)
+    low = [int(prefs.color_range[0][i : i + 2], 16) for i in (1, 3, 5)]
+    high = [int(prefs.color_range[1][i : i + 2], 16) for i in (1, 3, 5)]
+    admissible = sum(
+        1
+        for r in range(low[0], high[0] + 1)
+        for g in range(low[1], high[1] + 1)
+        for b in range(low[2], high[2] + 1)
+        if not _excluded(prefs, f"#{r:02X}{g:02X}{b:02X}")
+    )
+    assert palette.size == admissible
+    for _ in range(200):
+        assert not _excluded(prefs, generator.next_color())
+
+
+def test_color_seed_makes_output_reproducible() -> None:
+    first = gfl.ColorGenerator(_random_prefs(exclude_dark=True, seed=7))
+    second = gfl.ColorGenerator(_random_prefs(exclude_dark=True, seed=7))
+    assert [first.next_color() for _ in range(20)] == [second.next_color() for _ in range(20)]
+    impossible = gfl.ColorGenerator(_random_prefs(exclude_dark=True, dark_luminance_threshold=300, seed=1))
+    assert impossible.next_color().startswith("#")